@@ -0,0 +1,61 @@
+"""Measures the time it takes to import PyXYZ and use some of its classes, each in a fresh
+Python process, so nothing is already imported or cached.
+
+Usage: python benchmarks/import_time.py [repeats]
+"""
+import os
+import subprocess
+import sys
+import time
+
+# Statements to time. Each one runs in a new process
+CASES = [
+    ("python only", "pass"),
+    ("import pyxyz", "import pyxyz"),
+    ("Vector3", "from pyxyz import Vector3; Vector3(1, 2, 3)"),
+    ("Color", "from pyxyz import Color; Color(1, 0, 0)"),
+    ("Mesh.create_cube", "from pyxyz import Mesh; Mesh.create_cube((1, 1, 1))"),
+    ("noise2d", "from pyxyz import noise2d; noise2d(0.5, 0.5)"),
+    ("Scene", "from pyxyz import Scene; Scene('scene')"),
+    ("from pyxyz import *", "from pyxyz import *"),
+]
+
+def measure(statement, repeats):
+    """
+    Runs a statement in new Python processes, and returns the best time.
+
+    Arguments:
+
+        statement {str} -- Python code to run
+
+        repeats {int} -- Number of processes to run
+
+    Returns:
+        {number} - Shortest time, in seconds
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = root + os.pathsep + env.get("PYTHONPATH", "")
+    env["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], env=env, check=True)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+def main():
+    """Runs all the cases and prints the results"""
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    baseline = None
+    for name, statement in CASES:
+        elapsed = measure(statement, repeats)
+        if baseline is None:
+            baseline = elapsed
+        print(f"{name:24} {elapsed * 1000:8.1f} ms  ({(elapsed - baseline) * 1000:+8.1f} ms)")
+
+if __name__ == "__main__":
+    main()
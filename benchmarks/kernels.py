@@ -0,0 +1,115 @@
+"""Compares the NumPy and Numba implementations of the kernels in pyxyz.kernels, checking that
+they give exactly the same results. If Numba is not installed, only the NumPy implementations
+are timed. The first call of each Numba kernel (that compiles it) is not timed.
+
+Usage: python benchmarks/kernels.py [repeats]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from pyxyz import kernels
+from pyxyz import perlin
+
+def make_cases():
+    """
+    Creates the inputs of each kernel, about the size of a large scene.
+
+    Returns:
+        {list[tuple]} - List of (name, kernel, arguments)
+    """
+    rng = np.random.default_rng(0)
+    rect = (0, 0, 1280, 720)
+
+    # A 300x300 grid of quads
+    vertices = rng.normal(size=(90000, 3)) * 10
+    matrix = np.identity(4)
+    matrix[3, 2] = 40
+    matrix[2, 3] = 1
+    matrix[0:2, 0:2] *= 600
+    indices = rng.integers(0, len(vertices), 360000)
+    offsets = np.arange(0, len(indices) + 1, 4)
+    clip, points = kernels.project(vertices, matrix, indices, rect)
+
+    # Line samples, as generated by the rasterizer
+    pixel = rng.integers(0, rect[2] * rect[3], 2000000)
+    depth = rng.uniform(1, 100, len(pixel))
+
+    # 100000 short lines, like the edges of a large wireframe
+    line_start = rng.uniform(0, rect[2:4], (100000, 2))
+    line_end = line_start + rng.uniform(-20, 20, line_start.shape)
+    line_keys = rng.uniform(0, 1, (2, len(line_start)))
+
+    # A 512x512 terrain
+    x, y = np.meshgrid(np.linspace(0, 50, 512), np.linspace(0, 50, 512))
+    gradients = np.array(perlin._get_gradtable(), dtype=np.float64) # pylint: disable=protected-access
+
+    return [
+        ("project", kernels.project, (vertices, matrix, indices, rect)),
+        ("perspective_divide", kernels.perspective_divide, (clip, rect)),
+        ("frustum_test", kernels.frustum_test, (points, clip[:, 3], offsets, rect, 2)),
+        ("closest_samples", kernels.closest_samples, (pixel, depth, rect[2] * rect[3])),
+        ("line_samples", kernels.line_samples, (line_start, line_end, line_keys[0],
+                                                line_keys[1], rect[2], rect[3])),
+        ("perlin_grid", kernels.perlin_grid, (x.reshape(-1), y.reshape(-1), gradients,
+                                              perlin.H)),
+    ]
+
+def measure(kernel, arguments, repeats):
+    """
+    Runs a kernel several times, and returns the best time and the result.
+
+    Arguments:
+
+        kernel {function} -- Kernel to run
+
+        arguments {tuple} -- Arguments of the kernel
+
+        repeats {int} -- Number of runs
+
+    Returns:
+        {2-tuple} - (time, result), where time is the shortest time, in seconds
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = kernel(*arguments)
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+def same(a, b):
+    """Checks if two kernel results are exactly the same"""
+    if isinstance(a, tuple):
+        return all(same(x, y) for x, y in zip(a, b))
+    return (a.shape == b.shape) and np.array_equal(a, b, equal_nan=True)
+
+def main():
+    """Runs all the kernels with both implementations and prints the results"""
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    kernels.use_numba = True
+    has_numba = kernels.get_backend() == "numba"
+    if not has_numba:
+        print("Numba is not installed, only timing the NumPy implementations")
+
+    for name, kernel, arguments in make_cases():
+        kernels.use_numba = False
+        numpy_time, numpy_result = measure(kernel, arguments, repeats)
+        line = f"{name:20} numpy {numpy_time * 1000:8.1f} ms"
+
+        if has_numba:
+            kernels.use_numba = True
+            # Compile it first
+            kernel(*arguments)
+            numba_time, numba_result = measure(kernel, arguments, repeats)
+            line += f"  numba {numba_time * 1000:8.1f} ms  ({numpy_time / numba_time:5.1f}x)"
+            line += "  same" if same(numpy_result, numba_result) else "  DIFFERENT"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,94 @@ PyXYZ (pronounced pyxies) is a a simple 3D wireframe engine for education, entir
 * Samples: https://github.com/VideojogosLusofona/PyXYZ-Samples
 """
 
-from pyxyz.vector3 import *
-from pyxyz.color import *
-from pyxyz.perlin import *
-from pyxyz.object3d import *
-from pyxyz.mesh import *
-from pyxyz.material import *
-from pyxyz.scene import *
+import importlib
 
+# Submodules are only imported when one of their names is first used (PEP 562), so that scripts
+# that only need a few classes don't pay for importing Pygame, NumPy-Quaternion and everything
+# else. Maps each exported name to the module where it is defined
+_EXPORTS = {
+    "InvalidOperationException": "pyxyz.vector3",
+    "Vector3": "pyxyz.vector3",
+    "dot_product": "pyxyz.vector3",
+    "cross_product": "pyxyz.vector3",
+    "InvalidColorOperationException": "pyxyz.color",
+    "Color": "pyxyz.color",
+    "ColorArray": "pyxyz.color_array",
+    "W": "pyxyz.perlin",
+    "H": "pyxyz.perlin",
+    "gradtable": "pyxyz.perlin",
+    "noise2d": "pyxyz.perlin",
+    "noise2d_grid": "pyxyz.perlin",
+    "Object3d": "pyxyz.object3d",
+    "Camera": "pyxyz.camera",
+    "Mesh": "pyxyz.mesh",
+    "Polyline": "pyxyz.polyline",
+    "MeshCache": "pyxyz.mesh_cache",
+    "MeshBVH": "pyxyz.bvh",
+    "ScreenGrid": "pyxyz.screen_grid",
+    "Material": "pyxyz.material",
+    "Fog": "pyxyz.fog",
+    "ParticleSystem": "pyxyz.particle_system",
+    "Scene": "pyxyz.scene",
+    "Frame": "pyxyz.frame",
+    "DrawCommands": "pyxyz.draw_commands",
+    "get_triangle_fans": "pyxyz.draw_commands",
+    "PygameBackend": "pyxyz.backends",
+    "RasterizerBackend": "pyxyz.backends",
+    "NullBackend": "pyxyz.backends",
+    "Rasterizer": "pyxyz.rasterizer",
+    "OffscreenBuffer": "pyxyz.offscreen",
+    "RenderPipeline": "pyxyz.render_pipeline",
+    "load_obj": "pyxyz.mesh_io",
+    "load_ply": "pyxyz.mesh_io",
+    "save_obj": "pyxyz.mesh_io",
+    "save_ply": "pyxyz.mesh_io",
+    "weld_vertices": "pyxyz.mesh_tools",
+    "remove_degenerate_polygons": "pyxyz.mesh_tools",
+    "decimate": "pyxyz.mesh_tools",
+    "save_scene": "pyxyz.scene_io",
+    "load_scene": "pyxyz.scene_io",
+    "get_prs_matrices": "pyxyz.transforms",
+    "decompose_matrices": "pyxyz.transforms",
+    "invert_matrices": "pyxyz.transforms",
+    "compose_matrices": "pyxyz.transforms",
+    "get_world_matrices": "pyxyz.transforms",
+    # These were always available from the package, through the imports of pyxyz.object3d
+    "quaternion": "quaternion",
+    "as_rotation_matrix": "quaternion",
+}
+
+# Modules that the star imports of earlier versions also brought into the package (imported
+# by its submodules, or the submodules themselves), kept so scripts that relied on
+# 'from pyxyz import *' for them still work. Maps each name to the module it refers to
+_MODULES = {
+    "np": "numpy",
+    "math": "math",
+    "random": "random",
+    "pygame": "pygame",
+    "vector3": "pyxyz.vector3",
+    "color": "pyxyz.color",
+    "perlin": "pyxyz.perlin",
+    "object3d": "pyxyz.object3d",
+    "camera": "pyxyz.camera",
+    "mesh": "pyxyz.mesh",
+    "material": "pyxyz.material",
+    "scene": "pyxyz.scene",
+}
+
+__all__ = list(_EXPORTS) + list(_MODULES)
+
+def __getattr__(name):
+    if name in _MODULES:
+        value = importlib.import_module(_MODULES[name])
+    elif name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    # Cache the value in the package, so this is only called once per name
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | set(_MODULES))
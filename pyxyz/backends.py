@@ -0,0 +1,201 @@
+"""Render backends, that draw DrawCommands on a surface.
+Pygame is only imported by the backends that draw with it, when they first draw, so that
+the rest of the engine can be imported without it."""
+import numpy as np
+from pyxyz.rasterizer import Rasterizer
+
+class PygameBackend:
+    """Pygame backend class.
+    Draws the commands with pygame.draw, one polygon at a time, in batches of polygons with the
+    same color and line width. Open polygons are drawn with pygame.draw.lines. This is the
+    default backend.
+    """
+    def __init__(self, antialias=False):
+        """
+        Arguments:
+
+            antialias {bool} -- True to draw the polygons with a line width of 1 with
+            antialiased lines (pygame.draw.aalines). Pygame can't antialias wider lines, use a
+            RasterizerBackend for those. Defaults to False
+        """
+        self.antialias = antialias
+        """{bool} True to draw 1 pixel wide lines antialiased"""
+
+    def draw(self, commands, surface):
+        """
+        Draws the commands on the given surface, clipped to their viewport.
+
+        Arguments:
+
+            commands {DrawCommands} -- Commands to draw
+
+            surface {pygame.Surface} -- Surface where to draw
+        """
+        import pygame
+
+        points = commands.points.tolist()
+        offsets = commands.offsets.tolist()
+        batches = commands.get_batches().tolist()
+        colors = commands.colors[batches[:-1]].tolist()
+        widths = commands.widths[batches[:-1]].tolist()
+        closed = commands.closed.tolist()
+
+        # Color and width only change between batches
+        previous_clip = surface.get_clip()
+        surface.set_clip(commands.rect)
+        draw_polygon = pygame.draw.polygon
+        draw_lines = pygame.draw.lines
+        draw_aalines = pygame.draw.aalines
+        for batch, (color, width) in enumerate(zip(colors, widths)):
+            color = tuple(color)
+            if self.antialias and (width == 1):
+                for i in range(batches[batch], batches[batch + 1]):
+                    if offsets[i + 1] - offsets[i] >= 2:
+                        draw_aalines(surface, color, closed[i],
+                                     points[offsets[i]:offsets[i + 1]])
+            else:
+                for i in range(batches[batch], batches[batch + 1]):
+                    if closed[i]:
+                        draw_polygon(surface, color, points[offsets[i]:offsets[i + 1]], width)
+                    elif offsets[i + 1] - offsets[i] >= 2:
+                        draw_lines(surface, color, False, points[offsets[i]:offsets[i + 1]],
+                                   max(width, 1))
+        surface.set_clip(previous_clip)
+
+class RasterizerBackend:
+    """Rasterizer backend class.
+    Draws the commands with the software rasterizer (see Rasterizer), which does per-pixel
+    depth testing, so hidden lines are removed and polygons occlude each other exactly. This is
+    slower than the Pygame backend.
+    Filled polygons (line width 0) are drawn with their color. The other polygons are drawn
+    as lines of their line width, but are still filled in the depth buffer, so they hide what is
+    behind them. All the lines of all the polygons are drawn in a single batch, optionally
+    antialiased. Per-vertex colors (see Material.vertex_colors) are drawn as gradients.
+    """
+    def __init__(self, antialias=False):
+        """
+        Arguments:
+
+            antialias {bool} -- True to draw antialiased lines. Defaults to False
+        """
+        self.rasterizer = None
+        """{Rasterizer} Rasterizer used, created on the first draw and resized as needed"""
+        self.antialias = antialias
+        """{bool} True to draw antialiased lines"""
+
+    def draw(self, commands, surface):
+        """
+        Draws the commands on the given surface, clipped to their viewport. The existing
+        contents of the surface are kept, and the commands are drawn over them.
+
+        Arguments:
+
+            commands {DrawCommands} -- Commands to draw
+
+            surface {pygame.Surface} -- Surface where to draw
+        """
+        import pygame
+
+        # Rasterize into buffers the size of the visible part of the viewport
+        target = pygame.Rect(commands.rect).clip(surface.get_rect())
+        if (target.width == 0) or (target.height == 0):
+            return
+
+        if self.rasterizer is None:
+            self.rasterizer = Rasterizer(target.width, target.height)
+        rasterizer = self.rasterizer
+        rasterizer.resize(target.width, target.height)
+        rasterizer.perspective = commands.perspective
+
+        target_surface = surface.subsurface(target)
+        rasterizer.read(target_surface)
+
+        points = commands.points - (target.x, target.y)
+        depth = commands.depth
+        filled = (commands.widths == 0) & commands.closed
+
+        # Triangles are always drawn to fill the depth buffer, but only get a color if the
+        # polygon is filled
+        triangles, polygon = commands.get_triangles()
+        tri_filled = filled[polygon]
+        if commands.vertex_colors is not None:
+            tri_colors = commands.vertex_colors[triangles[tri_filled]]
+        else:
+            tri_colors = commands.colors[polygon[tri_filled]]
+        rasterizer.draw_triangles(points[triangles[tri_filled]], depth[triangles[tri_filled]],
+                                  tri_colors)
+        rasterizer.draw_triangles(points[triangles[~tri_filled]], depth[triangles[~tri_filled]])
+
+        edges, polygon = commands.get_edges()
+        edges = edges[~filled[polygon]]
+        polygon = polygon[~filled[polygon]]
+
+        # Edges shared by neighbouring polygons with the same style are only drawn once. The
+        # depth of both ends is part of the key, so coincident edges at different depths are
+        # all drawn and the depth test keeps the front one
+        edge_points = np.concatenate((points[edges].reshape((-1, 4)), depth[edges]), axis=1)
+        swap = (edge_points[:, 0] > edge_points[:, 2]) | \
+               ((edge_points[:, 0] == edge_points[:, 2]) & (edge_points[:, 1] > edge_points[:, 3]))
+        edge_points[swap] = edge_points[swap][:, [2, 3, 0, 1, 5, 4]]
+        edge_keys = np.concatenate((edge_points, commands.colors[polygon],
+                                    commands.widths[polygon, np.newaxis]), axis=1)
+        unique = _unique_rows(edge_keys)
+        edges, polygon = edges[unique], polygon[unique]
+        widths = np.maximum(commands.widths[polygon], 1)
+        if commands.vertex_colors is not None:
+            edge_colors = commands.vertex_colors[edges]
+        else:
+            edge_colors = commands.colors[polygon]
+
+        # Aliased 1 pixel lines are drawn with the faster DDA path, and the rest as wide lines
+        thin = (widths == 1) & (not self.antialias)
+        rasterizer.draw_lines(points[edges[thin, 0]], points[edges[thin, 1]],
+                              depth[edges[thin, 0]], depth[edges[thin, 1]], edge_colors[thin])
+        if not thin.all():
+            wide = ~thin
+            rasterizer.draw_wide_lines(points[edges[wide, 0]], points[edges[wide, 1]],
+                                       depth[edges[wide, 0]], depth[edges[wide, 1]],
+                                       edge_colors[wide], widths[wide],
+                                       self.antialias)
+
+        rasterizer.blit(target_surface)
+
+class NullBackend:
+    """Null backend class.
+    Doesn't draw anything, it only counts what it was asked to draw. Useful to measure the
+    time spent preparing the commands, without the time spent drawing them.
+    """
+    def __init__(self):
+        self.polygon_count = 0
+        """{int} Total number of polygons received"""
+        self.vertex_count = 0
+        """{int} Total number of vertices received"""
+
+    def draw(self, commands, surface):
+        """
+        Counts the commands, without drawing them.
+
+        Arguments:
+
+            commands {DrawCommands} -- Commands to draw
+
+            surface {pygame.Surface} -- Surface where to draw (not used)
+        """
+        self.polygon_count += commands.get_polygon_count()
+        self.vertex_count += len(commands.points)
+
+def _unique_rows(rows):
+    # Indices (sorted) of the first occurrence of each distinct row. Rows are sorted by a hash
+    # of their contents, which is much faster than comparing them, and then rows equal to the
+    # previous one are discarded
+    rows = np.ascontiguousarray(rows, dtype=np.float64)
+    bits = rows.view(np.uint64)
+    hashes = np.zeros(len(rows), dtype=np.uint64)
+    for column in range(rows.shape[1]):
+        hashes = (hashes ^ bits[:, column]) * np.uint64(0x100000001B3)
+    order = np.argsort(hashes, kind="stable")
+    duplicate = np.zeros(len(rows), dtype=bool)
+    duplicate[1:] = (hashes[order[1:]] == hashes[order[:-1]]) & \
+                    (rows[order[1:]] == rows[order[:-1]]).all(axis=1)
+
+    return np.sort(order[~duplicate])
@@ -0,0 +1,227 @@
+"""Bounding volume hierarchy for ray/mesh intersection"""
+import numpy as np
+from pyxyz.vector3 import Vector3
+
+class MeshBVH:
+    """Mesh BVH class.
+    Bounding volume hierarchy over the triangles of a mesh (quads and other polygons are
+    triangulated), used to find the exact polygon and point hit by a ray. All the queries work on
+    batches of rays at once, so they should be used to test as many rays as possible in one
+    call.
+    Everything is in the local space of the mesh, so world-space rays have to be transformed by
+    the inverse of the world matrix of the object before being tested.
+    Normally this isn't created directly, use Mesh.get_bvh() instead, which caches it.
+    """
+    def __init__(self, mesh, leaf_size=8):
+        """
+        Arguments:
+
+            mesh {Mesh} -- Mesh to build the BVH for
+
+            leaf_size {int} -- Maximum number of triangles in a leaf node, defaults to 8
+        """
+        vertices, _, _ = mesh.get_packed()
+        triangles, polygon = mesh.get_triangles()
+
+        self.leaf_size = max(1, leaf_size)
+        """{int} Maximum number of triangles in a leaf node"""
+
+        corners = vertices[triangles] if len(triangles) > 0 else np.zeros((0, 3, 3))
+        tri_min = corners.min(axis=1)
+        tri_max = corners.max(axis=1)
+        centroids = corners.mean(axis=1)
+
+        order = np.arange(len(triangles))
+        node_min = []
+        node_max = []
+        node_left = []
+        node_right = []
+        node_start = []
+        node_count = []
+
+        def new_node(start, end):
+            node_min.append(tri_min[order[start:end]].min(axis=0) if end > start else np.zeros(3))
+            node_max.append(tri_max[order[start:end]].max(axis=0) if end > start else np.zeros(3))
+            node_left.append(-1)
+            node_right.append(-1)
+            node_start.append(start)
+            node_count.append(end - start)
+            return len(node_min) - 1
+
+        # Build top-down, splitting each node at the median of the centroids along the axis
+        # where they are more spread out
+        stack = [(new_node(0, len(triangles)), 0, len(triangles))]
+        while stack:
+            node, start, end = stack.pop()
+            if end - start <= self.leaf_size:
+                continue
+
+            c = centroids[order[start:end]]
+            extent = c.max(axis=0) - c.min(axis=0)
+            axis = int(np.argmax(extent))
+            if extent[axis] <= 0:
+                continue
+
+            mid = (start + end) // 2
+            part = np.argpartition(c[:, axis], mid - start)
+            order[start:end] = order[start:end][part]
+
+            node_left[node] = new_node(start, mid)
+            node_right[node] = new_node(mid, end)
+            node_count[node] = 0
+            stack.append((node_left[node], start, mid))
+            stack.append((node_right[node], mid, end))
+
+        self.node_min = np.array(node_min).reshape((-1, 3))
+        """{np.array} (N,3) array with the minimum corner of the bounding box of each node"""
+        self.node_max = np.array(node_max).reshape((-1, 3))
+        """{np.array} (N,3) array with the maximum corner of the bounding box of each node"""
+        self.node_children = np.array([node_left, node_right], dtype=np.int32).T
+        """{np.array} (N,2) array with the children of each node, or -1 for leaf nodes"""
+        self.node_range = np.array([node_start, node_count], dtype=np.int32).T
+        """{np.array} (N,2) array with the (start, count) triangle range of each leaf node"""
+
+        # Store the triangles in leaf order, so each leaf is a contiguous range
+        corners = corners[order]
+        self.v0 = corners[:, 0]
+        """{np.array} (T,3) array with the first vertex of each triangle"""
+        self.e1 = corners[:, 1] - corners[:, 0]
+        """{np.array} (T,3) array with the first edge of each triangle"""
+        self.e2 = corners[:, 2] - corners[:, 0]
+        """{np.array} (T,3) array with the second edge of each triangle"""
+        self.polygon = polygon[order]
+        """{np.array} (T) array with the index of the mesh polygon for each triangle"""
+
+    def intersect_rays(self, origins, directions, max_distance=np.inf, any_hit=False):
+        """
+        Intersects a batch of rays with the mesh.
+
+        Arguments:
+
+            origins {np.array} -- (N,3) array with the origin of the rays
+
+            directions {np.array} -- (N,3) array with the direction of the rays. These don't need
+            to be normalized, but distances are measured in multiples of their length
+
+            max_distance {number} -- Hits further away than this are ignored, defaults to
+            infinity
+
+            any_hit {bool} -- If True, each ray stops at the first hit found, instead of looking
+            for the closest. This is faster and enough for line-of-sight checks, defaults to
+            False
+
+        Returns:
+            {3-tuple} - (distance, polygon, points), where distance is a (N) array with the
+            distance to the hit point (infinity if there was no hit), polygon is a (N) array with
+            the index of the polygon that was hit (-1 if there was no hit) and points is a (N,3)
+            array with the hit points (NaN if there was no hit)
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape((-1, 3))
+        directions = np.asarray(directions, dtype=np.float64).reshape((-1, 3))
+
+        count = len(origins)
+        best_t = np.full(count, float(max_distance))
+        best_tri = np.full(count, -1, dtype=np.int64)
+        if (count == 0) or (len(self.v0) == 0):
+            return self._results(origins, directions, best_t, best_tri)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv_dir = 1.0 / directions
+
+        stack = [(0, np.arange(count))]
+        while stack:
+            node, rays = stack.pop()
+            if any_hit:
+                rays = rays[best_tri[rays] < 0]
+
+            # Ray/box slab test, against the closest hit found so far
+            # (0 * inf gives NaN when a ray parallel to a slab starts exactly on its boundary,
+            # which counts as being inside it)
+            with np.errstate(invalid="ignore"):
+                t1 = (self.node_min[node] - origins[rays]) * inv_dir[rays]
+                t2 = (self.node_max[node] - origins[rays]) * inv_dir[rays]
+            t1[np.isnan(t1)] = -np.inf
+            t2[np.isnan(t2)] = np.inf
+            t_near = np.minimum(t1, t2).max(axis=1)
+            t_far = np.maximum(t1, t2).min(axis=1)
+            rays = rays[(t_far >= np.maximum(t_near, 0)) & (t_near <= best_t[rays])]
+            if len(rays) == 0:
+                continue
+
+            left, right = self.node_children[node]
+            if left >= 0:
+                stack.append((right, rays))
+                stack.append((left, rays))
+                continue
+
+            start, tri_count = self.node_range[node]
+            t, hit = self._intersect_triangles(origins[rays], directions[rays],
+                                               start, start + tri_count)
+            t[~hit] = np.inf
+            closest = np.argmin(t, axis=1)
+            t = t[np.arange(len(rays)), closest]
+            closer = t < best_t[rays]
+            best_t[rays[closer]] = t[closer]
+            best_tri[rays[closer]] = start + closest[closer]
+
+        return self._results(origins, directions, best_t, best_tri)
+
+    def intersect(self, origin, direction, max_distance=np.inf):
+        """
+        Intersects a single ray with the mesh, returning the closest hit.
+        To test many rays, use intersect_rays instead, it's much faster.
+
+        Arguments:
+
+            origin {Vector3} -- Origin of the ray
+
+            direction {Vector3} -- Direction of the ray
+
+            max_distance {number} -- Hits further away than this are ignored, defaults to
+            infinity
+
+        Returns:
+            {3-tuple} - (distance, polygon, point) of the closest hit, or None if the ray doesn't
+            hit the mesh. Point is a Vector3
+        """
+        t, polygon, points = self.intersect_rays(origin.to_np3(), direction.to_np3(),
+                                                 max_distance)
+        if polygon[0] < 0:
+            return None
+
+        return float(t[0]), int(polygon[0]), Vector3.from_np(points[0])
+
+    def _intersect_triangles(self, origins, directions, start, end):
+        # Moller-Trumbore, all the rays against all the triangles in the range
+        v0 = self.v0[start:end]
+        e1 = self.e1[start:end]
+        e2 = self.e2[start:end]
+
+        d = directions[:, np.newaxis, :]
+        p = np.cross(d, e2)
+        det = np.einsum("lk,rlk->rl", e1, p)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv_det = 1.0 / det
+            s = origins[:, np.newaxis, :] - v0
+            u = np.einsum("rlk,rlk->rl", s, p) * inv_det
+            q = np.cross(s, e1)
+            v = np.einsum("rk,rlk->rl", directions, q) * inv_det
+            t = np.einsum("lk,rlk->rl", e2, q) * inv_det
+
+            # Small tolerance on the barycentric coordinates, so rays through shared edges and
+            # vertices don't slip between triangles
+            eps = 1e-9
+            hit = (np.abs(det) > 1e-12) & (u >= -eps) & (v >= -eps) & (u + v <= 1 + eps) & \
+                  (t > eps)
+
+        return t, hit
+
+    def _results(self, origins, directions, best_t, best_tri):
+        hit = best_tri >= 0
+        distance = np.where(hit, best_t, np.inf)
+        polygon = np.where(hit, self.polygon[np.maximum(best_tri, 0)], -1) \
+            if len(self.polygon) > 0 else np.full(len(best_tri), -1)
+        points = np.full(origins.shape, np.nan)
+        points[hit] = origins[hit] + directions[hit] * distance[hit, np.newaxis]
+
+        return distance, polygon, points
@@ -40,86 +40,236 @@ class Camera(Object3d):
         self.proj_matrix = np.identity(4)
         """{np.array} Projection matrix. This is only set after get_projection_matrix is called
         once"""
+        self.version = 0
+        """{int} Incremented every time the view or projection matrices of the camera change,
+        so that renderers can tell if cached data is still valid. This is only updated when the
+        matrices are retrieved"""
+        self._proj_key = None
+        self._inv_proj_matrix = None
+        self._view_key = None
+        self._view_matrix = None
+        self._inv_view_matrix = None
+        self._view_proj_matrix = None
+        self._inv_view_proj_matrix = None
+        self._ortho_matrix = None
+
+    def _get_projection_key(self):
+        return (self.ortho, self.res_x, self.res_y, self.near_plane, self.far_plane, self.fov)
+
+    def _get_view_key(self):
+        return (self.position.x, self.position.y, self.position.z,
+                self.rotation.w, self.rotation.x, self.rotation.y, self.rotation.z)
+
+    def _update_projection(self):
+        key = self._get_projection_key()
+        if key == self._proj_key:
+            return False
+
+        proj_matrix = np.zeros((4, 4))
+        inv_proj_matrix = np.zeros((4, 4))
+        if self.ortho:
+            proj_matrix[0, 0] = self.res_x * 0.5
+            proj_matrix[1, 1] = self.res_y * 0.5
+            proj_matrix[3, 0] = 0
+            proj_matrix[3, 1] = 0
+            proj_matrix[3, 3] = 1
+            # The ortographic projection keeps the view depth as the clip z, so clip matrices
+            # still carry it, and the inverse passes it through
+            proj_matrix[2, 2] = 1
+            inv_proj_matrix[0, 0] = 1 / proj_matrix[0, 0]
+            inv_proj_matrix[1, 1] = 1 / proj_matrix[1, 1]
+            inv_proj_matrix[2, 2] = 1
+            inv_proj_matrix[3, 3] = 1
+        else:
+            t = math.tan(self.fov * 0.5)
+            a = self.res_y / self.res_x
+            proj_matrix[0, 0] = 0.5 * self.res_x / t
+            proj_matrix[1, 1] = 0.5 * self.res_y / (a * t)
+            proj_matrix[2, 3] = 1
+            proj_matrix[2, 2] = self.far_plane / (self.far_plane - self.near_plane)
+            proj_matrix[3, 2] = proj_matrix[2, 2] * self.near_plane
+            # Closed form inverse: x and y are just scaled, the camera space z is the clip
+            # space w, and the homogeneous w is recovered from the clip space z
+            inv_proj_matrix[0, 0] = 1 / proj_matrix[0, 0]
+            inv_proj_matrix[1, 1] = 1 / proj_matrix[1, 1]
+            inv_proj_matrix[3, 2] = 1
+            inv_proj_matrix[2, 3] = 1 / proj_matrix[3, 2]
+            inv_proj_matrix[3, 3] = -proj_matrix[2, 2] / proj_matrix[3, 2]
+
+        proj_matrix.setflags(write=False)
+        inv_proj_matrix.setflags(write=False)
+        self.proj_matrix = proj_matrix
+        self._inv_proj_matrix = inv_proj_matrix
+        self._proj_key = key
+        self.version += 1
+        return True
+
+    def _update_view(self):
+        key = self._get_view_key()
+        if key == self._view_key:
+            return False
+
+        # The camera transform is rigid, so the inverse is just the transposed rotation and the
+        # negated translation
+        qrot = as_rotation_matrix(self.rotation)
+        position = np.array(key[0:3])
+
+        view_matrix = np.identity(4)
+        view_matrix[0:3, 0:3] = qrot.T
+        view_matrix[3, 0:3] = -position @ qrot.T
+
+        inv_view_matrix = np.identity(4)
+        inv_view_matrix[0:3, 0:3] = qrot
+        inv_view_matrix[3, 0:3] = position
+
+        view_matrix.setflags(write=False)
+        inv_view_matrix.setflags(write=False)
+        self._view_matrix = view_matrix
+        self._inv_view_matrix = inv_view_matrix
+        self._view_key = key
+        self.version += 1
+        return True
+
+    def _update_matrices(self):
+        proj_changed = self._update_projection()
+        view_changed = self._update_view()
+        if proj_changed or view_changed or (self._view_proj_matrix is None):
+            view_proj_matrix = self._view_matrix @ self.proj_matrix
+            inv_view_proj_matrix = self._inv_proj_matrix @ self._inv_view_matrix
+            view_proj_matrix.setflags(write=False)
+            inv_view_proj_matrix.setflags(write=False)
+            self._view_proj_matrix = view_proj_matrix
+            self._inv_view_proj_matrix = inv_view_proj_matrix
+            self._ortho_matrix = None
+            if self.ortho:
+                ortho_matrix = view_proj_matrix[:, 0:3].copy()
+                ortho_matrix.setflags(write=False)
+                self._ortho_matrix = ortho_matrix
 
     def get_projection_matrix(self):
         """Retrieves the projection matrix of this camera.
         This function sets up the proj_matrix attribute as well.
+        The matrix is cached, and only rebuilt when the ortho, res_x, res_y, near_plane,
+        far_plane or fov attributes change, so it is returned as a read-only array.
 
         Returns:
             np.array - Projection matrix of this camera
         """
-        self.proj_matrix = np.zeros((4, 4))
-        if self.ortho:
-            self.proj_matrix[0, 0] = self.res_x * 0.5
-            self.proj_matrix[1, 1] = self.res_y * 0.5
-            self.proj_matrix[3, 0] = 0
-            self.proj_matrix[3, 1] = 0
-            self.proj_matrix[3, 3] = 1
-        else:
-            t = math.tan(self.fov * 0.5)
-            a = self.res_y / self.res_x
-            self.proj_matrix[0, 0] = 0.5 * self.res_x / t
-            self.proj_matrix[1, 1] = 0.5 * self.res_y / (a * t)
-            self.proj_matrix[2, 3] = 1
-            self.proj_matrix[2, 2] = self.far_plane / (self.far_plane - self.near_plane)
-            self.proj_matrix[3, 2] = self.proj_matrix[2, 2] * self.near_plane
-
+        self._update_projection()
         return self.proj_matrix
 
     def get_camera_matrix(self):
         """Retrieves the view matrix of this camera. This is basically the same as a PRS matrix
         without scalling, and with the position and rotation negated.
+        The matrix is cached, and only rebuilt when the position or rotation of the camera
+        change, so it is returned as a read-only array.
 
         Returns:
             np.array - View matrix of this camera
         """
-        trans = np.identity(4)
-        trans[3, 0] = -self.position.x
-        trans[3, 1] = -self.position.y
-        trans[3, 2] = -self.position.z
-
-        qrot = as_rotation_matrix(self.rotation.inverse())
-        rotation_matrix = np.identity(4)
-        rotation_matrix[0][0] = qrot[0][0]
-        rotation_matrix[0][1] = qrot[0][1]
-        rotation_matrix[0][2] = qrot[0][2]
-        rotation_matrix[1][0] = qrot[1][0]
-        rotation_matrix[1][1] = qrot[1][1]
-        rotation_matrix[1][2] = qrot[1][2]
-        rotation_matrix[2][0] = qrot[2][0]
-        rotation_matrix[2][1] = qrot[2][1]
-        rotation_matrix[2][2] = qrot[2][2]
-        rotation_matrix[3][3] = 1
-
-        return trans @ rotation_matrix
+        self._update_view()
+        return self._view_matrix
+
+    def get_inverse_camera_matrix(self):
+        """Retrieves the inverse of the view matrix of this camera, that converts from camera
+        space to world space. Cached like the view matrix.
+
+        Returns:
+            np.array - Inverse view matrix of this camera
+        """
+        self._update_view()
+        return self._inv_view_matrix
+
+    def get_view_projection_matrix(self):
+        """Retrieves the combined view and projection matrix of this camera (the clip matrix
+        used for root-level objects). Cached like the view and projection matrices.
+
+        Returns:
+            np.array - View-projection matrix of this camera
+        """
+        self._update_matrices()
+        return self._view_proj_matrix
+
+    def get_inverse_view_projection_matrix(self):
+        """Retrieves the inverse of the view-projection matrix of this camera, computed in
+        closed form instead of with a general matrix inversion. Ortographic projections discard
+        depth, so for those the clip space z is used directly as camera space z.
+        Cached like the view and projection matrices.
+
+        Returns:
+            np.array - Inverse view-projection matrix of this camera
+        """
+        self._update_matrices()
+        return self._inv_view_proj_matrix
+
+    def get_ortho_matrix(self):
+        """Retrieves, for ortographic cameras, the affine matrix that converts world space
+        positions straight to clip space x and y and camera space depth (see
+        kernels.project_affine). With an ortographic projection, w is always 1, so screen
+        positions are an affine function of world positions, and panning the camera only adds
+        an offset to them. Cached like the view and projection matrices.
+
+        Returns:
+            np.array - (4,3) matrix, with the columns 0 to 2 of the view-projection matrix (the
+            clip z of ortographic cameras is the view depth), or None if the camera is not
+            ortographic
+        """
+        self._update_matrices()
+        return self._ortho_matrix
 
     def ray_from_ndc(self, pos):
         """Retrieves a ray (origin, direction) corresponding to the given position on screen.
         This function takes the coordinates as NDC (normalized device coordinates), in which the
-        lower-left corner of the screen corresponds to (-1,-1) and the upper-right corresponds to
+        upper-left corner of the screen corresponds to (-1,-1) and the lower-right corresponds to
         (1,1).
         For example, to convert mouse coordinates to NDC, you could do something like:
 
         >>> mouse_pos = pygame.mouse.get_pos()
         >>> mouse_pos = ((mouse_pos[0] / res_x) * 2 - 1, (mouse_pos[1] / res_y) * 2 - 1)
-        >>> origin, dir = camera.RayFromNDC(mouse_pos)
+        >>> origin, dir = camera.ray_from_ndc(mouse_pos)
+
+        To get rays for many positions at once, use rays_from_ndc instead.
 
         Arguments:
             pos {2-tuple} -- Screen position in NDC (normalized device coordinates)
 
         Returns:
             Vector3, Vector3 - Origin and direction of the ray corresponding to that screen
-            positions
+            positions. The origin is on the near plane.
         """
+        origins, directions = self.rays_from_ndc(np.array([pos], dtype=np.float64))
 
-        vpos = Vector3(pos[0], pos[1], self.near_plane)
-        vpos.x = vpos.x * self.res_x * 0.5
-        vpos.y = -vpos.y * self.res_y * 0.5
+        return Vector3.from_np(origins[0]), Vector3.from_np(directions[0])
 
-        inv_view_proj_matrix = self.get_camera_matrix() @ self.get_projection_matrix()
-        inv_view_proj_matrix = np.linalg.inv(inv_view_proj_matrix)
+    def rays_from_ndc(self, positions):
+        """Retrieves the rays corresponding to several positions on screen, in one go.
+        Coordinates are in NDC, as in ray_from_ndc.
 
-        direction = inv_view_proj_matrix @ vpos.to_np4(1)
-        direction = Vector3.from_np(direction).normalized()
+        Arguments:
+            positions {np.array} -- (N,2) array with screen positions in NDC
+
+        Returns:
+            np.array, np.array - (N,3) arrays with the origin and (normalized) direction of the
+            rays corresponding to the screen positions. The origins are on the near plane.
+        """
+        positions = np.asarray(positions, dtype=np.float64).reshape((-1, 2))
+        self._update_projection()
+        inv_view_matrix = self.get_inverse_camera_matrix()
+
+        # Camera space position, at depth 1, of the screen points
+        points = np.empty((len(positions), 3))
+        points[:, 0] = positions[:, 0] * self.res_x * 0.5 * self._inv_proj_matrix[0, 0]
+        points[:, 1] = -positions[:, 1] * self.res_y * 0.5 * self._inv_proj_matrix[1, 1]
+        points[:, 2] = 1
+
+        rotation = inv_view_matrix[0:3, 0:3]
+        if self.ortho:
+            points[:, 2] = self.near_plane
+            origins = points @ rotation + inv_view_matrix[3, 0:3]
+            directions = np.tile(rotation[2], (len(positions), 1))
+        else:
+            origins = (points * self.near_plane) @ rotation + inv_view_matrix[3, 0:3]
+            directions = points @ rotation
+            directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
 
-        return self.position + direction * self.near_plane, direction
+        return origins, directions
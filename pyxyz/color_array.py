@@ -0,0 +1,318 @@
+"""Color array class definition"""
+import numpy as np
+from pyxyz.color import Color, InvalidColorOperationException
+
+class ColorArray:
+    """Color array class.
+    Stores any number of RGBA colors in a single (N,4) NumPy array, with the components as
+    floats in the [0..1] range (although there are no guarantees). It supports the same
+    operations as Color, done on all the colors at once, so working with many colors (like one
+    per vertex of a mesh) doesn't need a Color object for each one.
+    Operations that change the colors in place increment version, so that renderers can tell
+    if cached data is still valid. If data is changed directly, invalidate has to be called.
+    """
+    def __init__(self, data=None, count=0):
+        """
+        Arguments:
+
+            data {np.array} -- (N,4) array with the RGBA components of the colors, or (N,3)
+            array with the RGB components (alpha is set to 1). If not given, creates count
+            black colors
+
+            count {int} -- Number of colors to create, if data is not given. Defaults to 0
+        """
+        if data is None:
+            data = np.zeros((count, 4))
+            data[:, 3] = 1
+        else:
+            data = np.array(data, dtype=np.float64)
+            if data.ndim == 1:
+                data = data.reshape((1, -1))
+            if data.shape[1] == 3:
+                data = np.concatenate((data, np.ones((len(data), 1))), axis=1)
+
+        self.data = data
+        """{np.array} (N,4) array with the RGBA components of the colors"""
+        self.version = 0
+        """{int} Incremented every time the colors change in place"""
+
+    def __len__(self):
+        return len(self.data)
+
+    def __str__(self):
+        """Converts the ColorArray to a displayable string
+
+        Returns:
+            String - Colors in text format"""
+        return "[" + ", ".join(f"({r},{g},{b},{a})" for r, g, b, a in self.data.tolist()) + "]"
+
+    def __getitem__(self, index):
+        """Retrieves one of the colors (as a Color), or a subset of them (as a ColorArray,
+        with a copy of the colors).
+
+        Arguments:
+            index {int} -- Index of the color
+            or
+            index {slice, np.array} -- Colors to retrieve
+
+        Returns:
+            Color - Color at the given index
+            or
+            ColorArray - Selected colors
+        """
+        if isinstance(index, (int, np.integer)):
+            return Color(*self.data[index].tolist())
+        return ColorArray(self.data[index])
+
+    def __setitem__(self, index, value):
+        """Changes one or more of the colors.
+
+        Arguments:
+            index {int, slice, np.array} -- Colors to change
+
+            value {Color, ColorArray, np.array} -- New colors
+        """
+        self.data[index] = ColorArray._components(value, "set")
+        self.invalidate()
+
+    def __add__(self, c):
+        """Adds a Color (to all the colors) or another ColorArray of the same size (element by
+        element) to this one. No validation of the output is done, i.e. any component can
+        overflow.
+
+        Arguments:
+            c {Color, ColorArray} -- Colors to add
+
+        Returns:
+            ColorArray - Sum of the colors
+        """
+        return ColorArray(self.data + ColorArray._components(c, "add"))
+
+    def __sub__(self, c):
+        """Subtracts a Color (from all the colors) or another ColorArray of the same size
+        (element by element) from this one. No validation of the output is done, i.e. any
+        component can underflow.
+
+        Arguments:
+            c {Color, ColorArray} -- Colors to subtract
+
+        Returns:
+            ColorArray - Subtraction of the colors
+        """
+        return ColorArray(self.data - ColorArray._components(c, "sub"))
+
+    def __mul__(self, c):
+        """Multiplies the colors by a scalar, by one scalar per color, or by colors (component
+        by component). No validation of the output is done.
+
+        Arguments:
+            c {number} -- Scalar to multiply all the colors by
+            or
+            c {np.array} -- (N) array with the scalar to multiply each color by
+            or
+            c {Color, ColorArray} -- Colors to multiply, component by component
+
+        Returns:
+            ColorArray - Multiplication of the colors
+        """
+        return ColorArray(self.data * ColorArray._scalars(c, "mult"))
+
+    def __rmul__(self, c):
+        return self * c
+
+    def __truediv__(self, c):
+        """Divides the colors by a scalar, or by one scalar per color. No validation of the
+        output is done.
+
+        Arguments:
+            c {number} -- Scalar to divide all the colors by
+            or
+            c {np.array} -- (N) array with the scalar to divide each color by
+
+        Returns:
+            ColorArray - Colors divided by the scalars
+        """
+        if isinstance(c, (Color, ColorArray)):
+            raise InvalidColorOperationException("div", type(self), type(c))
+        return ColorArray(self.data / ColorArray._scalars(c, "div"))
+
+    def __neg__(self):
+        """Inverts the colors. All components except for alpha are inverted.
+
+        Returns:
+            ColorArray - Colors (1-r, 1-g, 1-b, a)
+        """
+        data = self.data.copy()
+        data[:, 0:3] = 1 - data[:, 0:3]
+        return ColorArray(data)
+
+    def equals(self, c):
+        """Checks which colors are equal to the given ones, with a tolerance of 0.0001.
+
+        Arguments:
+            c {Color, ColorArray} -- Colors to compare
+
+        Returns:
+            np.array - (N) bool array, True for the colors that are the same
+        """
+        difference = self.data - ColorArray._components(c, "eq")
+        return np.sqrt((difference * difference).sum(axis=1)) < 0.0001
+
+    def magnitude(self):
+        """Returns the magnitude of the colors.
+
+        Returns:
+            np.array - (N) array with the magnitude of each color as a 4D vector
+        """
+        return np.sqrt(self.dot(self))
+
+    def dot(self, c):
+        """Computes the dot product of the colors with a Color or with the colors of another
+        ColorArray of the same size.
+
+        Arguments:
+            c {Color, ColorArray} -- Colors to do the dot product with
+
+        Returns:
+            np.array - (N) array with the dot product of each color
+        """
+        return (self.data * ColorArray._components(c, "dot")).sum(axis=1)
+
+    def normalize(self):
+        """Normalizes these colors in place, as if they were 4D vectors.
+        """
+        self.data /= self.magnitude()[:, np.newaxis]
+        self.invalidate()
+
+    def normalized(self):
+        """Returns the normalized version of these colors, treating them as 4D vectors.
+
+        Returns:
+            ColorArray - Normalized colors
+        """
+        return ColorArray(self.data / self.magnitude()[:, np.newaxis])
+
+    def premult_alpha(self):
+        """Multiplies the RGB components with the alpha component, for use with pre-multiplied
+        alpha blend mode and returns the new colors.
+
+        Returns:
+            ColorArray - Premultiplied colors
+        """
+        data = self.data.copy()
+        data[:, 0:3] *= data[:, 3:4]
+        return ColorArray(data)
+
+    def saturate(self):
+        """Clamps all the components of these colors to the [0..1] range, in place
+        """
+        np.clip(self.data, 0, 1, out=self.data)
+        self.invalidate()
+
+    def saturated(self):
+        """Returns a clamped version of these colors
+
+        Returns:
+            ColorArray - Clamped colors
+        """
+        return ColorArray(np.clip(self.data, 0, 1))
+
+    def invalidate(self):
+        """
+        Signals that the colors changed. This is done automatically by the operations that
+        change the colors in place, but has to be called if data is changed directly.
+        """
+        self.version += 1
+
+    def to_rgb8(self):
+        """Converts the colors to 8-bit RGB, to be used with Pygame or the backends. Components
+        are clamped to the [0..255] range.
+
+        Returns:
+            np.array - (N,3) uint8 array with the colors
+        """
+        return np.clip(self.data[:, 0:3] * 255, 0, 255).astype(np.uint8)
+
+    def to_rgba8(self):
+        """Converts the colors to 8-bit RGBA. Components are clamped to the [0..255] range.
+
+        Returns:
+            np.array - (N,4) uint8 array with the colors
+        """
+        return np.clip(self.data * 255, 0, 255).astype(np.uint8)
+
+    def to_colors(self):
+        """Converts the colors to a list of Color.
+
+        Returns:
+            list[Color] - Colors
+        """
+        return [Color(*c) for c in self.data.tolist()]
+
+    @staticmethod
+    def from_colors(colors):
+        """Creates a ColorArray from a list of Color.
+
+        Arguments:
+            colors {list[Color]} -- Colors
+
+        Returns:
+            ColorArray - New ColorArray
+        """
+        return ColorArray(np.array([(c.r, c.g, c.b, c.a) for c in colors],
+                                   dtype=np.float64).reshape((-1, 4)))
+
+    @staticmethod
+    def filled(color, count):
+        """Creates a ColorArray with count copies of the same color.
+
+        Arguments:
+            color {Color} -- Color
+
+            count {int} -- Number of colors
+
+        Returns:
+            ColorArray - New ColorArray
+        """
+        return ColorArray(np.tile([color.r, color.g, color.b, color.a], (count, 1)))
+
+    @staticmethod
+    def lerp(c1, c2, t):
+        """Interpolates linearly between two sets of colors, for example to map values to
+        a color gradient (like height or temperature).
+
+        Arguments:
+            c1 {Color, ColorArray} -- Colors at t = 0
+
+            c2 {Color, ColorArray} -- Colors at t = 1
+
+            t {np.array} -- (N) array with the interpolation factor of each color
+
+        Returns:
+            ColorArray - Interpolated colors
+        """
+        t = np.asarray(t, dtype=np.float64).reshape((-1, 1))
+        start = ColorArray._components(c1, "lerp")
+        return ColorArray(start + (ColorArray._components(c2, "lerp") - start) * t)
+
+    @staticmethod
+    def _components(c, op):
+        # RGBA components of a Color or ColorArray, in a shape that broadcasts with data
+        if isinstance(c, ColorArray):
+            return c.data
+        if isinstance(c, Color):
+            return np.array([c.r, c.g, c.b, c.a])
+        if isinstance(c, np.ndarray) and (c.ndim == 2) and (c.shape[1] == 4):
+            return c
+        raise InvalidColorOperationException(op, ColorArray, type(c))
+
+    @staticmethod
+    def _scalars(c, op):
+        # Scalar factors (one for all, or one per color), or color components
+        if isinstance(c, (int, float, np.number)):
+            return c
+        if isinstance(c, (Color, ColorArray)):
+            return ColorArray._components(c, op)
+        if isinstance(c, np.ndarray) and (c.ndim == 1):
+            return c[:, np.newaxis]
+        raise InvalidColorOperationException(op, ColorArray, type(c))
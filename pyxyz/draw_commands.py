@@ -0,0 +1,399 @@
+"""Draw command buffer class definition"""
+import numpy as np
+from pyxyz import kernels
+
+class DrawCommands:
+    """Draw command buffer class.
+    Stores everything needed to draw a set of polygons on screen, in packed NumPy arrays:
+    screen-space vertex positions and depths, polygon ranges, and a color and line width per
+    polygon. Rendering is split in two stages: the scene (or a mesh) is projected into a
+    DrawCommands, which is then drawn by a backend (see pyxyz.backends). Commands don't depend
+    on the scene after being created, so they can be kept and drawn again later.
+    """
+    def __init__(self, rect, perspective=True):
+        """
+        Arguments:
+
+            rect {4-tuple} -- (x, y, width, height) of the viewport where the commands are
+            drawn, in pixels
+
+            perspective {bool} -- True if the commands were projected with a perspective camera,
+            defaults to True
+        """
+        self.rect = tuple(rect)
+        """{4-tuple} (x, y, width, height) of the viewport where the commands are drawn"""
+        self.perspective = perspective
+        """{bool} True if the commands were projected with a perspective camera. Backends need
+        this to interpolate depth correctly"""
+        self.points = np.zeros((0, 2))
+        """{np.array} (I,2) array with the screen position of the vertices of all polygons, one
+        polygon after the other"""
+        self.depth = np.zeros(0)
+        """{np.array} (I) array with the view depth of the vertices"""
+        self.offsets = np.zeros(1, dtype=np.int32)
+        """{np.array} (P+1) array such that polygon i uses points[offsets[i]:offsets[i+1]]"""
+        self.colors = np.zeros((0, 3), dtype=np.uint8)
+        """{np.array} (P,3) array with the color of each polygon, in the [0..255] range"""
+        self.widths = np.zeros(0, dtype=np.int32)
+        """{np.array} (P) array with the line width of each polygon. A width of 0 means the
+        polygon is filled, like in pygame.draw.polygon"""
+        self.polygon_item = np.zeros(0, dtype=np.int32)
+        """{np.array} (P) array with the index of the object (item of the Frame) each polygon
+        comes from"""
+        self.vertex_colors = None
+        """{np.array} (I,3) uint8 array with the color of each vertex, for backends that can
+        draw color gradients, or None to use the color of each polygon"""
+        self.closed = np.zeros(0, dtype=bool)
+        """{np.array} (P) bool array, False for the polygons that are open line strips (see
+        Polyline). Open polygons are never filled: they're drawn as lines, at least 1 pixel
+        wide"""
+
+    def get_polygon_count(self):
+        """
+        Returns:
+            {int} - Number of polygons in this buffer
+        """
+        return len(self.offsets) - 1
+
+    def get_polygon_bounds(self):
+        """
+        Retrieves the screen-space bounding box of each polygon.
+
+        Returns:
+            {np.array} - (P,4) array with the (min x, min y, max x, max y) of each polygon,
+            (inf, inf, -inf, -inf) for the empty ones
+        """
+        points = np.asarray(self.points, dtype=np.float64).reshape(-1, 2)
+        bounds = np.empty((self.get_polygon_count(), 4))
+        bounds[:, 0:2] = kernels.reduce_polygons(np.minimum, points, self.offsets, np.inf)
+        bounds[:, 2:4] = kernels.reduce_polygons(np.maximum, points, self.offsets, -np.inf)
+
+        return bounds
+
+    def get_batches(self):
+        """
+        Splits the polygons in batches of consecutive polygons with the same color and line
+        width, that backends can draw together.
+
+        Returns:
+            {np.array} - (B+1) array such that batch i has the polygons from batches[i] to
+            batches[i+1] (exclusive)
+        """
+        count = self.get_polygon_count()
+        change = np.ones(count, dtype=bool)
+        if count > 1:
+            change[1:] = (self.colors[1:] != self.colors[:-1]).any(axis=1) | \
+                         (self.widths[1:] != self.widths[:-1])
+
+        return np.append(change.nonzero()[0], count).astype(np.int32)
+
+    def get_triangles(self):
+        """
+        Retrieves a triangulation (triangle fans) of all the closed polygons.
+
+        Returns:
+            {2-tuple} - (triangles, polygon), where triangles is a (T,3) array of indices into
+            points and polygon is a (T) array with the polygon of each triangle
+        """
+        triangles, polygon = get_triangle_fans(self.offsets)
+        if self.closed.all():
+            return triangles, polygon
+
+        keep = self.closed[polygon]
+        return triangles[keep], polygon[keep]
+
+    def get_edges(self):
+        """
+        Retrieves all the edges of all the polygons. In closed polygons, the last vertex
+        connects to the first one.
+
+        Returns:
+            {2-tuple} - (edges, polygon), where edges is a (E,2) array of indices into points
+            and polygon is a (E) array with the polygon of each edge
+        """
+        counts = np.diff(self.offsets)
+        polygon = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+        start = np.arange(len(self.points), dtype=np.int32)
+        end = start + 1
+        last = self.offsets[1:] - 1
+        end[last[counts > 0]] = self.offsets[:-1][counts > 0]
+        edges = np.stack((start, end), axis=1)
+        if self.closed.all():
+            return edges, polygon
+
+        # Open polygons don't have the edge back to their first vertex
+        keep = np.ones(len(edges), dtype=bool)
+        keep[last[(counts > 0) & ~self.closed]] = False
+        return edges[keep], polygon[keep]
+
+    def split_strips(self, margin=None):
+        """
+        Splits the open polygons (line strips) with vertices behind the camera (depth <= 0, with
+        perspective projections) at those vertices, keeping the pieces with at least one
+        segment in front of the camera, so strips are culled segment by segment instead of as a
+        whole. The pieces keep the style, object and drawing order of their strip.
+
+        Arguments:
+
+            margin {number} -- Distance in pixels that the pieces can be outside of the viewport
+            and still be kept, or None to keep them all (see kernels.frustum_test). Defaults to
+            None
+
+        Returns:
+            {DrawCommands} - This buffer, if no strip has to be split, or a new one with the
+            strips split
+        """
+        if (not self.perspective) or self.closed.all():
+            return self
+        counts = np.diff(self.offsets)
+        entry_polygon = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+        cut = (self.depth <= 0) & ~self.closed[entry_polygon]
+        if not cut.any():
+            return self
+
+        # Pieces are the runs of kept entries of each polygon. Pieces of a single point are
+        # dropped, if they come from a strip that was split
+        keep = ~cut
+        start = keep.copy()
+        start[1:] &= ~keep[:-1] | (entry_polygon[1:] != entry_polygon[:-1])
+        entries = keep.nonzero()[0]
+        entry_piece = np.cumsum(start)[entries] - 1
+        piece_counts = np.bincount(entry_piece, minlength=int(start.sum()))
+        piece_polygon = entry_polygon[start]
+        split = np.zeros(len(counts), dtype=bool)
+        split[entry_polygon[cut]] = True
+        pieces = ~split[piece_polygon] | (piece_counts > 1)
+        entries = entries[pieces[entry_piece]]
+        piece_polygon = piece_polygon[pieces]
+
+        commands = DrawCommands(self.rect, self.perspective)
+        commands.points = self.points[entries]
+        commands.depth = self.depth[entries]
+        commands.offsets = np.zeros(len(piece_polygon) + 1, dtype=np.int32)
+        np.cumsum(piece_counts[pieces], out=commands.offsets[1:])
+        commands.colors = self.colors[piece_polygon]
+        commands.widths = self.widths[piece_polygon]
+        commands.polygon_item = self.polygon_item[piece_polygon]
+        commands.closed = self.closed[piece_polygon]
+        if self.vertex_colors is not None:
+            commands.vertex_colors = self.vertex_colors[entries]
+        if margin is None:
+            return commands
+
+        # Only the pieces need to be tested, the rest of the polygons already were
+        visible = kernels.frustum_test(commands.points, commands.depth, commands.offsets,
+                                       self.rect, margin) | ~split[piece_polygon]
+        return DrawCommands.from_polygons(commands.points, commands.depth, commands.offsets,
+                                          commands.colors, commands.widths, self.rect,
+                                          self.perspective, visible.nonzero()[0],
+                                          commands.polygon_item, commands.vertex_colors,
+                                          commands.closed)
+
+    @staticmethod
+    def from_polygons(points, depth, offsets, colors, widths, rect, perspective, order=None,
+                      polygon_item=None, vertex_colors=None, closed=None):
+        """
+        Creates a command buffer from projected polygons, optionally selecting and reordering
+        them.
+
+        Arguments:
+
+            points {np.array} -- (I,2) array with the screen position of the vertices
+
+            depth {np.array} -- (I) array with the view depth of the vertices
+
+            offsets {np.array} -- (P+1) array with the range of each polygon in points
+
+            colors {np.array} -- (P,3) array with the color of each polygon
+
+            widths {np.array} -- (P) array with the line width of each polygon
+
+            rect {4-tuple} -- (x, y, width, height) of the viewport
+
+            perspective {bool} -- True if projected with a perspective camera
+
+            order {np.array} -- Polygons to keep, in the order they should be drawn. If None,
+            all the polygons are kept in their order
+
+            polygon_item {np.array} -- (P) array with the object each polygon comes from, or
+            None if they all come from the same one
+
+            vertex_colors {np.array} -- (I,3) array with the color of each vertex, or None
+
+            closed {np.array} -- (P) bool array, False for the open polygons, or None if they're
+            all closed
+
+        Returns:
+            {DrawCommands} - New command buffer
+        """
+        commands = DrawCommands(rect, perspective)
+        offsets = np.asarray(offsets)
+        if polygon_item is None:
+            polygon_item = np.zeros(len(offsets) - 1, dtype=np.int32)
+        if closed is None:
+            closed = np.ones(len(offsets) - 1, dtype=bool)
+        if order is None:
+            commands.points = points
+            commands.depth = depth
+            commands.offsets = offsets
+            commands.colors = colors
+            commands.widths = widths
+            commands.polygon_item = polygon_item
+            commands.vertex_colors = vertex_colors
+            commands.closed = closed
+            return commands
+
+        counts = np.diff(offsets)[order]
+        commands.offsets = np.zeros(len(order) + 1, dtype=np.int32)
+        np.cumsum(counts, out=commands.offsets[1:])
+
+        vertex = np.repeat(offsets[:-1][order] - commands.offsets[:-1], counts) + \
+                 np.arange(commands.offsets[-1])
+        commands.points = points[vertex]
+        commands.depth = depth[vertex]
+        commands.colors = colors[order]
+        commands.widths = widths[order]
+        commands.polygon_item = polygon_item[order]
+        commands.closed = closed[order]
+        if vertex_colors is not None:
+            commands.vertex_colors = vertex_colors[vertex]
+
+        return commands
+
+    @staticmethod
+    def from_mesh(mesh, rect, clip_matrix, material):
+        """
+        Projects a mesh (or anything with the same get_packed, closed and name, like a
+        Polyline) and creates the commands to draw it with a material.
+
+        Arguments:
+
+            mesh {Mesh} -- Mesh to project
+
+            rect {4-tuple} -- (x, y, width, height) of the viewport
+
+            clip_matrix {np.array} -- Clip matrix to use to convert the 3d local space coordinates
+            of the vertices to screen coordinates
+
+            material {Material} -- Material to be used to render the mesh
+
+        Returns:
+            {DrawCommands} - New command buffer
+        """
+        vertices, indices, offsets = mesh.get_packed()
+
+        # Multiply all the vertices by the clip matrix at once, then convert them from
+        # homogeneous NDC to screen coordinates (divide by w, scale it by the viewport resolution
+        # and offset it), culling the polygons outside of the viewport. Affine clip matrices
+        # (from ortographic cameras) always give w = 1, so those skip computing w and dividing,
+        # and use the clip z (the view depth) as the depth
+        polygon_count = len(offsets) - 1
+        _, line_width = material.get_style()
+        clip_matrix = np.asarray(clip_matrix)
+        perspective = not ((clip_matrix[0:3, 3] == 0).all() and (clip_matrix[3, 3] == 1))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if perspective:
+                clip, points = kernels.project(vertices, clip_matrix, indices, rect)
+                depth = w = clip[:, 3]
+            else:
+                points, depth = kernels.project_affine(vertices, clip_matrix[:, 0:3], indices,
+                                                       rect)
+                w = np.ones(len(depth))
+            visible = kernels.frustum_test(points, w, offsets, rect, line_width * 0.5 + 2)
+            if perspective and not mesh.closed:
+                visible |= DrawCommands.get_partial_strips(w, offsets,
+                                                           np.zeros(polygon_count, dtype=bool))
+        polygon_colors, index_colors = material.get_mesh_colors(mesh)
+        if material.vertex_colors is None:
+            index_colors = None
+
+        commands = DrawCommands.from_polygons(points, depth, offsets, polygon_colors,
+                                              np.full(polygon_count, line_width, dtype=np.int32),
+                                              tuple(rect), perspective, visible.nonzero()[0],
+                                              None, index_colors,
+                                              np.full(polygon_count, mesh.closed, dtype=bool))
+
+        return commands.split_strips(line_width * 0.5 + 2)
+
+    @staticmethod
+    def get_partial_strips(w, offsets, closed):
+        """
+        Finds the open polygons (line strips) that have some vertices behind the camera, but
+        also some segment in front of it. kernels.frustum_test culls them, like all polygons
+        with vertices behind the camera, but they can be drawn in pieces (see split_strips).
+
+        Arguments:
+
+            w {np.array} -- (I) array with the clip-space w of the vertices
+
+            offsets {np.array} -- (P+1) array with the range of each polygon
+
+            closed {np.array} -- (P) bool array, False for the open polygons
+
+        Returns:
+            {np.array} - (P) bool array, True for the open polygons that have to be split
+        """
+        closed = np.asarray(closed)
+        partial = np.zeros(len(closed), dtype=bool)
+        if closed.all() or (len(w) < 2):
+            return partial
+
+        # Segments join consecutive vertices of the same polygon
+        counts = np.diff(offsets)
+        entry_polygon = np.repeat(np.arange(len(counts)), counts)
+        front = w > 0
+        segment = front[:-1] & front[1:] & (entry_polygon[:-1] == entry_polygon[1:])
+        partial[entry_polygon[:-1][segment]] = True
+        behind = np.zeros(len(closed), dtype=bool)
+        behind[entry_polygon[~front]] = True
+
+        return partial & behind & ~closed
+
+    @staticmethod
+    def clip_to_screen(clip, offsets, rect, margin=None):
+        """
+        Converts clip-space positions to screen positions in a viewport, dividing by w (see
+        kernels.perspective_divide and kernels.frustum_test).
+
+        Arguments:
+
+            clip {np.array} -- (I,4) array with the clip-space position of the vertices of all
+            polygons
+
+            offsets {np.array} -- (P+1) array with the range of each polygon in clip
+
+            rect {4-tuple} -- (x, y, width, height) of the viewport
+
+            margin {number} -- Distance in pixels that polygons can be outside of the viewport
+            and still be visible, or None to not cull polygons outside of it. Defaults to None
+
+        Returns:
+            {2-tuple} - (points, visible), where points is a (I,2) array with the screen
+            positions and visible is a (P) bool array, False for the polygons with vertices
+            behind the camera (w <= 0), or outside of the viewport
+        """
+        points = kernels.perspective_divide(clip, rect)
+
+        return points, kernels.frustum_test(points, clip[:, 3], offsets, rect, margin)
+
+def get_triangle_fans(offsets):
+    """
+    Triangulates packed polygons, splitting each one in a triangle fan around its first vertex.
+    Polygons with less than 3 vertices don't generate triangles.
+
+    Arguments:
+
+        offsets {np.array} -- (P+1) array with the range of each polygon
+
+    Returns:
+        {2-tuple} - (triangles, polygon), where triangles is a (T,3) array of positions in the
+        packed vertex range and polygon is a (T) array with the polygon of each triangle
+    """
+    offsets = np.asarray(offsets)
+    counts = np.maximum(np.diff(offsets) - 2, 0)
+    polygon = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    corner = np.arange(len(polygon), dtype=np.int32) - first + 1
+    start = offsets[polygon]
+
+    return np.stack((start, start + corner, start + corner + 1), axis=1), polygon
@@ -0,0 +1,95 @@
+"""Fog class definition"""
+import numpy as np
+from pyxyz.color import Color
+
+class Fog:
+    """Fog class.
+    Distance fog (depth cueing) for a scene (see Scene.fog): polygons are blended toward the
+    fog color according to their view depth, so that far away geometry fades into the
+    background and long views are easier to read. The fog goes linearly from none at the start
+    distance to full at the end distance.
+    The amount of fog is quantized into a few bins, so polygons at similar depths get exactly
+    the same color, and backends can still draw them in batches.
+    """
+    def __init__(self, color, start=10, end=100, bins=8):
+        """
+        Arguments:
+
+            color {Color} -- Color of the fog, normally the same as the background
+
+            start {number} -- View depth where the fog starts, defaults to 10
+
+            end {number} -- View depth where the fog is full, and the polygons have the fog
+            color, defaults to 100
+
+            bins {int} -- Number of different amounts of fog, besides no fog. Use 0 to blend
+            each polygon by its exact depth. Defaults to 8
+        """
+        self.color = color
+        """{Color} Color of the fog"""
+        self.start = start
+        """{number} View depth where the fog starts"""
+        self.end = end
+        """{number} View depth where the fog is full"""
+        self.bins = bins
+        """{int} Number of different amounts of fog, besides no fog, or 0 to not quantize
+        it"""
+
+    def get_key(self):
+        """
+        Retrieves a key that changes when any of the fog settings change, to know if colors
+        computed with it are still valid.
+
+        Returns:
+            {tuple} - Key
+        """
+        color = self.color
+        return (id(color), color.r, color.g, color.b, self.start, self.end, self.bins)
+
+    def copy(self):
+        """
+        Creates a copy of this fog, with its own copy of the color, that doesn't change when
+        this one does.
+
+        Returns:
+            {Fog} - New fog
+        """
+        color = self.color
+        return Fog(Color(color.r, color.g, color.b, color.a), self.start, self.end, self.bins)
+
+    def get_factor(self, depth):
+        """
+        Computes the amount of fog at the given view depths.
+
+        Arguments:
+
+            depth {np.array} -- (N) array with the view depths
+
+        Returns:
+            {np.array} - (N) array with the amount of fog, from 0 (none) to 1 (full)
+        """
+        distance = max(self.end - self.start, 1e-6)
+        factor = np.clip((np.asarray(depth, dtype=np.float64) - self.start) / distance, 0, 1)
+        if self.bins > 0:
+            factor = np.round(factor * self.bins) / self.bins
+
+        return factor
+
+    def apply(self, colors, depth):
+        """
+        Blends colors toward the fog color, all at once.
+
+        Arguments:
+
+            colors {np.array} -- (N,3) uint8 array with the colors, in the [0..255] range
+
+            depth {np.array} -- (N) array with the view depth of each color
+
+        Returns:
+            {np.array} - (N,3) uint8 array with the fogged colors
+        """
+        fog_color = np.clip(np.array(self.color.tuple3(), dtype=np.float64), 0, 255)
+        factor = self.get_factor(depth)[:, np.newaxis]
+        fogged = colors + (fog_color - colors) * factor
+
+        return np.round(fogged).astype(np.uint8).reshape((-1, 3))
@@ -0,0 +1,243 @@
+"""Frame class definition"""
+import numpy as np
+from pyxyz import kernels
+from pyxyz.transforms import get_world_matrices
+from pyxyz.object3d import Object3d
+from pyxyz.particle_system import ParticleSystem
+
+class Frame:
+    """Frame class.
+    World-space geometry of a scene at a given moment. The hierarchy is traversed and all
+    the vertices are transformed to world space only once, when the frame is created, and
+    stored packed in a single array, so that any number of cameras can then project it with a
+    single matrix multiplication each.
+    """
+    def __init__(self, scene, previous=None):
+        """
+        Arguments:
+
+            scene {Scene} -- Scene to capture
+
+            previous {Frame} -- Previous frame captured from the same scene, or None. If given,
+            the world-space vertices of the objects that didn't change since then are reused
+            instead of being transformed again, and if nothing changed at all, the whole packed
+            geometry is reused
+        """
+        self.items = []
+        """{list[tuple]} List of (object, mesh, material, world_matrix) of all the objects with
+        a mesh (or polyline) and a material, in the order they are rendered"""
+        self.particles = []
+        """{list[tuple]} List of (particle_system, world_matrix, particles) of all the particle
+        systems, where particles is a snapshot of their particles (see ParticleSystem.capture)"""
+        self.custom_objects = []
+        """{list[tuple]} List of (object, parent_matrix) of the objects whose class overrides
+        Object3d.render, in hierarchy order, where parent_matrix is the world matrix of their
+        parent. Those objects (and their children, that they render themselves) are not
+        captured, and have to be rendered with their render function, after the rest of the
+        frame (see Scene.render_frame)"""
+
+        # The fog is copied, so that changing it doesn't affect the frames already captured
+        # (for example, while a RenderPipeline draws them), but the copy is reused while it
+        # doesn't change
+        fog = scene.fog
+        self.fog_key = fog.get_key() if fog is not None else None
+        """{tuple} Key of the fog of the scene when the frame was captured (see Fog.get_key),
+        or None if it had no fog"""
+        self.fog = None
+        """{Fog} Copy of the fog of the scene when the frame was captured, or None"""
+        if (previous is not None) and (fog is not None) and (previous.fog_key == self.fog_key):
+            self.fog = previous.fog
+        elif fog is not None:
+            self.fog = fog.copy()
+
+        # Compute the world matrices of all the objects at once, from the flattened hierarchy
+        objects, parents = scene.get_flattened()
+        local_matrices = np.array([obj.get_matrix() for obj in objects]).reshape((-1, 4, 4))
+        world_matrices = get_world_matrices(local_matrices, parents)
+        item_objects = []
+        custom = np.zeros(len(objects), dtype=bool)
+        for object_index, (obj, world_matrix) in enumerate(zip(objects, world_matrices)):
+            parent = parents[object_index]
+            if (parent >= 0) and custom[parent]:
+                custom[object_index] = True
+            elif type(obj).render is not Object3d.render:
+                custom[object_index] = True
+                self.custom_objects.append((obj, world_matrices[parent] if parent >= 0
+                                            else np.identity(4)))
+            elif (obj.material is not None) and (obj.mesh is not None):
+                self.items.append((obj, obj.mesh, obj.material, world_matrix))
+                item_objects.append(object_index)
+            elif isinstance(obj, ParticleSystem):
+                self.particles.append((obj, world_matrix, obj.capture()))
+
+        # If the hierarchy is the same as in the previous frame, compare all the world matrices
+        # with the previous ones at once
+        same_matrix = None
+        if (previous is not None) and (previous._objects is objects):
+            same_matrix = (world_matrices == previous._world_matrices).all(axis=(1, 2))
+        self._objects = objects
+        self._world_matrices = world_matrices
+
+        # Styles are retrieved once per material, as many objects normally share each one
+        styles = {}
+        for _, _, material, _ in self.items:
+            if id(material) not in styles:
+                styles[id(material)] = material.get_style()
+        self.item_styles = [styles[id(material)] for _, _, material, _ in self.items]
+        """{list[2-tuple]} (color, line_width) of the material of each item (see
+        Material.get_style)"""
+
+        groups = {}
+        self.item_group = np.array([groups.setdefault(style, len(groups))
+                                    for style in self.item_styles], dtype=np.int32)
+        """{np.array} (N) array with the material group of each item. Items whose materials
+        have the same style are in the same group, numbered in order of first use"""
+        self.group_styles = list(groups)
+        """{list[2-tuple]} (color, line_width) of each material group"""
+        self.item_closed = np.array([mesh.closed for _, mesh, _, _ in self.items], dtype=bool)
+        """{np.array} (N) bool array, False for the items whose polygons are open line strips
+        (see Mesh.closed)"""
+        self.item_keys = [(style, material.get_colors_key())
+                          for style, (_, _, material, _) in zip(self.item_styles, self.items)]
+        """{list[2-tuple]} (style, colors key) of each item, that changes when anything about
+        how the item is drawn changes (see Material.get_colors_key)"""
+        self.item_vertices = []
+        """{list[np.array]} World-space vertices of each item. Arrays are reused between frames
+        while the object doesn't change, so comparing them with 'is' tells if an object changed
+        between two frames"""
+        self.item_changed = np.ones(len(self.items), dtype=bool)
+        """{np.array} (N) bool array, True for the items that changed (in geometry, transform or
+        material) since the previous frame, or that weren't on it"""
+
+        # Meshes are packed once per frame, even if several objects use them, as meshes with
+        # a polygons list read it again every time
+        packed = {}
+        for _, mesh, _, _ in self.items:
+            if id(mesh) not in packed:
+                packed[id(mesh)] = mesh.get_packed()
+
+        cache = previous._item_cache if previous is not None else {}
+        self._item_cache = {}
+        for item_index, (obj, mesh, _, world_matrix) in enumerate(self.items):
+            mesh_vertices, _, _ = packed[id(mesh)]
+            cached = cache.get(id(obj))
+            if (cached is not None) and (cached[0] is obj) and (cached[1] is mesh) and \
+               (cached[2] == mesh.version) and \
+               (same_matrix[item_objects[item_index]] if same_matrix is not None
+                else np.array_equal(cached[3], world_matrix)):
+                world_vertices = cached[4]
+                self.item_changed[item_index] = cached[5] != self.item_keys[item_index]
+            else:
+                world_vertices = mesh_vertices @ world_matrix[0:3] + world_matrix[3]
+            self.item_vertices.append(world_vertices)
+            self._item_cache[id(obj)] = (obj, mesh, mesh.version, world_matrix, world_vertices,
+                                         self.item_keys[item_index])
+
+        self.generation = 0
+        """{int} Generation of the geometry of this frame. Frames captured one after the other
+        with the same generation have exactly the same geometry and materials"""
+        if (previous is not None) and (len(previous.items) == len(self.items)) and \
+           (not self.item_changed.any()) and \
+           all(a[0] is b[0] for a, b in zip(previous.items, self.items)):
+            # Nothing changed, so reuse everything
+            self.generation = previous.generation
+            self.vertices = previous.vertices
+            self.indices = previous.indices
+            self.offsets = previous.offsets
+            self.polygon_item = previous.polygon_item
+            self.polygon_colors = previous.polygon_colors
+            self.index_colors = previous.index_colors
+            return
+
+        if previous is not None:
+            self.generation = previous.generation + 1
+
+        indices = []
+        offsets = [np.zeros(1, dtype=np.int32)]
+        polygon_item = []
+        vertex_base = 0
+        index_base = 0
+        for item_index, (_, mesh, _, _) in enumerate(self.items):
+            mesh_vertices, mesh_indices, mesh_offsets = packed[id(mesh)]
+            indices.append(mesh_indices + vertex_base)
+            offsets.append(mesh_offsets[1:] + index_base)
+            polygon_item.append(np.full(len(mesh_offsets) - 1, item_index, dtype=np.int32))
+            vertex_base += len(mesh_vertices)
+            index_base += len(mesh_indices)
+
+        self.vertices = np.concatenate(self.item_vertices) if self.items else np.zeros((0, 4))
+        """{np.array} (V,4) array with the homogeneous world-space position of all vertices"""
+        self.indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32)
+        """{np.array} Vertex indices of all polygons, one after the other"""
+        self.offsets = np.concatenate(offsets)
+        """{np.array} (P+1) array such that polygon i uses indices[offsets[i]:offsets[i+1]]"""
+        self.polygon_item = np.concatenate(polygon_item) if polygon_item \
+            else np.zeros(0, dtype=np.int32)
+        """{np.array} (P) array with the index (in items) of the object of each polygon"""
+
+        self.polygon_colors = None
+        """{np.array} (P,3) uint8 array with the color of each polygon, or None if no material
+        has per-polygon or per-vertex colors (the color of each material is used then)"""
+        self.index_colors = None
+        """{np.array} (I,3) uint8 array with the color of each entry of indices (each vertex
+        of each polygon), or None if no material has per-vertex colors"""
+        if any(key[1] is not None for key in self.item_keys):
+            colors = [material.get_mesh_colors(mesh) for _, mesh, material, _ in self.items]
+            self.polygon_colors = np.concatenate([c[0] for c in colors])
+            if any(material.vertex_colors is not None for _, _, material, _ in self.items):
+                self.index_colors = np.concatenate([c[1] for c in colors])
+
+    def project(self, camera, rect, margin=None):
+        """
+        Projects the frame with the given camera into a viewport.
+        The projection of the camera works in pixels, so its resolution should match the size of
+        the viewport.
+
+        Arguments:
+
+            camera {Camera} -- Camera to use
+
+            rect {4-tuple} -- (x, y, width, height) of the viewport, in pixels
+
+            margin {number} -- Distance in pixels that polygons can be outside of the viewport
+            and still be visible, or None to not cull polygons outside of it (see
+            kernels.frustum_test). Defaults to None
+
+        Returns:
+            {3-tuple} - (points, depth, visible), where points is a (I,2) array with the screen
+            position of the vertex of each entry of indices (so polygon i is
+            points[offsets[i]:offsets[i+1]]), depth is a (I) array with the view depth of those
+            vertices (the clip-space w for perspective cameras) and visible is a (P) bool array,
+            False for polygons with vertices behind the camera, or outside of the viewport
+        """
+        if camera.ortho:
+            # Ortographic projections are affine, so project straight to screen positions and
+            # depth, without computing w or dividing by it
+            points, depth = kernels.project_affine(self.vertices, camera.get_ortho_matrix(),
+                                                   self.indices, rect)
+            visible = kernels.frustum_test(points, np.ones(len(depth)), self.offsets, rect,
+                                           margin)
+            return points, depth, visible
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            clip, points = kernels.project(self.vertices, camera.get_view_projection_matrix(),
+                                           self.indices, rect)
+            visible = kernels.frustum_test(points, clip[:, 3], self.offsets, rect, margin)
+
+        return points, clip[:, 3], visible
+
+    def get_polygon_depth(self, depth):
+        """
+        Computes the depth of each polygon, as the average depth of its vertices.
+
+        Arguments:
+
+            depth {np.array} -- (I) array with the depth of the vertices, as returned by project
+
+        Returns:
+            {np.array} - (P) array with the depth of each polygon
+        """
+        counts = np.diff(self.offsets)
+        sums = kernels.reduce_polygons(np.add, np.asarray(depth, dtype=np.float64),
+                                       self.offsets, 0)
+        return sums / np.maximum(counts, 1)
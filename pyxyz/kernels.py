@@ -0,0 +1,518 @@
+"""Optional compiled kernels for the hot loops of the engine.
+Each kernel has a NumPy implementation and a loop implementation that is compiled with Numba,
+if it is installed. The compiled version is used automatically when Numba is available (unless
+use_numba is set to False), and both give exactly the same results: the loops do the same
+floating point operations, in the same order, as the NumPy expressions.
+Numba is only imported, and the kernels only compiled, the first time a kernel is used."""
+import numpy as np
+
+use_numba = True
+"""{bool} If False, always use the NumPy implementations, even if Numba is installed"""
+
+# Compiled kernels, or False if Numba is not available. None until first needed
+_compiled = None
+
+def get_backend():
+    """
+    Retrieves which implementation the kernels use.
+
+    Returns:
+        {str} - "numba" if the kernels are compiled with Numba, "numpy" otherwise
+    """
+    return "numba" if _get_compiled() else "numpy"
+
+def _get_compiled():
+    global _compiled
+    if not use_numba:
+        return None
+    if _compiled is None:
+        try:
+            import numba
+            _compiled = {name: numba.njit(cache=True)(function)
+                         for name, function in _LOOPS.items()}
+        except ImportError:
+            _compiled = False
+
+    return _compiled
+
+def project(vertices, matrix, indices, rect):
+    """
+    Transforms vertices by a clip matrix, and converts them to screen positions in a viewport,
+    dividing by w (see DrawCommands.clip_to_screen). Each vertex is transformed once, even if
+    it's used by several polygons.
+
+    Arguments:
+
+        vertices {np.array} -- (V,3) array with the positions of the vertices, or (V,4) array
+        with their homogeneous positions
+
+        matrix {np.array} -- (4,4) clip matrix
+
+        indices {np.array} -- (I) array with the vertex of each entry of the result
+
+        rect {4-tuple} -- (x, y, width, height) of the viewport
+
+    Returns:
+        {2-tuple} - (clip, points), where clip is a (I,4) array with the clip-space positions
+        and points is a (I,2) array with the screen positions
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    indices = np.asarray(indices)
+    compiled = _get_compiled()
+    if compiled:
+        clip = np.empty((len(indices), 4))
+        points = np.empty((len(indices), 2))
+        compiled["project"](vertices, matrix, indices, np.asarray(rect, dtype=np.float64),
+                            clip, points)
+        return clip, points
+
+    # Explicit sums instead of a matrix multiplication, to do the same operations as the loop
+    clip = vertices[:, 0:1] * matrix[0]
+    for axis in range(1, vertices.shape[1]):
+        clip = clip + vertices[:, axis:axis + 1] * matrix[axis]
+    if vertices.shape[1] == 3:
+        clip = clip + matrix[3]
+    clip = clip[indices]
+
+    return clip, perspective_divide(clip, rect)
+
+def project_affine(vertices, matrix, indices, rect):
+    """
+    Transforms vertices by an affine clip matrix (one where w is always 1, like the ones of
+    ortographic cameras), and converts them to screen positions in a viewport, without
+    computing w or dividing by it. The matrix only has the 3 columns that are needed: clip x,
+    clip y and the depth. Each vertex is transformed once, even if it's used by several
+    polygons.
+
+    Arguments:
+
+        vertices {np.array} -- (V,3) array with the positions of the vertices, or (V,4) array
+        with their homogeneous positions (with w = 1)
+
+        matrix {np.array} -- (4,3) affine matrix, whose columns give the clip-space x and y
+        and the depth of each vertex
+
+        indices {np.array} -- (I) array with the vertex of each entry of the result
+
+        rect {4-tuple} -- (x, y, width, height) of the viewport
+
+    Returns:
+        {2-tuple} - (points, depth), where points is a (I,2) array with the screen positions
+        and depth is a (I) array with the depth
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    indices = np.asarray(indices)
+    compiled = _get_compiled()
+    if compiled:
+        points = np.empty((len(indices), 2))
+        depth = np.empty(len(indices))
+        compiled["affine"](vertices, matrix, indices, np.asarray(rect, dtype=np.float64),
+                           points, depth)
+        return points, depth
+
+    # Explicit sums instead of a matrix multiplication, to do the same operations as the loop
+    transformed = vertices[:, 0:1] * matrix[0]
+    for axis in range(1, vertices.shape[1]):
+        transformed = transformed + vertices[:, axis:axis + 1] * matrix[axis]
+    if vertices.shape[1] == 3:
+        transformed = transformed + matrix[3]
+    transformed = transformed[indices]
+
+    points = np.empty((len(indices), 2))
+    points[:, 0] = rect[0] + rect[2] * 0.5 + transformed[:, 0]
+    points[:, 1] = rect[1] + rect[3] * 0.5 - transformed[:, 1]
+
+    return points, transformed[:, 2]
+
+def perspective_divide(clip, rect):
+    """
+    Converts clip-space positions to screen positions in a viewport, dividing by w. Positions
+    behind the camera (w <= 0) are not divided.
+
+    Arguments:
+
+        clip {np.array} -- (I,4) array with clip-space positions
+
+        rect {4-tuple} -- (x, y, width, height) of the viewport
+
+    Returns:
+        {np.array} - (I,2) array with the screen positions
+    """
+    compiled = _get_compiled()
+    if compiled:
+        points = np.empty((len(clip), 2))
+        compiled["divide"](np.asarray(clip, dtype=np.float64),
+                           np.asarray(rect, dtype=np.float64), points)
+        return points
+
+    w = clip[:, 3]
+    inv_w = 1.0 / np.where(w > 0, w, 1)
+
+    points = np.empty((len(clip), 2))
+    points[:, 0] = rect[0] + rect[2] * 0.5 + clip[:, 0] * inv_w
+    points[:, 1] = rect[1] + rect[3] * 0.5 - clip[:, 1] * inv_w
+
+    return points
+
+def reduce_polygons(ufunc, values, offsets, empty):
+    """
+    Reduces the values of the vertices of each polygon with a ufunc (for example, np.add to sum
+    them). Unlike a plain ufunc.reduceat, empty polygons anywhere in the list are supported.
+
+    Arguments:
+
+        ufunc {np.ufunc} -- Binary ufunc used for the reduction
+
+        values {np.array} -- (I,...) array with the values of the vertices
+
+        offsets {np.array} -- (P+1) array with the range of each polygon
+
+        empty {number} -- Result of the empty polygons
+
+    Returns:
+        {np.array} - (P,...) array with the reduced values of each polygon
+    """
+    values = np.asarray(values)
+    offsets = np.asarray(offsets)
+    counts = np.diff(offsets)
+    nonempty = counts > 0
+    if not np.any(nonempty):
+        return np.full((len(counts),) + values.shape[1:], empty, dtype=values.dtype)
+
+    # Each non-empty polygon ends where the next one starts, since the empty polygons between
+    # them have no vertices, so reducing over their starts only gives the right ranges
+    reduced = ufunc.reduceat(values[:offsets[-1]], offsets[:-1][nonempty], axis=0)
+    result = np.full((len(counts),) + reduced.shape[1:], empty, dtype=reduced.dtype)
+    result[nonempty] = reduced
+
+    return result
+
+def frustum_test(points, w, offsets, rect, margin=None):
+    """
+    Finds which polygons can be visible: the ones with vertices, all of them in front of the
+    camera (w > 0), and, if a margin is given, not completely outside any side of the viewport.
+
+    Arguments:
+
+        points {np.array} -- (I,2) array with the screen position of the vertices
+
+        w {np.array} -- (I) array with the clip-space w of the vertices
+
+        offsets {np.array} -- (P+1) array with the range of each polygon
+
+        rect {4-tuple} -- (x, y, width, height) of the viewport
+
+        margin {number} -- Distance in pixels that polygons can be outside of the viewport
+        and still be visible (for example, due to the line width), or None to only check if
+        the polygons are in front of the camera. Defaults to None
+
+    Returns:
+        {np.array} - (P) bool array, True for the polygons that can be visible
+    """
+    margin = np.inf if margin is None else float(margin)
+    offsets = np.asarray(offsets)
+    compiled = _get_compiled()
+    if compiled:
+        visible = np.empty(len(offsets) - 1, dtype=np.bool_)
+        compiled["frustum"](np.asarray(points, dtype=np.float64),
+                            np.asarray(w, dtype=np.float64), offsets,
+                            np.asarray(rect, dtype=np.float64), margin, visible)
+        return visible
+
+    visible = np.diff(offsets) > 0
+    visible &= reduce_polygons(np.logical_and, np.asarray(w) > 0, offsets, False)
+    if margin < np.inf:
+        x, y = points[:, 0], points[:, 1]
+        for outside in (x < rect[0] - margin, x > rect[0] + rect[2] + margin,
+                        y < rect[1] - margin, y > rect[1] + rect[3] + margin):
+            visible &= ~reduce_polygons(np.logical_and, outside, offsets, True)
+
+    return visible
+
+def closest_samples(pixel, depth, size):
+    """
+    Finds the closest sample of each pixel, when several samples land on the same pixels. Of
+    several samples with the same depth, the last one is used.
+
+    Arguments:
+
+        pixel {np.array} -- (N) array with the index of the pixel of each sample
+
+        depth {np.array} -- (N) array with the depth of each sample
+
+        size {int} -- Number of pixels
+
+    Returns:
+        {np.array} - Indices of the closest sample of each pixel, in increasing order
+    """
+    compiled = _get_compiled()
+    if compiled:
+        return compiled["closest"](np.asarray(pixel, dtype=np.int64),
+                                   np.asarray(depth, dtype=np.float64), size)
+
+    # Find the minimum depth of each pixel, and then keep one of the samples with that depth
+    closest_depth = np.full(size, np.inf)
+    np.minimum.at(closest_depth, pixel, depth)
+    candidates = np.flatnonzero(depth <= closest_depth[pixel])
+    owner = np.empty(size, dtype=np.int64)
+    owner[pixel[candidates]] = candidates
+
+    return candidates[owner[pixel[candidates]] == candidates]
+
+def line_samples(start, end, start_key, end_key, width, height):
+    """
+    Steps along line segments (DDA), generating one sample per pixel along the major axis of
+    each line, with the pixel, the position along the line and the interpolated depth key of
+    each sample (see Rasterizer.draw_lines).
+
+    Arguments:
+
+        start {np.array} -- (E,2) array with the screen position of the start of the lines
+
+        end {np.array} -- (E,2) array with the screen position of the end of the lines
+
+        start_key {np.array} -- (E) array with the depth key of the start of the lines
+
+        end_key {np.array} -- (E) array with the depth key of the end of the lines
+
+        width {int} -- Width of the buffer, pixels are clamped to it
+
+        height {int} -- Height of the buffer, pixels are clamped to it
+
+    Returns:
+        {5-tuple} - (line, t, px, py, key), where line is a (S) array with the line of each
+        sample, t is a (S) array with its position along the line (from 0 at the start to 1 at
+        the end), px and py are (S) arrays with its pixel, and key is a (S) array with its
+        depth key
+    """
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+    start_key = np.asarray(start_key, dtype=np.float64)
+    end_key = np.asarray(end_key, dtype=np.float64)
+    counts = (np.ceil(np.abs(end - start).max(axis=1)) + 1).astype(np.int64)
+    compiled = _get_compiled()
+    if compiled:
+        total = int(counts.sum())
+        line = np.empty(total, dtype=np.int64)
+        t = np.empty(total)
+        px = np.empty(total, dtype=np.int64)
+        py = np.empty(total, dtype=np.int64)
+        key = np.empty(total)
+        compiled["line"](start, end, start_key, end_key, counts, width, height, line, t, px, py,
+                         key)
+        return line, t, px, py, key
+
+    line = np.repeat(np.arange(len(start)), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    t = (np.arange(len(line)) - first) / np.maximum(counts[line] - 1, 1)
+
+    samples = start[line] + (end - start)[line] * t[:, np.newaxis]
+    px = np.clip(np.floor(samples[:, 0]), 0, width - 1).astype(np.int64)
+    py = np.clip(np.floor(samples[:, 1]), 0, height - 1).astype(np.int64)
+    key = start_key[line] + (end_key - start_key)[line] * t
+
+    return line, t, px, py, key
+
+def perlin_grid(x, y, gradients, height):
+    """
+    Evaluates 2d Perlin noise at many positions (see perlin.noise2d).
+
+    Arguments:
+
+        x {np.array} -- (N) array with the x coordinates
+
+        y {np.array} -- (N) array with the y coordinates
+
+        gradients {np.array} -- (G,2) array with the table of gradients
+
+        height {int} -- Number of gradients in each row of the table
+
+    Returns:
+        {np.array} - (N) array with the noise at each position
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    compiled = _get_compiled()
+    if compiled:
+        noise = np.empty(len(x))
+        compiled["perlin"](x, y, gradients, height, noise)
+        return noise
+
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    x1 = x0 + 1.0
+    y1 = y0 + 1.0
+    i_x0 = x0.astype(np.int64)
+    i_x1 = x1.astype(np.int64)
+    i_y0 = y0.astype(np.int64)
+    i_y1 = y1.astype(np.int64)
+
+    def dot(i_x, i_y, dx, dy):
+        gradient = gradients[i_y * height + i_x]
+        return gradient[:, 0] * dx + gradient[:, 1] * dy
+
+    s = dot(i_x0, i_y0, x - x0, y - y0)
+    t = dot(i_x1, i_y0, x - x1, y - y0)
+    u = dot(i_x0, i_y1, x - x0, y - y1)
+    v = dot(i_x1, i_y1, x - x1, y - y1)
+
+    dx = x - x0
+    s_x = 3 * dx * dx - 2 * dx * dx * dx
+    a = s + s_x * t - s_x * s
+    b = u + s_x * v - s_x * u
+
+    dy = y - y0
+    s_y = 3 * dy * dy - 2 * dy * dy * dy
+
+    return a + s_y * b - s_y * a
+
+# Loop implementations, compiled with Numba. They are also valid (but slow) plain Python
+
+def _project_loop(vertices, matrix, indices, rect, clip, points):
+    count = vertices.shape[1]
+    transformed = np.empty((len(vertices), 4))
+    for i in range(len(vertices)):
+        for j in range(4):
+            value = vertices[i, 0] * matrix[0, j]
+            for k in range(1, count):
+                value = value + vertices[i, k] * matrix[k, j]
+            if count == 3:
+                value = value + matrix[3, j]
+            transformed[i, j] = value
+
+    center_x = rect[0] + rect[2] * 0.5
+    center_y = rect[1] + rect[3] * 0.5
+    for i in range(len(indices)):
+        for j in range(4):
+            clip[i, j] = transformed[indices[i], j]
+        w = clip[i, 3]
+        inv_w = 1.0 / (w if w > 0 else 1.0)
+        points[i, 0] = center_x + clip[i, 0] * inv_w
+        points[i, 1] = center_y - clip[i, 1] * inv_w
+
+def _affine_loop(vertices, matrix, indices, rect, points, depth):
+    count = vertices.shape[1]
+    transformed = np.empty((len(vertices), 3))
+    for i in range(len(vertices)):
+        for j in range(3):
+            value = vertices[i, 0] * matrix[0, j]
+            for k in range(1, count):
+                value = value + vertices[i, k] * matrix[k, j]
+            if count == 3:
+                value = value + matrix[3, j]
+            transformed[i, j] = value
+
+    center_x = rect[0] + rect[2] * 0.5
+    center_y = rect[1] + rect[3] * 0.5
+    for i in range(len(indices)):
+        points[i, 0] = center_x + transformed[indices[i], 0]
+        points[i, 1] = center_y - transformed[indices[i], 1]
+        depth[i] = transformed[indices[i], 2]
+
+def _divide_loop(clip, rect, points):
+    center_x = rect[0] + rect[2] * 0.5
+    center_y = rect[1] + rect[3] * 0.5
+    for i in range(len(clip)):
+        w = clip[i, 3]
+        inv_w = 1.0 / (w if w > 0 else 1.0)
+        points[i, 0] = center_x + clip[i, 0] * inv_w
+        points[i, 1] = center_y - clip[i, 1] * inv_w
+
+def _frustum_loop(points, w, offsets, rect, margin, visible):
+    left = rect[0] - margin
+    right = rect[0] + rect[2] + margin
+    top = rect[1] - margin
+    bottom = rect[1] + rect[3] + margin
+    for p in range(len(offsets) - 1):
+        start = offsets[p]
+        end = offsets[p + 1]
+        in_front = end > start
+        all_left = all_right = all_top = all_bottom = True
+        for i in range(start, end):
+            in_front = in_front and (w[i] > 0)
+            all_left = all_left and (points[i, 0] < left)
+            all_right = all_right and (points[i, 0] > right)
+            all_top = all_top and (points[i, 1] < top)
+            all_bottom = all_bottom and (points[i, 1] > bottom)
+        visible[p] = in_front and not (all_left or all_right or all_top or all_bottom)
+
+def _closest_loop(pixel, depth, size):
+    # Same as np.minimum.at, where NaN wins over any other depth, also keeping the last
+    # sample with the minimum depth
+    closest_depth = np.full(size, np.inf)
+    owner = np.full(size, -1, dtype=np.int64)
+    for i in range(len(pixel)):
+        current = closest_depth[pixel[i]]
+        if (current == current) and ((depth[i] != depth[i]) or (depth[i] < current)):
+            closest_depth[pixel[i]] = depth[i]
+            owner[pixel[i]] = i
+        elif depth[i] == current:
+            owner[pixel[i]] = i
+
+    count = 0
+    result = np.empty(len(pixel), dtype=np.int64)
+    for i in range(len(pixel)):
+        if (depth[i] <= closest_depth[pixel[i]]) and (owner[pixel[i]] == i):
+            result[count] = i
+            count += 1
+
+    return result[:count]
+
+def _line_loop(start, end, start_key, end_key, counts, width, height, line, t, px, py, key):
+    sample = 0
+    for i in range(len(counts)):
+        steps = max(counts[i] - 1, 1)
+        dx = end[i, 0] - start[i, 0]
+        dy = end[i, 1] - start[i, 1]
+        dk = end_key[i] - start_key[i]
+        for j in range(counts[i]):
+            position = j / steps
+            line[sample] = i
+            t[sample] = position
+            px[sample] = int(min(max(np.floor(start[i, 0] + dx * position), 0), width - 1))
+            py[sample] = int(min(max(np.floor(start[i, 1] + dy * position), 0), height - 1))
+            key[sample] = start_key[i] + dk * position
+            sample += 1
+
+def _perlin_loop(x, y, gradients, height, noise):
+    count = len(gradients)
+    for i in range(len(x)):
+        x0 = np.floor(x[i])
+        y0 = np.floor(y[i])
+        x1 = x0 + 1.0
+        y1 = y0 + 1.0
+
+        # Gradients at the corners (negative indices wrap, like in the NumPy version)
+        i00 = int(y0) * height + int(x0)
+        i10 = int(y0) * height + int(x1)
+        i01 = int(y1) * height + int(x0)
+        i11 = int(y1) * height + int(x1)
+        for index in (i00, i10, i01, i11):
+            if (index < -count) or (index >= count):
+                raise IndexError("Perlin noise coordinates out of range")
+
+        s = gradients[i00, 0] * (x[i] - x0) + gradients[i00, 1] * (y[i] - y0)
+        t = gradients[i10, 0] * (x[i] - x1) + gradients[i10, 1] * (y[i] - y0)
+        u = gradients[i01, 0] * (x[i] - x0) + gradients[i01, 1] * (y[i] - y1)
+        v = gradients[i11, 0] * (x[i] - x1) + gradients[i11, 1] * (y[i] - y1)
+
+        dx = x[i] - x0
+        s_x = 3 * dx * dx - 2 * dx * dx * dx
+        a = s + s_x * t - s_x * s
+        b = u + s_x * v - s_x * u
+
+        dy = y[i] - y0
+        s_y = 3 * dy * dy - 2 * dy * dy * dy
+        noise[i] = a + s_y * b - s_y * a
+
+_LOOPS = {
+    "divide": _divide_loop,
+    "project": _project_loop,
+    "affine": _affine_loop,
+    "frustum": _frustum_loop,
+    "closest": _closest_loop,
+    "line": _line_loop,
+    "perlin": _perlin_loop,
+}
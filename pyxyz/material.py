@@ -1,9 +1,12 @@
 """Material class definition"""
+import numpy as np
+from pyxyz import kernels
 
 class Material:
     """Material class.
-    Describe the properties of the mesh being drawn. Currently it only supports a
-    Color and a line width.
+    Describe the properties of the mesh being drawn: a Color and a line width. The color can
+    also be given per polygon or per vertex of the mesh (see polygon_colors and vertex_colors),
+    so a single material can draw a whole height-colored terrain or heatmap.
     """
     def __init__(self, Color, name="UnknownMaterial"):
         """
@@ -19,3 +22,88 @@ class Material:
         """{str} Name of this material"""
         self.line_width = 2
         """{int} Width of the lines on the mesh"""
+        self.polygon_colors = None
+        """{ColorArray} Color of each polygon of the mesh, or None to use Color for all of them.
+        Defaults to None"""
+        self.vertex_colors = None
+        """{ColorArray} Color of each vertex of the mesh (in the order of the packed vertex
+        array, see Mesh.get_packed), or None. If set, it is used instead of polygon_colors and
+        Color. Backends that can interpolate colors (like the RasterizerBackend) draw a gradient
+        across each polygon, the others use the average color of its vertices. Defaults to
+        None"""
+        self._style_key = None
+        self._style = None
+
+    def get_style(self):
+        """
+        Retrieves how this material is drawn, with the color already converted to the format
+        used by Pygame and the backends. This is cached, and only converted again when the
+        color or the line width change. Materials with the same style are drawn exactly the same
+        way, so the style is also used as the key to batch geometry by material.
+
+        Returns:
+            {2-tuple} - (color, line_width), where color is a (r,g,b) tuple of ints in the
+            [0..255] range
+        """
+        color = self.Color
+        key = (id(color), color.r, color.g, color.b, self.line_width)
+        if key != self._style_key:
+            self._style = (tuple(int(min(max(c, 0), 255)) for c in color.tuple3()),
+                           self.line_width)
+            self._style_key = key
+
+        return self._style
+
+    def get_colors_key(self):
+        """
+        Retrieves a key that changes when the per-polygon or per-vertex colors of this material
+        change (see ColorArray.version).
+
+        Returns:
+            {tuple} - Key, or None if the material doesn't have per-polygon or per-vertex colors
+        """
+        if (self.vertex_colors is None) and (self.polygon_colors is None):
+            return None
+
+        return tuple((id(colors), colors.version) if colors is not None else None
+                     for colors in (self.vertex_colors, self.polygon_colors))
+
+    def get_mesh_colors(self, mesh):
+        """
+        Retrieves the color of each polygon of a mesh drawn with this material, and of each
+        vertex of each polygon, from the per-vertex colors, the per-polygon colors or Color,
+        whichever is set first.
+
+        Arguments:
+
+            mesh {Mesh} -- Mesh drawn with this material
+
+        Returns:
+            {2-tuple} - (polygon_colors, index_colors), where polygon_colors is a (P,3) uint8
+            array with the color of each polygon (the average of its vertices, when using
+            per-vertex colors) and index_colors is a (I,3) uint8 array with the color of each
+            entry of the packed indices of the mesh
+        """
+        vertices, indices, offsets = mesh.get_packed()
+        counts = np.diff(offsets)
+        if self.vertex_colors is not None:
+            if len(self.vertex_colors) != len(vertices):
+                raise ValueError(f"Material {self.name} has {len(self.vertex_colors)} vertex " +
+                                 f"colors, but mesh {mesh.name} has {len(vertices)} vertices!")
+            index_colors = self.vertex_colors.to_rgb8()[indices]
+            sums = kernels.reduce_polygons(np.add, index_colors.astype(np.float64).reshape(-1, 3),
+                                           offsets, 0)
+            polygon_colors = (sums / np.maximum(counts, 1)[:, np.newaxis]).astype(np.uint8)
+            return polygon_colors, index_colors
+
+        if self.polygon_colors is not None:
+            if len(self.polygon_colors) != len(counts):
+                raise ValueError(f"Material {self.name} has {len(self.polygon_colors)} " +
+                                 f"polygon colors, but mesh {mesh.name} has {len(counts)} " +
+                                 "polygons!")
+            polygon_colors = self.polygon_colors.to_rgb8()
+        else:
+            polygon_colors = np.tile(np.array(self.get_style()[0], dtype=np.uint8),
+                                     (len(counts), 1))
+
+        return polygon_colors, np.repeat(polygon_colors, counts, axis=0)
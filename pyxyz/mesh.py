@@ -1,7 +1,19 @@
 """Mesh class definition"""
 import math
-import pygame
+import struct
+import numpy as np
 from pyxyz.vector3 import Vector3
+from pyxyz.bvh import MeshBVH
+from pyxyz.mesh_cache import MeshCache
+from pyxyz.draw_commands import DrawCommands, get_triangle_fans
+from pyxyz.backends import PygameBackend
+
+# Header of the binary mesh files: magic, version, name length, vertex count, index count,
+# polygon count and bounds (min and max)
+_MESH_HEADER = "<8sIIQQQ6d"
+# Arrays in binary mesh files start at multiples of this, so they can be memory-mapped
+# efficiently
+_MESH_ALIGNMENT = 64
 
 class Mesh:
     """Mesh class.
@@ -16,6 +28,20 @@ class Mesh:
     stat_render_time = 0
     """Time spent in rendering for statistics. This code that actually tracks the statistics
     is normally commented out for performance reasons (see render method)"""
+    backend = PygameBackend()
+    """Backend used by the render method (see pyxyz.backends)"""
+    cache = MeshCache()
+    """Cache used by create_cube and create_sphere when they create a new mesh (see
+    MeshCache). Set to None to always build a new mesh"""
+
+    closed = True
+    """{bool} True if the polygons are closed shapes, that are filled when drawn with a line
+    width of 0. Open geometry (see Polyline) is drawn as lines"""
+
+    file_magic = b"PYXYZMSH"
+    """Identifier at the start of binary mesh files"""
+    file_version = 1
+    """Version of the binary mesh file format"""
 
     def __init__(self, name="UnknownMesh"):
         """
@@ -25,9 +51,280 @@ class Mesh:
         """
         self.name = name
         """ {str} Name of the mesh"""
-        self.polygons = []
+        self.version = 0
+        """ {int} Incremented every time the polygons of the mesh change (as detected by
+        get_packed, or signaled by calling invalidate), so that renderers can tell if cached
+        data is still valid"""
+        self._polygons = []
+        self._packed = None
+        self._triangles = None
+        self._bvh = None
+        self._bounds = None
+
+    @property
+    def polygons(self):
         """ {list[list[Vector3]]} List of lists of polygons. A polygon is a closed shape,
-        hence the need for a list of lists, if we want more complex shapes."""
+        hence the need for a list of lists, if we want more complex shapes.
+        Meshes created from arrays (for example, loaded from a file) only create this list
+        the first time it is used. Once the list exists, it's read again every time the mesh
+        is packed (see get_packed), so any change to it, even to a Vector3 in place, shows up
+        in the next render. Meshes that are only changed through set_packed skip that."""
+        if self._polygons is None:
+            vertices, indices, offsets = self._packed
+            coords = vertices[indices].tolist()
+            bounds = offsets.tolist()
+            self._polygons = [[Vector3(*c) for c in coords[bounds[i]:bounds[i + 1]]]
+                              for i in range(len(bounds) - 1)]
+
+        return self._polygons
+
+    @polygons.setter
+    def polygons(self, polygons):
+        self._polygons = polygons
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Discards the cached packed arrays, triangulation and BVH of this mesh.
+        Changes to the polygons list are detected automatically (see get_packed), so this is
+        only needed to force the caches to be rebuilt.
+        """
+        self.version += 1
+        if self._polygons is not None:
+            self._packed = None
+        self._triangles = None
+        self._bvh = None
+        self._bounds = None
+
+    def get_packed(self):
+        """
+        Retrieves the packed (NumPy) version of the polygons of this mesh.
+        If the mesh has a polygons list, it's read again on every call (the vertices can be
+        changed in place, which can't be detected otherwise), and if the result is the same as
+        the last time, the same arrays are returned and version doesn't change, so caches
+        built from them (triangulation, BVH, world-space vertices) stay valid. Meshes created
+        from arrays return their arrays straight away.
+
+        Returns:
+            {3-tuple} - (vertices, indices, offsets), where vertices is a (N,3) float array,
+            indices is an array with the vertex indices of all polygons, one after the other,
+            and offsets is a (P+1) array such that polygon i uses
+            indices[offsets[i]:offsets[i+1]]
+        """
+        if self._polygons is None:
+            # Created from arrays, and the polygons were never touched
+            return self._packed
+
+        counts = np.fromiter((len(poly) for poly in self._polygons), dtype=np.int32,
+                             count=len(self._polygons))
+        offsets = np.zeros(len(counts) + 1, dtype=np.int32)
+        np.cumsum(counts, out=offsets[1:])
+
+        vertices = np.fromiter((c for poly in self._polygons for v in poly
+                                for c in (v.x, v.y, v.z)),
+                               dtype=np.float64, count=int(offsets[-1]) * 3)
+        vertices = vertices.reshape((-1, 3))
+
+        # Keep the cached arrays (and everything built from them) if nothing changed
+        packed = self._packed
+        if (packed is not None) and np.array_equal(packed[2], offsets) and \
+           np.array_equal(packed[0], vertices):
+            return packed
+
+        self.invalidate()
+        self._packed = (vertices, np.arange(len(vertices), dtype=np.int32), offsets)
+
+        return self._packed
+
+    def set_packed(self, vertices, indices, offsets):
+        """
+        Replaces the geometry of this mesh with the given packed arrays (see get_packed).
+        The polygons list is only rebuilt from them if it is used.
+
+        Arguments:
+
+            vertices {np.array} -- (N,3) array with the vertex positions
+
+            indices {np.array} -- Vertex indices of all polygons, one after the other
+
+            offsets {np.array} -- (P+1) array such that polygon i uses
+            indices[offsets[i]:offsets[i+1]]
+        """
+        self._polygons = None
+        self._packed = (np.asarray(vertices, dtype=np.float64).reshape((-1, 3)),
+                        np.asarray(indices, dtype=np.int32),
+                        np.asarray(offsets, dtype=np.int32))
+        self.invalidate()
+
+    @staticmethod
+    def from_packed(vertices, indices, offsets, name="UnknownMesh"):
+        """
+        Creates a mesh from packed arrays (see get_packed), without creating a Vector3 for
+        each vertex.
+
+        Arguments:
+
+            vertices {np.array} -- (N,3) array with the vertex positions
+
+            indices {np.array} -- Vertex indices of all polygons, one after the other
+
+            offsets {np.array} -- (P+1) array such that polygon i uses
+            indices[offsets[i]:offsets[i+1]]
+
+            name {str} -- Name of the mesh, defaults to 'UnknownMesh'
+
+        Returns:
+            {Mesh} - New mesh
+        """
+        mesh = Mesh(name)
+        mesh.set_packed(vertices, indices, offsets)
+        return mesh
+
+    def instance(self, name=None):
+        """
+        Creates a new mesh that shares the packed arrays of this one, as well as the
+        triangulation, bounds and BVH already computed, without copying them. Changing the
+        polygons of either mesh afterwards makes it use new arrays, so the other one is not
+        affected.
+
+        Arguments:
+
+            name {str} -- Name of the new mesh. If not given, uses the name of this mesh
+
+        Returns:
+            {Mesh} - New mesh
+        """
+        mesh = Mesh(self.name if name is None else name)
+        mesh._polygons = None
+        mesh._packed = self.get_packed()
+        mesh._triangles = self._triangles
+        mesh._bvh = self._bvh
+        mesh._bounds = self._bounds
+
+        return mesh
+
+    def save(self, filename):
+        """
+        Saves this mesh to a binary file, that can be loaded with Mesh.load.
+        The file stores the packed vertex, index and polygon offset arrays, and the bounds of
+        the mesh.
+
+        Arguments:
+
+            filename {str} -- Name of the file
+        """
+        vertices, indices, offsets = self.get_packed()
+        bounds_min, bounds_max = self.get_bounds()
+        name = self.name.encode("utf-8")
+
+        header = struct.pack(_MESH_HEADER, Mesh.file_magic, Mesh.file_version, len(name),
+                             len(vertices), len(indices), len(offsets) - 1,
+                             *bounds_min, *bounds_max)
+        with open(filename, "wb") as file:
+            file.write(header)
+            file.write(name)
+            for array, dtype in ((vertices, "<f8"), (indices, "<i4"), (offsets, "<i4")):
+                file.write(b"\0" * (-file.tell() % _MESH_ALIGNMENT))
+                file.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+    @staticmethod
+    def load(filename, mmap=True):
+        """
+        Loads a mesh saved with Mesh.save.
+        By default, the arrays are memory-mapped from the file instead of being read, so even
+        large meshes open instantly, only the parts that are used are read from disk, and
+        processes that load the same file share the memory. Memory-mapped arrays are read-only.
+
+        Arguments:
+
+            filename {str} -- Name of the file
+
+            mmap {bool} -- If True, memory-map the file, otherwise read it to memory. Defaults
+            to True
+
+        Returns:
+            {Mesh} - Loaded mesh
+        """
+        with open(filename, "rb") as file:
+            header = file.read(struct.calcsize(_MESH_HEADER))
+            if len(header) < struct.calcsize(_MESH_HEADER):
+                raise ValueError(f"{filename} is not a PyXYZ mesh file!")
+            magic, version, name_length, vertex_count, index_count, polygon_count, \
+                *bounds = struct.unpack(_MESH_HEADER, header)
+            if (magic != Mesh.file_magic) or (version != Mesh.file_version):
+                raise ValueError(f"{filename} is not a PyXYZ mesh file (version " +
+                                 f"{Mesh.file_version})!")
+            name = file.read(name_length).decode("utf-8")
+
+        arrays = []
+        offset = struct.calcsize(_MESH_HEADER) + name_length
+        for dtype, shape in (("<f8", (vertex_count, 3)), ("<i4", (index_count,)),
+                             ("<i4", (polygon_count + 1,))):
+            offset += -offset % _MESH_ALIGNMENT
+            if mmap and (np.prod(shape) > 0):
+                arrays.append(np.memmap(filename, dtype=dtype, mode="r", offset=offset,
+                                        shape=shape))
+            else:
+                arrays.append(np.fromfile(filename, dtype=dtype, count=int(np.prod(shape)),
+                                          offset=offset).reshape(shape))
+            offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+        mesh = Mesh(name)
+        mesh._polygons = None
+        mesh._packed = tuple(arrays)
+        mesh._bounds = (np.array(bounds[0:3]), np.array(bounds[3:6]))
+
+        return mesh
+
+    def get_triangles(self):
+        """
+        Retrieves a triangulation of the polygons of this mesh. Each polygon is split in a
+        triangle fan around its first vertex, so quads become two triangles. Polygons with
+        less than 3 vertices don't generate triangles.
+
+        Returns:
+            {2-tuple} - (triangles, polygon), where triangles is a (T,3) array of indices into
+            the packed vertex array (see get_packed) and polygon is a (T) array with the index
+            of the polygon each triangle belongs to
+        """
+        _, indices, offsets = self.get_packed()
+        if self._triangles is None:
+            triangles, polygon = get_triangle_fans(offsets)
+            self._triangles = (indices[triangles], polygon)
+
+        return self._triangles
+
+    def get_bounds(self):
+        """
+        Retrieves the axis-aligned bounding box of this mesh, in local space.
+
+        Returns:
+            {2-tuple} - (min, max), both as (3) NumPy arrays. If the mesh is empty, both are
+            zero
+        """
+        vertices, _, _ = self.get_packed()
+        if self._bounds is None:
+            if len(vertices) == 0:
+                self._bounds = (np.zeros(3), np.zeros(3))
+            else:
+                self._bounds = (vertices.min(axis=0), vertices.max(axis=0))
+
+        return self._bounds
+
+    def get_bvh(self):
+        """
+        Retrieves the bounding volume hierarchy over the triangles of this mesh, used for
+        exact ray intersection. It's built the first time it is needed, and cached until the
+        polygons of the mesh change.
+
+        Returns:
+            {MeshBVH} - BVH of this mesh
+        """
+        self.get_packed()
+        if self._bvh is None:
+            self._bvh = MeshBVH(self)
+
+        return self._bvh
 
     def offset(self, v):
         """
@@ -37,14 +334,8 @@ class Mesh:
 
             v {Vector3} -- Ammount to displace the mesh
         """
-        new_polys = []
-        for poly in self.polygons:
-            new_poly = []
-            for p in poly:
-                new_poly.append(p + v)
-            new_polys.append(new_poly)
-
-        self.polygons = new_polys
+        vertices, indices, offsets = self.get_packed()
+        self.set_packed(vertices + v.to_np3(), indices, offsets)
 
     def render(self, screen, clip_matrix, material):
         """
@@ -63,43 +354,47 @@ class Mesh:
             render times, but it is normally commented out, for performance reasons. If you want
             to use the statistics, uncomment the code on this funtion.
         """
-        # Convert Color to the pygame format
-        c = material.Color.tuple3()
-
-        # For all polygons
-        for poly in self.polygons:
-            # Create the list that will store (temporarily) the transformed vertices
-            tpoly = []
-            # Uncomment next 2 lines for statistics
-            #Mesh.stat_vertex_count += len(poly)
-            #t0 = time.time()
-            for v in poly:
-                # Convert the vertex to numpy format and multiply it by the clip matrix
-                vout = v.to_np4()
-                vout = vout @ clip_matrix
-
-                # Finalize the transformation by converting the point from homogeneous NDC to
-                # screen coordinates (divide by w, scale it by the viewport resolution and
-                # offset it)
-                tpoly.append((screen.get_width() * 0.5 + vout[0] / vout[3],
-                              screen.get_height() * 0.5 - vout[1] / vout[3]))
-
-            # Uncomment next line for statistics
-            #t1 = time.time()
-
-            # Render
-            pygame.draw.polygon(screen, c, tpoly, material.line_width)
-
-            # Uncomment next 3 lines for statistics
-            #t2 = time.time()
-            #Mesh.stat_transform_time += (t1 - t0)
-            #Mesh.stat_render_time += (t2 - t1)
+        # Uncomment next 2 lines for statistics
+        #Mesh.stat_vertex_count += len(self.get_packed()[1])
+        #t0 = time.time()
+
+        commands = self.get_commands(screen.get_rect(), clip_matrix, material)
+
+        # Uncomment next line for statistics
+        #t1 = time.time()
+
+        # Render
+        Mesh.backend.draw(commands, screen)
+
+        # Uncomment next 3 lines for statistics
+        #t2 = time.time()
+        #Mesh.stat_transform_time += (t1 - t0)
+        #Mesh.stat_render_time += (t2 - t1)
+
+    def get_commands(self, rect, clip_matrix, material):
+        """
+        Projects the mesh and creates the draw commands to render it (see DrawCommands).
+
+        Arguments:
+
+            rect {4-tuple} -- (x, y, width, height) of the viewport
+
+            clip_matrix {np.array} -- Clip matrix to use to convert the 3d local space coordinates
+            of the vertices to screen coordinates.
+
+            material {Material} -- Material to be used to render the mesh
+
+        Returns:
+            {DrawCommands} - Commands to draw the mesh
+        """
+        return DrawCommands.from_mesh(self, rect, clip_matrix, material)
 
     @staticmethod
     def create_cube(size, mesh=None):
         """
         Adds the 6 polygons necessary to form a cube with the given size. If a source mesh is
-        not given, a new mesh is created.
+        not given, a new mesh is created, that shares its geometry with all the other cubes of
+        the same size (see Mesh.cache).
         This cube will be centered on the origin (0,0,0).
 
         Arguments:
@@ -112,6 +407,11 @@ class Mesh:
             {Mesh} - Mesh where the polygons were added
         """
 
+        # Get the mesh from the cache if one was not given
+        if (mesh is None) and (Mesh.cache is not None):
+            return Mesh.cache.get(MeshCache.make_key("cube", size),
+                                  lambda: Mesh.create_cube(size, Mesh("UnknownCube")))
+
         # Create mesh if one was not given
         if mesh is None:
             mesh = Mesh("UnknownCube")
@@ -144,7 +444,8 @@ class Mesh:
     def create_sphere(size, res_lat, res_lon, mesh=None):
         """
         Adds the polygons necessary to form a sphere with the given size and resolution.
-         If a source mesh is not given, a new mesh is created.
+         If a source mesh is not given, a new mesh is created, that shares its geometry with all
+         the other spheres with the same parameters (see Mesh.cache).
         This sphere will be centered on the origin (0,0,0).
 
         Arguments:
@@ -162,6 +463,12 @@ class Mesh:
         Returns:
             {Mesh} - Mesh where the polygons were added
         """
+        # Get the mesh from the cache if one was not given
+        if (mesh is None) and (Mesh.cache is not None):
+            return Mesh.cache.get(MeshCache.make_key("sphere", size, res_lat, res_lon),
+                                  lambda: Mesh.create_sphere(size, res_lat, res_lon,
+                                                             Mesh("UnknownSphere")))
+
         # Create mesh if one was not given
         if mesh is None:
             mesh = Mesh("UnknownSphere")
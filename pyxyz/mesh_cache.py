@@ -0,0 +1,161 @@
+"""Mesh cache class definition"""
+import hashlib
+import os
+from collections import OrderedDict
+
+class MeshCache:
+    """Mesh cache class.
+    Memoizes procedurally built meshes (see Mesh.create_cube and Mesh.create_sphere), keyed by
+    the builder and its parameters, so that building the same primitive again doesn't repeat
+    the work or use more memory. Cached meshes are stored as read-only packed arrays, and every
+    request returns a new Mesh that shares them (see Mesh.instance), so changing the returned
+    mesh never changes the cache.
+    The least recently used entries are discarded when there are more than max_size. If a
+    directory is given, built meshes are also saved there (see Mesh.save), named after a hash
+    of their key, and loaded (memory-mapped) from there the next time they are needed, even by
+    other processes.
+    """
+    def __init__(self, max_size=128, directory=None):
+        """
+        Arguments:
+
+            max_size {int} -- Maximum number of meshes kept in memory, defaults to 128
+
+            directory {str} -- Directory where to store the meshes on disk, or None to keep
+            them only in memory. Defaults to None
+        """
+        self.max_size = max_size
+        """{int} Maximum number of meshes kept in memory"""
+        self.directory = directory
+        """{str} Directory where meshes are stored on disk, or None to keep them only in
+        memory"""
+        self.hits = 0
+        """{int} Number of requests served from memory or disk"""
+        self.misses = 0
+        """{int} Number of requests that had to build the mesh"""
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, builder):
+        """
+        Retrieves a mesh from the cache, building it (or loading it from disk) if needed.
+
+        Arguments:
+
+            key {tuple} -- Key of the mesh, normally created with MeshCache.make_key. It must
+            identify the geometry completely
+
+            builder {function} -- Function without arguments that builds and returns the mesh,
+            called if the mesh is not cached
+
+        Returns:
+            {Mesh} - New mesh that shares the cached geometry
+        """
+        template = self._entries.get(key)
+        if template is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return template.instance()
+
+        template = self._load(key)
+        if template is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            template = builder()
+            self._freeze(template)
+            self._save(key, template)
+
+        # Compute the derived data now, so all instances share it
+        template.get_triangles()
+        template.get_bounds()
+
+        self._entries[key] = template
+        while len(self._entries) > max(self.max_size, 0):
+            self._entries.popitem(last=False)
+
+        return template.instance()
+
+    def clear(self):
+        """
+        Discards all the meshes kept in memory. Meshes stored on disk are kept.
+        """
+        self._entries.clear()
+
+    def get_filename(self, key):
+        """
+        Retrieves the name of the file where a mesh is stored on disk.
+
+        Arguments:
+
+            key {tuple} -- Key of the mesh
+
+        Returns:
+            {str} - Name of the file, or None if this cache doesn't use a directory
+        """
+        if self.directory is None:
+            return None
+
+        from pyxyz.mesh import Mesh
+        digest = hashlib.sha1(repr((Mesh.file_version, key)).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".pxm")
+
+    @staticmethod
+    def make_key(builder, *params):
+        """
+        Creates a cache key from the name of a builder and its parameters. Numbers are converted
+        to float, and vectors and sequences to tuples of floats, so that equivalent parameters
+        (like 2 and 2.0, or a Vector3 and a tuple) give the same key.
+
+        Arguments:
+
+            builder {str} -- Name of the builder
+
+            params -- Parameters of the builder
+
+        Returns:
+            {tuple} - Key
+        """
+        return (builder,) + tuple(MeshCache._normalize(param) for param in params)
+
+    @staticmethod
+    def _normalize(param):
+        if hasattr(param, "x") and hasattr(param, "y") and hasattr(param, "z"):
+            return (float(param.x), float(param.y), float(param.z))
+        if isinstance(param, (list, tuple)):
+            return tuple(MeshCache._normalize(p) for p in param)
+        if isinstance(param, (int, float)) and not isinstance(param, bool):
+            return float(param)
+        return param
+
+    @staticmethod
+    def _freeze(mesh):
+        # Cached arrays are shared by all instances, so they must never change
+        vertices, indices, offsets = mesh.get_packed()
+        for array in (vertices, indices, offsets):
+            array.setflags(write=False)
+
+    def _load(self, key):
+        filename = self.get_filename(key)
+        if (filename is None) or (not os.path.isfile(filename)):
+            return None
+
+        from pyxyz.mesh import Mesh
+        try:
+            return Mesh.load(filename)
+        except (OSError, ValueError):
+            # Damaged or from another version, it will be built and saved again
+            return None
+
+    def _save(self, key, mesh):
+        filename = self.get_filename(key)
+        if filename is None:
+            return
+
+        # Write to a temporary file first, so other processes never see a partial file
+        os.makedirs(self.directory, exist_ok=True)
+        temp_filename = f"{filename}.{os.getpid()}.tmp"
+        mesh.save(temp_filename)
+        os.replace(temp_filename, filename)
@@ -0,0 +1,472 @@
+"""Import and export of meshes in the OBJ and PLY formats.
+Files are read in chunks of bytes, and all the number parsing is done with NumPy over whole
+chunks at a time, so no Python objects are created per vertex or per face and the memory used
+besides the mesh itself is bounded by the chunk size."""
+import warnings
+import numpy as np
+from pyxyz.mesh import Mesh
+
+CHUNK_SIZE = 1 << 24
+"""Default number of bytes read from the file at a time"""
+
+_SPACE = ord(" ")
+_NEWLINE = ord("\n")
+
+_PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8"
+}
+
+class _ChunkReader:
+    """Reads a file in chunks, either as blocks of complete lines or as bytes"""
+    def __init__(self, file, chunk_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = b""
+        self.position = 0
+        self.eof = False
+
+    def _fill(self):
+        # Drops the bytes already read from the buffer, and adds a new chunk at the end
+        data = self.file.read(self.chunk_size)
+        if not data:
+            self.eof = True
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+
+    def read_lines(self, max_lines=None):
+        # Returns a block of complete lines (at most max_lines), always ending with a newline,
+        # or an empty block at the end of the file. Only the bytes after the current position
+        # are searched, and the buffer is only sliced when it is filled, once less than half a
+        # chunk is left, so it never holds more than one and a half chunks of unread lines
+        if len(self.buffer) - self.position < self.chunk_size // 2 and not self.eof:
+            self._fill()
+        searched = self.position
+        while True:
+            last = self.buffer.rfind(b"\n", searched)
+            if last >= 0:
+                break
+            if self.eof:
+                if self.position == len(self.buffer):
+                    return b""
+                # The last line of the file doesn't have to end with a newline
+                self.buffer += b"\n"
+            else:
+                searched = len(self.buffer) - self.position
+                self._fill()
+
+        cut = last + 1
+        if max_lines is not None:
+            # Find the last newline of the block in a window that grows until it has enough
+            # lines, so reading a few lines doesn't scan the whole buffer
+            size = 256 * max_lines
+            while True:
+                size = min(size, cut - self.position)
+                window = np.frombuffer(self.buffer, dtype=np.uint8, count=size,
+                                       offset=self.position)
+                newlines = np.flatnonzero(window == _NEWLINE)
+                if len(newlines) >= max_lines:
+                    cut = self.position + int(newlines[max_lines - 1]) + 1
+                    break
+                if size == cut - self.position:
+                    break
+                size *= 2
+        block = self.buffer[self.position:cut]
+        self.position = cut
+
+        return block
+
+    def read_bytes(self, size):
+        # Returns up to size bytes, less only at the end of the file
+        while len(self.buffer) - self.position < size and not self.eof:
+            self._fill()
+        block = self.buffer[self.position:self.position + size]
+        self.position += len(block)
+
+        return block
+
+    def unread(self, data):
+        # Puts back bytes that were read but not used, so they're read again next
+        self.buffer = data + self.buffer[self.position:]
+        self.position = 0
+
+class _Lines:
+    """Splits a block of lines into tokens, all at once"""
+    def __init__(self, block):
+        self.text = np.frombuffer(block, dtype=np.uint8)
+        newlines = np.flatnonzero(self.text == _NEWLINE)
+        self.starts = np.concatenate(([0], newlines[:-1] + 1))
+        self.ends = newlines
+
+    def first_chars(self, count):
+        # (L,count) array with the first characters of each line (newline past the end)
+        index = np.minimum(self.starts[:, np.newaxis] + np.arange(count), len(self.text) - 1)
+        chars = self.text[index]
+        chars[index >= self.ends[:, np.newaxis]] = _NEWLINE
+        return chars
+
+    def parse(self, lines, skip=0, strip_slashes=False):
+        # Parses the numbers in the given lines, skipping the first bytes of each line.
+        # Returns the numbers and the number of tokens in each line
+        selected = np.zeros(len(self.starts), dtype=bool)
+        selected[lines] = True
+        keep = np.repeat(selected, self.ends - self.starts + 1)
+        skipped = self.starts[lines, np.newaxis] + np.arange(skip)
+        keep[np.minimum(skipped, self.ends[lines, np.newaxis])] = False
+
+        text = np.where(keep, self.text, _SPACE).astype(np.uint8)
+        space = (text == _SPACE) | (text == _NEWLINE) | (text == ord("\t")) | \
+                (text == ord("\r"))
+        if strip_slashes:
+            # OBJ faces can be v/vt/vn: keep only what is before the first slash of each token
+            slash = text == ord("/")
+            if slash.any():
+                position = np.arange(len(text), dtype=np.int32)
+                last_mark = np.maximum.accumulate(np.where(space | slash, position, 0))
+                space |= slash[last_mark]
+        text[space] = _SPACE
+
+        token_start = ~space
+        token_start[1:] &= space[:-1]
+        bounds = np.stack((self.starts[lines], self.ends[lines]), axis=1).reshape(-1)
+        counts = np.add.reduceat(token_start.astype(np.int32), bounds)[::2]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            values = np.fromstring(text.tobytes(), sep=" ")
+        if len(values) != counts.sum():
+            raise ValueError("Invalid number in file!")
+
+        return values, counts
+
+def _first_of_lines(counts, first, amount):
+    # Indices of tokens first..first+amount of each line, given the token count of each line
+    line_start = np.cumsum(counts) - counts
+    return line_start[:, np.newaxis] + first + np.arange(amount)
+
+def _build_mesh(vertices, indices, sizes, name):
+    vertices = np.concatenate(vertices) if vertices else np.zeros((0, 3))
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+    sizes = np.concatenate(sizes) if sizes else np.zeros(0, dtype=np.int64)
+
+    if len(indices) and ((indices.min() < 0) or (indices.max() >= len(vertices))):
+        raise ValueError("Face references a vertex that doesn't exist!")
+
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int32)
+    np.cumsum(sizes, out=offsets[1:])
+
+    return Mesh.from_packed(vertices, indices.astype(np.int32), offsets, name)
+
+def load_obj(filename, name=None, chunk_size=CHUNK_SIZE):
+    """
+    Loads a Wavefront OBJ file. Only the vertex positions (v) and faces (f) are used; texture
+    coordinates, normals, groups and materials are ignored.
+
+    Arguments:
+
+        filename {str} -- Name of the file
+
+        name {str} -- Name of the mesh, defaults to the filename
+
+        chunk_size {int} -- Number of bytes read and parsed at a time
+
+    Returns:
+        {Mesh} - Loaded mesh
+    """
+    vertices = []
+    indices = []
+    sizes = []
+    vertex_count = 0
+
+    with open(filename, "rb") as file:
+        reader = _ChunkReader(file, chunk_size)
+        while True:
+            block = reader.read_lines()
+            if not block:
+                break
+
+            lines = _Lines(block)
+            chars = lines.first_chars(2)
+            separator = (chars[:, 1] == _SPACE) | (chars[:, 1] == ord("\t"))
+            vertex_lines = (chars[:, 0] == ord("v")) & separator
+            face_lines = (chars[:, 0] == ord("f")) & separator
+
+            if vertex_lines.any():
+                values, counts = lines.parse(vertex_lines.nonzero()[0], 2)
+                if counts.min() < 3:
+                    raise ValueError(f"{filename}: vertex with less than 3 coordinates!")
+                vertices.append(values[_first_of_lines(counts, 0, 3)])
+
+            if face_lines.any():
+                values, face_sizes = lines.parse(face_lines.nonzero()[0], 2, True)
+                face_indices = values.astype(np.int64)
+
+                # OBJ indices start at 1, and negative ones are relative to the last vertex
+                # defined before the face
+                defined = vertex_count + np.cumsum(vertex_lines)[face_lines]
+                defined = np.repeat(defined, face_sizes)
+                face_indices = np.where(face_indices > 0, face_indices - 1,
+                                        face_indices + defined)
+                indices.append(face_indices)
+                sizes.append(face_sizes)
+
+            vertex_count += int(vertex_lines.sum())
+
+    return _build_mesh(vertices, indices, sizes, filename if name is None else name)
+
+def _read_ply_header(reader, filename):
+    if reader.read_lines(1).strip() != b"ply":
+        raise ValueError(f"{filename} is not a PLY file!")
+
+    file_format = None
+    elements = []
+    while True:
+        line = reader.read_lines(1)
+        if not line:
+            raise ValueError(f"{filename}: PLY header doesn't end!")
+        words = line.decode("ascii").split()
+        if not words or words[0] in ("comment", "obj_info"):
+            continue
+        if words[0] == "end_header":
+            break
+        if words[0] == "format":
+            file_format = words[1]
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            if words[1] == "list":
+                elements[-1][2].append((words[4], _PLY_TYPES[words[2]], _PLY_TYPES[words[3]]))
+            else:
+                elements[-1][2].append((words[2], _PLY_TYPES[words[1]], None))
+
+    if file_format not in ("ascii", "binary_little_endian", "binary_big_endian"):
+        raise ValueError(f"{filename}: unknown PLY format {file_format}!")
+
+    return file_format, elements
+
+def _ply_face_layout(properties, filename):
+    # Splits the face properties into the scalar ones before the index list, the list and the
+    # scalar ones after it
+    lists = [i for i, prop in enumerate(properties) if prop[2] is not None]
+    names = [properties[i][0] for i in lists]
+    if (len(lists) != 1) or (names[0] not in ("vertex_indices", "vertex_index")):
+        raise ValueError(f"{filename}: faces must have a single vertex index list!")
+
+    return properties[:lists[0]], properties[lists[0]], properties[lists[0] + 1:]
+
+def load_ply(filename, name=None, chunk_size=CHUNK_SIZE):
+    """
+    Loads a PLY file, in ASCII or binary format. Only the vertex positions (x, y and z
+    properties of the vertex element) and the vertex index lists of the faces are used.
+
+    Arguments:
+
+        filename {str} -- Name of the file
+
+        name {str} -- Name of the mesh, defaults to the filename
+
+        chunk_size {int} -- Number of bytes read and parsed at a time
+
+    Returns:
+        {Mesh} - Loaded mesh
+    """
+    vertices = []
+    indices = []
+    sizes = []
+
+    with open(filename, "rb") as file:
+        reader = _ChunkReader(file, chunk_size)
+        file_format, elements = _read_ply_header(reader, filename)
+        endian = "<" if file_format == "binary_little_endian" else ">"
+
+        for element, count, properties in elements:
+            if element == "face":
+                before, index_list, after = _ply_face_layout(properties, filename)
+                if file_format == "ascii":
+                    _read_ply_ascii_faces(reader, count, len(before), indices, sizes)
+                else:
+                    _read_ply_binary_faces(reader, count, endian, before, index_list, after,
+                                           indices, sizes, filename)
+            elif file_format == "ascii":
+                remaining = count
+                while remaining > 0:
+                    block = reader.read_lines(remaining)
+                    if not block:
+                        raise ValueError(f"{filename}: unexpected end of file!")
+                    lines = _Lines(block)
+                    remaining -= len(lines.starts)
+                    if element == "vertex":
+                        values, counts = lines.parse(np.arange(len(lines.starts)))
+                        columns = [p[0] for p in properties]
+                        first = _first_of_lines(counts, 0, len(columns))
+                        vertices.append(values[first[:, [columns.index(axis)
+                                                         for axis in ("x", "y", "z")]]])
+            else:
+                if any(prop[2] is not None for prop in properties):
+                    raise ValueError(f"{filename}: lists are only supported in faces!")
+                dtype = np.dtype([(prop[0], endian + prop[1]) for prop in properties])
+                remaining = count
+                while remaining > 0:
+                    records = min(remaining, max(1, reader.chunk_size // dtype.itemsize))
+                    data = reader.read_bytes(records * dtype.itemsize)
+                    if len(data) < records * dtype.itemsize:
+                        raise ValueError(f"{filename}: unexpected end of file!")
+                    remaining -= records
+                    if element == "vertex":
+                        data = np.frombuffer(data, dtype=dtype)
+                        vertices.append(np.stack([data[axis].astype(np.float64)
+                                                  for axis in ("x", "y", "z")], axis=1))
+
+    return _build_mesh(vertices, indices, sizes, filename if name is None else name)
+
+def _read_ply_ascii_faces(reader, count, skip, indices, sizes):
+    remaining = count
+    while remaining > 0:
+        block = reader.read_lines(remaining)
+        if not block:
+            raise ValueError("Unexpected end of file!")
+        lines = _Lines(block)
+        remaining -= len(lines.starts)
+
+        values, counts = lines.parse(np.arange(len(lines.starts)))
+        # Each line is: scalars before the list, the list size, the list, scalars after it
+        line_start = np.cumsum(counts) - counts
+        face_sizes = values[line_start + skip].astype(np.int64)
+        first = np.repeat(line_start + skip + 1 - (np.cumsum(face_sizes) - face_sizes),
+                          face_sizes)
+        indices.append(values[first + np.arange(face_sizes.sum())].astype(np.int64))
+        sizes.append(face_sizes)
+
+def _read_ply_binary_faces(reader, count, endian, before, index_list, after, indices, sizes,
+                           filename):
+    before_size = sum(np.dtype(prop[1]).itemsize for prop in before)
+    after_size = sum(np.dtype(prop[1]).itemsize for prop in after)
+    count_type = np.dtype(endian + index_list[1])
+    index_type = np.dtype(endian + index_list[2])
+
+    # Faces have a variable size, so they are read in runs of faces with the same number of
+    # vertices: the size of the first face of a run is used to find where the next faces
+    # would start, and all those sizes are checked at once
+    data = b""
+    position = 0
+    remaining = count
+    while remaining > 0:
+        header = before_size + count_type.itemsize
+        if len(data) - position < header:
+            more = reader.read_bytes(reader.chunk_size)
+            if not more:
+                raise ValueError(f"{filename}: unexpected end of file!")
+            data = data[position:] + more
+            position = 0
+            continue
+
+        face_size = int(np.frombuffer(data, dtype=count_type, count=1,
+                                      offset=position + before_size)[0])
+        record = header + face_size * index_type.itemsize + after_size
+        available = min((len(data) - position) // record, remaining)
+        if available == 0:
+            more = reader.read_bytes(max(reader.chunk_size, record))
+            if not more:
+                raise ValueError(f"{filename}: unexpected end of file!")
+            data = data[position:] + more
+            position = 0
+            continue
+
+        run_sizes = np.ndarray((available,), dtype=count_type, buffer=data,
+                               offset=position + before_size, strides=(record,))
+        run = available
+        different = np.flatnonzero(run_sizes != face_size)
+        if len(different) > 0:
+            run = int(different[0])
+
+        run_indices = np.ndarray((run, face_size), dtype=index_type, buffer=data,
+                                 offset=position + header, strides=(record, index_type.itemsize))
+        indices.append(run_indices.astype(np.int64).reshape(-1))
+        sizes.append(np.full(run, face_size, dtype=np.int64))
+        position += run * record
+        remaining -= run
+
+    # The last bytes read can belong to the elements after the faces
+    reader.unread(data[position:])
+
+def _write_rows(file, fmt, rows, rows_per_chunk=1 << 16):
+    # Formats many rows with a single string operation per chunk
+    for start in range(0, len(rows), rows_per_chunk):
+        chunk = rows[start:start + rows_per_chunk]
+        file.write(((fmt + "\n") * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+def _face_runs(offsets):
+    # Splits the polygons in runs of consecutive polygons with the same number of vertices
+    counts = np.diff(offsets)
+    if len(counts) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(counts)) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(counts)]))
+    return [(int(s), int(e), int(counts[s])) for s, e in zip(starts, ends)]
+
+def save_obj(mesh, filename):
+    """
+    Saves a mesh to a Wavefront OBJ file, with only vertex positions and faces.
+
+    Arguments:
+
+        mesh {Mesh} -- Mesh to save
+
+        filename {str} -- Name of the file
+    """
+    vertices, indices, offsets = mesh.get_packed()
+
+    with open(filename, "w", encoding="ascii") as file:
+        file.write(f"# {mesh.name}\n")
+        _write_rows(file, "v %.17g %.17g %.17g", np.asarray(vertices))
+        for start, end, size in _face_runs(offsets):
+            faces = indices[offsets[start]:offsets[end]].reshape((-1, size)) + 1
+            _write_rows(file, "f" + " %d" * size, faces)
+
+def save_ply(mesh, filename, binary=True):
+    """
+    Saves a mesh to a PLY file, with only vertex positions and faces.
+
+    Arguments:
+
+        mesh {Mesh} -- Mesh to save
+
+        filename {str} -- Name of the file
+
+        binary {bool} -- If True, saves in the binary (little endian) format, otherwise in
+        the ASCII format. Defaults to True
+    """
+    vertices, indices, offsets = mesh.get_packed()
+    polygon_counts = np.diff(offsets)
+    count_type = "uchar" if (len(polygon_counts) == 0) or (polygon_counts.max() < 256) \
+        else "uint"
+
+    header = ("ply\n" +
+              f"format {'binary_little_endian' if binary else 'ascii'} 1.0\n" +
+              f"comment {mesh.name}\n" +
+              f"element vertex {len(vertices)}\n" +
+              "property double x\nproperty double y\nproperty double z\n" +
+              f"element face {len(polygon_counts)}\n" +
+              f"property list {count_type} int vertex_indices\n" +
+              "end_header\n")
+
+    if binary:
+        with open(filename, "wb") as file:
+            file.write(header.encode("ascii"))
+            file.write(np.ascontiguousarray(vertices, dtype="<f8").tobytes())
+            for start, end, size in _face_runs(offsets):
+                faces = np.empty(end - start, dtype=[("n", "<" + _PLY_TYPES[count_type]),
+                                                     ("i", "<i4", (size,))])
+                faces["n"] = size
+                faces["i"] = indices[offsets[start]:offsets[end]].reshape((-1, size))
+                file.write(faces.tobytes())
+    else:
+        with open(filename, "w", encoding="ascii") as file:
+            file.write(header)
+            _write_rows(file, "%.17g %.17g %.17g", np.asarray(vertices))
+            for start, end, size in _face_runs(offsets):
+                faces = indices[offsets[start]:offsets[end]].reshape((-1, size))
+                _write_rows(file, f"{size}" + " %d" * size, faces)
@@ -0,0 +1,303 @@
+"""Cleanup and simplification of meshes: vertex welding, degenerate polygon removal and
+decimation.
+All the functions work on the packed arrays of the meshes (see Mesh.get_packed), with NumPy
+over all the vertices or polygons at once, and return a new mesh, leaving the original one
+untouched. They change the vertices of the mesh, so per-vertex colors (see
+Material.vertex_colors) of the original mesh can't be used with the result."""
+import numpy as np
+from pyxyz import kernels
+from pyxyz.mesh import Mesh
+
+_HASH_PRIMES = np.array([73856093, 19349663, 83492791], dtype=np.int64)
+
+# Offsets to half of the 26 neighbours of a grid cell, so each pair of neighbouring cells is
+# only checked once
+_HALF_NEIGHBOURS = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1)
+                             for z in (-1, 0, 1) if (x, y, z) > (0, 0, 0)], dtype=np.int64)
+
+def weld_vertices(mesh, tolerance=1e-6):
+    """
+    Merges the vertices of a mesh that are closer than a tolerance, so polygons that share
+    corners also share the vertices, which then only need to be transformed once. Meshes built
+    from polygons (like the ones created by Mesh.create_sphere) have a copy of each vertex for
+    each polygon that uses it.
+    Vertices are grouped in a hash grid with cells the size of the tolerance: vertices in the
+    same cell are merged, and so are neighbouring cells whose first vertices are within the
+    tolerance. Each group is replaced by its first vertex.
+
+    Arguments:
+
+        mesh {Mesh} -- Mesh to weld
+
+        tolerance {number} -- Maximum distance between vertices that are merged, defaults to
+        1e-6
+
+    Returns:
+        {Mesh} - New mesh with the merged vertices
+    """
+    vertices, indices, offsets = mesh.get_packed()
+    if len(vertices) == 0:
+        return Mesh.from_packed(vertices, indices, offsets, mesh.name)
+
+    # Group the vertices by cell
+    cells = np.floor(vertices / tolerance).astype(np.int64)
+    cell_keys, vertex_cell = np.unique(cells, axis=0, return_inverse=True)
+    vertex_cell = vertex_cell.reshape(-1)
+    first = np.full(len(cell_keys), len(vertices))
+    np.minimum.at(first, vertex_cell, np.arange(len(vertices)))
+    cell_positions = vertices[first]
+
+    # Find the pairs of neighbouring cells whose first vertices are close, looking up the
+    # neighbours of all the cells at once by the hash of their coordinates. The rare hash
+    # collisions are detected, and those cells are not merged
+    hashes = _hash_cells(cell_keys)
+    order = np.argsort(hashes)
+    sorted_hashes = hashes[order]
+    pairs = []
+    for offset in _HALF_NEIGHBOURS:
+        neighbour = cell_keys + offset
+        position = np.minimum(np.searchsorted(sorted_hashes, _hash_cells(neighbour)),
+                              len(order) - 1)
+        found = order[position]
+        close = (cell_keys[found] == neighbour).all(axis=1) & \
+                (np.linalg.norm(cell_positions[found] - cell_positions, axis=1) <= tolerance)
+        pairs.append(np.stack((close.nonzero()[0], found[close]), axis=1))
+    pairs = np.concatenate(pairs)
+
+    # Each group of connected cells is replaced by its first vertex
+    cell_label = _connected_labels(len(cell_keys), pairs[:, 0], pairs[:, 1])
+    vertex_label = first[cell_label[vertex_cell]]
+    used, remap = np.unique(vertex_label, return_inverse=True)
+
+    return Mesh.from_packed(vertices[used], remap.reshape(-1)[indices], offsets, mesh.name)
+
+def remove_degenerate_polygons(mesh, min_area=0):
+    """
+    Removes the repeated consecutive vertices of each polygon (which draw nothing), the polygons
+    that are left with less than 3 vertices, and the polygons with an area of min_area or less
+    (like the slivers left by welding close vertices). Vertices that are no longer used
+    are removed too.
+
+    Arguments:
+
+        mesh {Mesh} -- Mesh to clean
+
+        min_area {number} -- Polygons with this area or less are removed, defaults to 0
+
+    Returns:
+        {Mesh} - New mesh without the degenerate polygons
+    """
+    vertices, indices, offsets = mesh.get_packed()
+    indices, offsets = _remove_repeated(indices, offsets)
+    area = np.linalg.norm(_polygon_normals(vertices, indices, offsets), axis=1) * 0.5
+    indices, offsets = _select_polygons(indices, offsets, area > min_area)
+
+    return _compact(vertices, indices, offsets, mesh.name)
+
+def decimate(mesh, ratio=0.5, tolerance=1e-6, max_error=np.inf):
+    """
+    Reduces the number of vertices of a mesh by collapsing edges, choosing first the ones that
+    change the shape the least, as measured by quadric error metrics (the sum of the squared
+    distances of the new vertex to the planes of the polygons around the collapsed ones).
+    Polygons keep their number of sides until their edges collapse, so quads are not split in
+    triangles, and edges of open boundaries are kept in place as much as possible.
+    Instead of collapsing one edge at a time, each step collapses, at once, all the edges that
+    are cheaper than every other edge touching their vertices, until the target number of
+    vertices is reached.
+    The vertices are welded first (see weld_vertices), and the degenerate polygons left by the
+    collapses are removed.
+
+    Arguments:
+
+        mesh {Mesh} -- Mesh to decimate
+
+        ratio {number} -- Fraction of the vertices to keep, defaults to 0.5
+
+        tolerance {number} -- Tolerance used to weld the vertices first, defaults to 1e-6
+
+        max_error {number} -- Edges whose collapse would add a larger error than this are not
+        collapsed, even if the target wasn't reached. Defaults to no limit
+
+    Returns:
+        {Mesh} - New decimated mesh
+    """
+    mesh = remove_degenerate_polygons(weld_vertices(mesh, tolerance))
+    vertices, indices, offsets = mesh.get_packed()
+    vertices = np.array(vertices)
+    target = int(len(vertices) * ratio)
+    quadrics = _vertex_quadrics(vertices, indices, offsets)
+
+    while True:
+        # Vertices can also be left unused when all their polygons collapse
+        alive = np.count_nonzero(np.bincount(indices, minlength=len(vertices)))
+        if alive <= target:
+            break
+
+        # Cost of collapsing each edge, to the best of its ends, its midpoint and the point
+        # with the lowest error
+        edges = _unique_edges(indices, offsets, len(vertices))
+        if len(edges) == 0:
+            break
+        edge_quadrics = quadrics[edges[:, 0]] + quadrics[edges[:, 1]]
+        positions, cost = _best_positions(vertices, edges, edge_quadrics)
+
+        # Collapse the edges that are the cheapest of all the edges of both their vertices, so
+        # no vertex is in more than one collapse
+        candidate = (cost <= max_error).nonzero()[0]
+        if len(candidate) == 0:
+            break
+        rank = np.empty(len(edges), dtype=np.int64)
+        rank[candidate[np.argsort(cost[candidate], kind="stable")]] = np.arange(len(candidate))
+        lowest = np.full(len(vertices), len(edges), dtype=np.int64)
+        np.minimum.at(lowest, edges[candidate, 0], rank[candidate])
+        np.minimum.at(lowest, edges[candidate, 1], rank[candidate])
+        chosen = candidate[(lowest[edges[candidate, 0]] == rank[candidate]) &
+                           (lowest[edges[candidate, 1]] == rank[candidate])]
+        chosen = chosen[np.argsort(rank[chosen])][:alive - target]
+
+        # The first vertex of each edge moves, and the second one is replaced by it
+        keep, remove = edges[chosen, 0], edges[chosen, 1]
+        vertices[keep] = positions[chosen]
+        quadrics[keep] = edge_quadrics[chosen]
+        remap = np.arange(len(vertices))
+        remap[remove] = keep
+        indices, offsets = _remove_repeated(remap[indices], offsets)
+
+    return _compact(vertices, indices, offsets, mesh.name)
+
+def _hash_cells(cells):
+    # Spatial hash of integer grid coordinates
+    hashes = cells * _HASH_PRIMES
+    return hashes[:, 0] ^ hashes[:, 1] ^ hashes[:, 2]
+
+def _connected_labels(count, a, b):
+    # Label of the connected component of each node of a graph with edges (a, b), as the
+    # smallest node in it, by propagating the smallest label over the edges until it settles
+    label = np.arange(count)
+    while len(a) > 0:
+        smallest = np.minimum(label[a], label[b])
+        new_label = label.copy()
+        np.minimum.at(new_label, a, smallest)
+        np.minimum.at(new_label, b, smallest)
+        new_label = new_label[new_label]
+        if np.array_equal(new_label, label):
+            break
+        label = new_label
+
+    return label
+
+def _next_corners(offsets):
+    # Position in the packed indices of the next corner of each corner of each polygon, with
+    # the last corner of each polygon followed by the first one
+    counts = np.diff(offsets)
+    following = np.arange(1, offsets[-1] + 1)
+    last = offsets[1:][counts > 0] - 1
+    following[last] = offsets[:-1][counts > 0]
+
+    return following
+
+def _select_polygons(indices, offsets, keep):
+    # Packed indices and offsets of the polygons where keep is True
+    counts = np.diff(offsets)[keep]
+    corners = np.repeat(keep, np.diff(offsets))
+    new_offsets = np.zeros(len(counts) + 1, dtype=np.int32)
+    np.cumsum(counts, out=new_offsets[1:])
+
+    return indices[corners], new_offsets
+
+def _remove_repeated(indices, offsets):
+    # Removes the corners equal to the next one in each polygon, and the polygons left with
+    # less than 3 corners
+    polygon = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    keep = indices != indices[_next_corners(offsets)]
+    counts = np.bincount(polygon[keep], minlength=len(offsets) - 1)
+    new_offsets = np.zeros(len(counts) + 1, dtype=np.int32)
+    np.cumsum(counts, out=new_offsets[1:])
+
+    return _select_polygons(indices[keep], new_offsets, counts >= 3)
+
+def _polygon_normals(vertices, indices, offsets):
+    # Normal of each polygon, with a length of twice its area (Newell's method)
+    if len(indices) == 0:
+        return np.zeros((len(offsets) - 1, 3))
+    corners = vertices[indices]
+    cross = np.cross(corners, corners[_next_corners(offsets)])
+
+    return kernels.reduce_polygons(np.add, cross, offsets, 0)
+
+def _edge_keys(indices, offsets, vertex_count):
+    # Key of the edge from each corner of each polygon to the next one, the same in both
+    # directions
+    following = indices[_next_corners(offsets)].astype(np.int64)
+    return np.minimum(indices, following) * vertex_count + np.maximum(indices, following)
+
+def _unique_edges(indices, offsets, vertex_count):
+    # (E,2) array with the distinct edges of all the polygons, sorted by vertex
+    keys = np.unique(_edge_keys(indices, offsets, vertex_count))
+
+    return np.stack((keys // vertex_count, keys % vertex_count), axis=1)
+
+def _vertex_quadrics(vertices, indices, offsets):
+    # Sum of the area-weighted plane quadrics of the polygons around each vertex, plus planes
+    # perpendicular to the polygons along the open boundaries, so these don't shrink
+    normals = _polygon_normals(vertices, indices, offsets)
+    area = np.linalg.norm(normals, axis=1)
+    unit = normals / np.maximum(area, 1e-300)[:, np.newaxis]
+    counts = np.diff(offsets)
+    polygon = np.repeat(np.arange(len(counts)), counts)
+    centroid = np.zeros((len(counts), 3))
+    np.add.at(centroid, polygon, vertices[indices])
+    centroid /= np.maximum(counts, 1)[:, np.newaxis]
+    planes = np.concatenate((unit, -(unit * centroid).sum(axis=1, keepdims=True)), axis=1)
+    plane_quadrics = planes[:, :, np.newaxis] * planes[:, np.newaxis, :] * \
+        (area * 0.5)[:, np.newaxis, np.newaxis]
+
+    quadrics = np.zeros((len(vertices), 4, 4))
+    np.add.at(quadrics, indices, plane_quadrics[polygon])
+
+    # Boundary edges are the ones used by a single polygon
+    following = indices[_next_corners(offsets)]
+    _, edge_id, uses = np.unique(_edge_keys(indices, offsets, len(vertices)),
+                                 return_inverse=True, return_counts=True)
+    boundary = uses[edge_id.reshape(-1)] == 1
+    if boundary.any():
+        direction = vertices[following[boundary]] - vertices[indices[boundary]]
+        side = np.cross(direction, unit[polygon[boundary]])
+        length = np.linalg.norm(side, axis=1)
+        side = side / np.maximum(length, 1e-300)[:, np.newaxis]
+        side_planes = np.concatenate(
+            (side, -(side * vertices[indices[boundary]]).sum(axis=1, keepdims=True)), axis=1)
+        side_quadrics = side_planes[:, :, np.newaxis] * side_planes[:, np.newaxis, :] * \
+            (length ** 2)[:, np.newaxis, np.newaxis]
+        np.add.at(quadrics, indices[boundary], side_quadrics)
+        np.add.at(quadrics, following[boundary], side_quadrics)
+
+    return quadrics
+
+def _best_positions(vertices, edges, quadrics):
+    # Position with the lowest error for each edge collapse, among both ends, the midpoint
+    # and the minimum of the quadric (when it can be solved), and its error
+    start, end = vertices[edges[:, 0]], vertices[edges[:, 1]]
+    candidates = [start, end, (start + end) * 0.5]
+    a, b = quadrics[:, 0:3, 0:3], -quadrics[:, 0:3, 3]
+    solvable = np.abs(np.linalg.det(a)) > 1e-12
+    optimal = (start + end) * 0.5
+    if solvable.any():
+        optimal[solvable] = np.linalg.solve(a[solvable], b[solvable][:, :, np.newaxis])[:, :, 0]
+    candidates.append(optimal)
+
+    errors = []
+    for position in candidates:
+        homogeneous = np.concatenate((position, np.ones((len(position), 1))), axis=1)
+        errors.append(np.einsum("ei,eij,ej->e", homogeneous, quadrics, homogeneous))
+    errors = np.stack(errors)
+    best = np.argmin(errors, axis=0)
+    arange = np.arange(len(edges))
+
+    return np.stack(candidates)[best, arange], np.maximum(errors[best, arange], 0)
+
+def _compact(vertices, indices, offsets, name):
+    # New mesh with only the vertices used by the polygons
+    used, remap = np.unique(indices, return_inverse=True)
+
+    return Mesh.from_packed(vertices[used], remap.reshape(-1), offsets, name)
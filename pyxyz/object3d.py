@@ -1,8 +1,9 @@
 """3d Object class"""
 
-import numpy as np
-from quaternion import quaternion, as_rotation_matrix
+from quaternion import quaternion
 from pyxyz.vector3 import Vector3
+from pyxyz.object_list import ObjectList
+from pyxyz.transforms import get_prs_matrices
 
 class Object3d:
     """3d object class.
@@ -14,8 +15,7 @@ class Object3d:
 
             name {str} -- Name of the object
         """
-        self.name = name
-        """ {str} Name of the object"""
+        self._name = name
         self.position = Vector3()
         """ {Vector3} Local position of the object (relative to parent)"""
         self.rotation = quaternion(1, 0, 0, 0)
@@ -23,25 +23,64 @@ class Object3d:
         self.scale = Vector3(1, 1, 1)
         """ {Vector3} Local scale of the object (relative to parent)"""
         self.mesh = None
-        """ {Mesh} Mesh to be rendered in this object"""
+        """ {Mesh} Mesh (or Polyline) to be rendered in this object"""
         self.material = None
         """ {Material} Material to be used rendering this object"""
-        self.children = []
-        """ {List[Object3d]} Children objects of this object"""
+        self._children = ObjectList()
+        self._matrix_key = None
+        self._matrix = None
+
+    @property
+    def name(self):
+        """ {str} Name of the object"""
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        self._name = name
+        # Names are indexed by the scene (see Scene.get_object), that watches the children of
+        # all its objects
+        self._children.mark_changed()
+
+    @property
+    def children(self):
+        """ {ObjectList} Children objects of this object. Assigning a list converts it to an
+        ObjectList"""
+        return self._children
+
+    @children.setter
+    def children(self, children):
+        # The scenes watching the old list don't watch the new one yet
+        self._children.mark_changed()
+        self._children = ObjectList(children)
 
     def get_matrix(self):
         """
-        Retrieves the local transformation matrix of this object
+        Retrieves the local transformation matrix of this object.
+        The matrix is cached, and only rebuilt when the position, rotation or scale change, so
+        it is returned as a read-only array.
 
         Returns:
 
             {np.array} -- Local transformation matrix
         """
-        return Object3d.get_prs_matrix(self.position, self.rotation, self.scale)
+        key = (self.position.x, self.position.y, self.position.z,
+               self.rotation.w, self.rotation.x, self.rotation.y, self.rotation.z,
+               self.scale.x, self.scale.y, self.scale.z)
+        if key != self._matrix_key:
+            self._matrix = Object3d.get_prs_matrix(self.position, self.rotation, self.scale)
+            self._matrix.setflags(write=False)
+            self._matrix_key = key
+
+        return self._matrix
 
     def render(self, screen, clip_matrix):
         """
         Renders this object with the given clip_matrix.
+        Scenes don't call this for most objects, as they draw the whole scene at once. Subclasses
+        can override it to draw themselves (and their children) in another way: scenes then
+        call it after drawing the rest of the geometry, so these objects are drawn over it, in
+        hierarchy order among themselves (see Frame.custom_objects).
 
         Arguments:
 
@@ -67,7 +106,8 @@ class Object3d:
 
     def add_child(self, obj):
         """
-        Adds a child object to the hierarchy of this one
+        Adds a child object to the hierarchy of this one. If it's already a child of this one,
+        nothing happens
 
         Arguments:
 
@@ -84,8 +124,7 @@ class Object3d:
 
             obj {Object3d} -- Object to remove from the hierarchy
         """
-        if obj in self.children:
-            self.children.remove(obj)
+        self.children.discard(obj)
 
     def get_position(self):
         """
@@ -149,27 +188,5 @@ class Object3d:
 
             {np.array} - PRS matrix
         """
-        trans = np.identity(4)
-        trans[3][0] = position.x
-        trans[3][1] = position.y
-        trans[3][2] = position.z
-
-        qrot = as_rotation_matrix(rotation)
-        rotation_matrix = np.identity(4)
-        rotation_matrix[0][0] = qrot[0][0]
-        rotation_matrix[0][1] = qrot[0][1]
-        rotation_matrix[0][2] = qrot[0][2]
-        rotation_matrix[1][0] = qrot[1][0]
-        rotation_matrix[1][1] = qrot[1][1]
-        rotation_matrix[1][2] = qrot[1][2]
-        rotation_matrix[2][0] = qrot[2][0]
-        rotation_matrix[2][1] = qrot[2][1]
-        rotation_matrix[2][2] = qrot[2][2]
-        rotation_matrix[3][3] = 1
-
-        scale_matrix = np.identity(4)
-        scale_matrix[0][0] = scale.x
-        scale_matrix[1][1] = scale.y
-        scale_matrix[2][2] = scale.z
-
-        return scale_matrix @ rotation_matrix @ trans
+        return get_prs_matrices([(position.x, position.y, position.z)], rotation,
+                                [(scale.x, scale.y, scale.z)])[0]
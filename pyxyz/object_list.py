@@ -0,0 +1,289 @@
+"""Object list class definition"""
+
+class ObjectList:
+    """Object list class.
+    Ordered collection of 3d objects, used for the objects of a scene and the children of an
+    object. It behaves like a list without duplicates, but objects are indexed by identity, so
+    checking if an object is in it, adding it and removing it take constant time, no matter how
+    many objects there are. Iteration follows the order in which the objects were added.
+    Indexing uses a list of the objects, built the first time it's needed after a change that
+    reorders the list (removing, inserting or replacing objects). Adding objects at the end and
+    popping the last one keep it up to date.
+    Every change to an ObjectList increments its version, and flags the watchers registered
+    with watch (until they are removed with unwatch), so that structures built from a part of
+    the scene graph (like the flattened hierarchy of a scene) know when they have to be
+    rebuilt, without checking every list, and without being rebuilt because of changes to
+    other scenes.
+    """
+    def __init__(self, objects=None):
+        """
+        Arguments:
+
+            objects {iterable[Object3d]} -- Initial objects, or None for an empty list.
+            Duplicates are ignored
+        """
+        self._objects = {}
+        self._list = []
+        self._watchers = None
+        self.version = 0
+        """{int} Incremented every time this list changes"""
+        if objects is not None:
+            self.extend(objects)
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __iter__(self):
+        return iter(self._objects.values())
+
+    def __reversed__(self):
+        return reversed(self._objects.values())
+
+    def __contains__(self, obj):
+        return id(obj) in self._objects
+
+    def __getitem__(self, index):
+        """Retrieves objects by position.
+
+        Arguments:
+            index {int, slice} -- Position of the objects
+
+        Returns:
+            Object3d - Object at the given position
+            or
+            list[Object3d] - Objects in the given range
+        """
+        return self._get_list()[index]
+
+    def __setitem__(self, index, value):
+        """Replaces objects by position.
+
+        Arguments:
+            index {int, slice} -- Position of the objects
+
+            value {Object3d, iterable[Object3d]} -- New object, or new objects for a slice
+
+        Raises:
+            ValueError - If an object would be in the list more than once
+        """
+        objects = list(self._get_list())
+        objects[index] = value
+        self._set_list(objects)
+
+    def __delitem__(self, index):
+        """Removes objects by position.
+
+        Arguments:
+            index {int, slice} -- Position of the objects
+        """
+        objects = list(self._get_list())
+        del objects[index]
+        self._set_list(objects)
+
+    def __add__(self, other):
+        return ObjectList(list(self) + list(other))
+
+    def __radd__(self, other):
+        return ObjectList(list(other) + list(self))
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __str__(self):
+        return "[" + ", ".join(str(obj.name) for obj in self) + "]"
+
+    def append(self, obj):
+        """
+        Adds an object at the end of the list. If it's already in the list, nothing happens.
+
+        Arguments:
+
+            obj {Object3d} -- Object to add
+        """
+        if id(obj) not in self._objects:
+            self._objects[id(obj)] = obj
+            if self._list is not None:
+                self._list.append(obj)
+            self.mark_changed()
+
+    def extend(self, objects):
+        """
+        Adds several objects at the end of the list, in order. Objects already in the list are
+        ignored.
+
+        Arguments:
+
+            objects {iterable[Object3d]} -- Objects to add
+        """
+        for obj in objects:
+            if id(obj) not in self._objects:
+                self._objects[id(obj)] = obj
+                if self._list is not None:
+                    self._list.append(obj)
+        self.mark_changed()
+
+    def insert(self, index, obj):
+        """
+        Adds an object at the given position. If it's already in the list, nothing happens.
+
+        Arguments:
+
+            index {int} -- Position of the object, as in list.insert
+
+            obj {Object3d} -- Object to add
+        """
+        if id(obj) not in self._objects:
+            objects = list(self._get_list())
+            objects.insert(index, obj)
+            self._set_list(objects)
+
+    def remove(self, obj):
+        """
+        Removes an object from the list.
+
+        Arguments:
+
+            obj {Object3d} -- Object to remove
+
+        Raises:
+            ValueError - If the object is not in the list
+        """
+        if self._objects.pop(id(obj), None) is None:
+            raise ValueError(f"{obj} is not in the list!")
+        self._list = None
+        self.mark_changed()
+
+    def pop(self, index=-1):
+        """
+        Removes an object by position and returns it. Popping the last object (the default)
+        takes constant time.
+
+        Arguments:
+
+            index {int} -- Position of the object. Defaults to -1 (the last object)
+
+        Returns:
+            {Object3d} - Removed object
+
+        Raises:
+            IndexError - If the list is empty or the index is out of range
+        """
+        if not self._objects:
+            raise IndexError("pop from empty list")
+        if index in (-1, len(self._objects) - 1):
+            _, obj = self._objects.popitem()
+            if self._list is not None:
+                self._list.pop()
+        else:
+            obj = self._get_list()[index]
+            del self._objects[id(obj)]
+            self._list = None
+        self.mark_changed()
+        return obj
+
+    def discard(self, obj):
+        """
+        Removes an object from the list, if it's there.
+
+        Arguments:
+
+            obj {Object3d} -- Object to remove
+
+        Returns:
+            {bool} - True if the object was removed, False if it wasn't in the list
+        """
+        if self._objects.pop(id(obj), None) is None:
+            return False
+        self._list = None
+        self.mark_changed()
+        return True
+
+    def clear(self):
+        """
+        Removes all the objects from the list.
+        """
+        self._objects.clear()
+        self._list = []
+        self.mark_changed()
+
+    def watch(self, watcher):
+        """
+        Registers a watcher, whose changed attribute is set to True every time this list
+        changes, from now on. Registering the same watcher again does nothing.
+
+        Arguments:
+
+            watcher {ObjectListWatcher} -- Watcher to register
+        """
+        if self._watchers is None:
+            self._watchers = {}
+        self._watchers[id(watcher)] = watcher
+
+    def unwatch(self, watcher):
+        """
+        Unregisters a watcher, so that changes to this list don't flag it anymore. If it wasn't
+        registered, nothing happens.
+
+        Arguments:
+
+            watcher {ObjectListWatcher} -- Watcher to unregister
+        """
+        if self._watchers is not None:
+            self._watchers.pop(id(watcher), None)
+            if not self._watchers:
+                self._watchers = None
+
+    def mark_changed(self):
+        """
+        Increments the version of this list and flags its watchers. This is done automatically
+        when the list changes, but can be called for changes that are not in the list itself,
+        like the name of the object that owns it.
+        """
+        self.version += 1
+        if self._watchers is not None:
+            for watcher in self._watchers.values():
+                watcher.changed = True
+
+    def _get_list(self):
+        # List of the objects in order, used for indexing
+        if self._list is None:
+            self._list = list(self._objects.values())
+        return self._list
+
+    def _set_list(self, objects):
+        # Replaces all the objects with the ones in the given list, in its order
+        if len({id(obj) for obj in objects}) != len(objects):
+            raise ValueError("Objects can't be in the list more than once!")
+        self._objects = {id(obj): obj for obj in objects}
+        self._list = objects
+        self.mark_changed()
+
+    def index(self, obj):
+        """
+        Retrieves the position of an object in the list. This has to go through the objects in
+        order.
+
+        Arguments:
+
+            obj {Object3d} -- Object to find
+
+        Returns:
+            {int} - Position of the object
+
+        Raises:
+            ValueError - If the object is not in the list
+        """
+        for index, key in enumerate(self._objects):
+            if key == id(obj):
+                return index
+        raise ValueError(f"{obj} is not in the list!")
+
+class ObjectListWatcher:
+    """Object list watcher class.
+    Flag that tells if any of the object lists it was registered with has changed (see
+    ObjectList.watch). Scenes use one to know when their flattened hierarchy is outdated.
+    """
+    def __init__(self):
+        self.changed = True
+        """{bool} True if a watched list has changed since this was last reset to False"""
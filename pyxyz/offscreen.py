@@ -0,0 +1,123 @@
+"""Offscreen buffer class definition"""
+import struct
+import zlib
+import numpy as np
+
+class OffscreenBuffer:
+    """Offscreen buffer class.
+    Image in memory that scenes can be rendered to without a window, for example to generate
+    images on a server. The pixels are stored in a NumPy array, and the buffer also provides a
+    Pygame surface that draws directly into that array, so any backend can render to it:
+
+    >>> buffer = OffscreenBuffer(640, 480)
+    >>> scene.render(buffer.surface)
+    >>> buffer.save_png("scene.png")
+
+    This doesn't use pygame.display at all, so it works in processes without a display or SDL
+    video driver (SDL_VIDEODRIVER doesn't need to be set), and several buffers can be rendered in
+    parallel in different processes.
+    """
+    def __init__(self, width, height, background=(0, 0, 0)):
+        """
+        Arguments:
+
+            width {int} -- Width of the image, in pixels
+
+            height {int} -- Height of the image, in pixels
+
+            background {3-tuple} -- Initial color of the image, with components in the
+            [0..255] range. Defaults to black
+        """
+        import pygame.image
+
+        self.width = width
+        """{int} Width of the image, in pixels"""
+        self.height = height
+        """{int} Height of the image, in pixels"""
+        self.pixels = np.zeros((height, width, 4), dtype=np.uint8)
+        """{np.array} (height,width,4) uint8 array with the RGBX pixels of the image, row by
+        row. The 4th component is padding, and is not used"""
+        self.surface = pygame.image.frombuffer(self.pixels, (width, height), "RGBX")
+        """{pygame.Surface} Surface that shares its pixels with the pixels array, so that
+        drawing on it changes the array. Render the scene to this surface"""
+        self.clear(background)
+
+    def clear(self, color=(0, 0, 0)):
+        """
+        Fills the whole image with the given color.
+
+        Arguments:
+
+            color {3-tuple} -- Color, with components in the [0..255] range
+        """
+        self.pixels[:, :, 0:3] = color
+
+    def get_image(self):
+        """
+        Retrieves the RGB pixels of the image. This is a view of the pixels array, not a copy,
+        so it changes when something else is rendered.
+
+        Returns:
+            {np.array} - (height,width,3) uint8 array with the pixels of the image, row by row
+        """
+        return self.pixels[:, :, 0:3]
+
+    def to_raw(self):
+        """
+        Retrieves the image as raw RGB bytes, 3 per pixel, row by row from the top.
+
+        Returns:
+            {bytes} - Raw image
+        """
+        return np.ascontiguousarray(self.get_image()).tobytes()
+
+    def save_raw(self, filename):
+        """
+        Saves the image as raw RGB bytes (see to_raw), without any header.
+
+        Arguments:
+
+            filename {str} -- Name of the file
+        """
+        with open(filename, "wb") as file:
+            file.write(self.to_raw())
+
+    def to_png(self, compress_level=6):
+        """
+        Encodes the image in the PNG format. This only uses zlib, not Pygame or any imaging
+        library.
+
+        Arguments:
+
+            compress_level {int} -- zlib compression level, from 0 (none, fastest) to 9 (best,
+            slowest). Defaults to 6
+
+        Returns:
+            {bytes} - PNG file contents
+        """
+        # Each row is prefixed with its filter type (0, none)
+        rows = np.zeros((self.height, self.width * 3 + 1), dtype=np.uint8)
+        rows[:, 1:] = self.get_image().reshape((self.height, -1))
+
+        def chunk(chunk_type, data):
+            return struct.pack(">I", len(data)) + chunk_type + data + \
+                   struct.pack(">I", zlib.crc32(chunk_type + data))
+
+        header = struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + \
+               chunk(b"IDAT", zlib.compress(rows.tobytes(), compress_level)) + \
+               chunk(b"IEND", b"")
+
+    def save_png(self, filename, compress_level=6):
+        """
+        Saves the image to a PNG file (see to_png).
+
+        Arguments:
+
+            filename {str} -- Name of the file
+
+            compress_level {int} -- zlib compression level, from 0 (none, fastest) to 9 (best,
+            slowest). Defaults to 6
+        """
+        with open(filename, "wb") as file:
+            file.write(self.to_png(compress_level))
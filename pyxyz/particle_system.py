@@ -0,0 +1,253 @@
+"""Particle system class definition"""
+import numpy as np
+from pyxyz.color import Color
+from pyxyz.color_array import ColorArray
+from pyxyz.object3d import Object3d
+from pyxyz.rasterizer import Rasterizer
+from pyxyz import kernels
+
+class ParticleSystem(Object3d):
+    """Particle system class.
+    A 3d object that simulates and draws a large number of particles (sparks, smoke, rain...),
+    that are not objects of their own: the position, velocity, remaining life and color of all
+    the particles are stored in NumPy arrays, all the particles are updated at once by update,
+    and drawn at once, as points or short streaks along their velocity, with a single projection
+    and a single batch of points or lines (see Rasterizer), with depth testing between them.
+    Particles live in the local space of this object, so they move with it and its parents.
+    Storage is allocated once, for max_particles. The live particles are always the first count
+    entries of the arrays: when particles die, live ones from the end are moved into their
+    slots, so emitting new particles never allocates.
+    Particle systems are drawn after the rest of the scene, over it, and are not drawn by
+    Scene.render_dirty. With a RasterizerBackend, they are depth tested against the scene, so
+    the particles behind its polygons are hidden.
+    """
+    def __init__(self, name, max_particles=10000):
+        """
+        Arguments:
+
+            name {str} -- Name of the object
+
+            max_particles {int} -- Maximum number of particles alive at the same time,
+            defaults to 10000
+        """
+        super().__init__(name)
+
+        self.max_particles = max_particles
+        """{int} Maximum number of particles alive at the same time. Particles emitted when
+        there are already this many are discarded"""
+        self.count = 0
+        """{int} Number of particles alive"""
+        self.positions = np.zeros((max_particles, 3))
+        """{np.array} (max_particles,3) array with the local position of each particle"""
+        self.velocities = np.zeros((max_particles, 3))
+        """{np.array} (max_particles,3) array with the local velocity of each particle, in units
+        per second"""
+        self.life = np.zeros(max_particles)
+        """{np.array} (max_particles) array with the remaining life of each particle, in
+        seconds"""
+        self.colors = np.zeros((max_particles, 3), dtype=np.uint8)
+        """{np.array} (max_particles,3) uint8 array with the color of each particle, with
+        components in the [0..255] range"""
+        self.color = Color(1, 1, 1, 1)
+        """{Color} Color of the particles emitted without a color"""
+        self.gravity = np.zeros(3)
+        """{np.array} Acceleration applied to all the particles, in local space, in units per
+        second squared. Defaults to (0, 0, 0)"""
+        self.drag = 0
+        """{number} Fraction of their velocity that particles lose per second, defaults to 0"""
+        self.streak = 0
+        """{number} Length of the streaks, as the time (in seconds) the particle takes to travel
+        it at its current velocity. With 0, particles are drawn as points. Defaults to 0"""
+        self.point_size = 1
+        """{number} Size of the points (or width of the streaks), in pixels, defaults to 1"""
+        self.antialias = False
+        """{bool} True to antialias particles bigger than 1 pixel, defaults to False"""
+        self._rasterizer = None
+
+    def emit(self, count, positions=(0, 0, 0), velocities=(0, 0, 0), life=1, colors=None):
+        """
+        Creates new particles. Each argument can be given per particle, or once for all of
+        them.
+
+        Arguments:
+
+            count {int} -- Number of particles to emit
+
+            positions {np.array} -- (count,3) array with the local position of each particle, or
+            a single position. Defaults to (0, 0, 0)
+
+            velocities {np.array} -- (count,3) array with the local velocity of each particle, or
+            a single velocity. Defaults to (0, 0, 0)
+
+            life {np.array} -- (count) array with the life of each particle, in seconds, or a
+            single number. Defaults to 1
+
+            colors {Color, ColorArray, np.array} -- Color of the particles (one for all or one
+            per particle, as a ColorArray or a (count,3) uint8 array), or None to use color.
+            Defaults to None
+
+        Returns:
+            {int} - Number of particles actually emitted, less than count if there's not enough
+            room for them
+        """
+        emitted = min(count, self.max_particles - self.count)
+        if emitted <= 0:
+            return 0
+
+        # Only the first emitted particles are used, if there's no room for all of them
+        def first(values, shape):
+            values = np.asarray(values)
+            return values[:emitted] if values.shape == (count,) + shape else values
+
+        new = slice(self.count, self.count + emitted)
+        self.positions[new] = first(positions, (3,))
+        self.velocities[new] = first(velocities, (3,))
+        self.life[new] = first(life, ())
+        if colors is None:
+            colors = self.color
+        if isinstance(colors, Color):
+            colors = np.clip(np.array(colors.tuple3()), 0, 255).astype(np.uint8)
+        elif isinstance(colors, ColorArray):
+            colors = colors.to_rgb8()
+        self.colors[new] = first(colors, (3,))
+        self.count += emitted
+
+        return emitted
+
+    def update(self, delta_time):
+        """
+        Advances the simulation of all the particles: applies gravity and drag, moves them, and
+        removes the ones whose life ran out.
+
+        Arguments:
+
+            delta_time {number} -- Time to advance, in seconds
+        """
+        count = self.count
+        velocities = self.velocities[:count]
+        velocities += self.gravity * delta_time
+        if self.drag != 0:
+            velocities *= max(1 - self.drag * delta_time, 0)
+        positions = self.positions[:count]
+        positions += velocities * delta_time
+        life = self.life[:count]
+        life -= delta_time
+
+        # Move live particles from the end into the slots of the dead ones
+        alive = life > 0
+        alive_count = int(np.count_nonzero(alive))
+        if alive_count < count:
+            holes = np.flatnonzero(~alive[:alive_count])
+            movers = np.flatnonzero(alive[alive_count:]) + alive_count
+            for array in (self.positions, self.velocities, self.life, self.colors):
+                array[holes] = array[movers]
+            self.count = alive_count
+
+    def clear(self):
+        """
+        Removes all the particles.
+        """
+        self.count = 0
+
+    def capture(self):
+        """
+        Takes a snapshot of the particles, as they are drawn (see Frame), that doesn't change
+        when the particles are updated.
+
+        Returns:
+            {3-tuple} - (start, end, colors), where start and end are (N,3) arrays with the
+            local position of both ends of the streak of each particle (the same position for
+            points), and colors is a (N,3) uint8 array with their colors
+        """
+        count = self.count
+        start = self.positions[:count].copy()
+        end = start if self.streak == 0 else start - self.velocities[:count] * self.streak
+
+        return start, end, self.colors[:count].copy()
+
+    def draw(self, surface, camera, rect, world_matrix, particles=None, scene_depth=None):
+        """
+        Draws the particles on a surface, over what is already there. Only the part of the
+        surface around the visible particles is read and written.
+
+        Arguments:
+
+            surface {pygame.Surface} -- Surface where the particles should be drawn
+
+            camera {Camera} -- Camera to use
+
+            rect {pygame.Rect} -- Viewport on the surface
+
+            world_matrix {np.array} -- World matrix of this object
+
+            particles {3-tuple} -- Snapshot of the particles to draw (see capture), or None to
+            draw them as they are now
+
+            scene_depth {np.array} -- Depth buffer of the part of the viewport inside the surface
+            (see Rasterizer.depth), with the depth of what is already drawn, so that particles
+            behind it are hidden, or None to draw all the particles over it. Defaults to None
+        """
+        import pygame
+
+        start, end, colors = self.capture() if particles is None else particles
+        target = pygame.Rect(rect).clip(surface.get_rect())
+        if (len(start) == 0) or (target.width == 0) or (target.height == 0):
+            return
+
+        # Project both ends of all the particles at once (a single end, for points), and keep
+        # the ones in front of the camera, and with some part inside the viewport
+        count = len(start)
+        ends = 1 if end is start else 2
+        vertices = np.stack((start, end), axis=1).reshape((-1, 3)) if ends == 2 else start
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if camera.ortho:
+                points, depth = kernels.project_affine(vertices,
+                                                       world_matrix @ camera.get_ortho_matrix(),
+                                                       np.arange(len(vertices)), tuple(rect))
+                w = np.ones(len(depth))
+            else:
+                clip, points = kernels.project(vertices,
+                                               world_matrix @ camera.get_view_projection_matrix(),
+                                               np.arange(len(vertices)), tuple(rect))
+                depth = w = clip[:, 3]
+            visible = kernels.frustum_test(points, w, np.arange(0, len(vertices) + 1, ends),
+                                           tuple(rect), self.point_size * 0.5 + 2)
+        points = points.reshape((count, ends, 2))[visible]
+        depth = depth.reshape((count, ends))[visible]
+        colors = colors[visible]
+        if len(points) == 0:
+            return
+
+        # Only the part of the viewport around the particles is read, drawn and written back
+        pad = self.point_size * 0.5 + 2
+        low = np.floor(points.reshape((-1, 2)).min(axis=0) - pad)
+        high = np.ceil(points.reshape((-1, 2)).max(axis=0) + pad)
+        box = pygame.Rect(int(max(low[0], target.left)), int(max(low[1], target.top)), 0, 0)
+        box.width = int(min(high[0], target.right)) - box.x
+        box.height = int(min(high[1], target.bottom)) - box.y
+        if (box.width <= 0) or (box.height <= 0):
+            return
+
+        if self._rasterizer is None:
+            self._rasterizer = Rasterizer(box.width, box.height)
+        rasterizer = self._rasterizer
+        rasterizer.resize(box.width, box.height)
+        rasterizer.perspective = not camera.ortho
+        box_surface = surface.subsurface(box)
+        if scene_depth is not None:
+            scene_depth = scene_depth[box.x - target.x:box.right - target.x,
+                                      box.y - target.y:box.bottom - target.y]
+        rasterizer.read(box_surface, scene_depth)
+
+        # Draw all the particles as a single batch of points or lines, in the coordinates of the
+        # box
+        points = points - (box.x, box.y)
+        thin = (self.point_size <= 1) or (not self.antialias and self.point_size < 1.5)
+        if thin and (ends == 1):
+            rasterizer.draw_points(points[:, 0], depth[:, 0], colors)
+        elif thin:
+            rasterizer.draw_lines(points[:, 0], points[:, -1], depth[:, 0], depth[:, -1], colors)
+        else:
+            rasterizer.draw_wide_lines(points[:, 0], points[:, -1], depth[:, 0], depth[:, -1],
+                                       colors, self.point_size, self.antialias)
+        rasterizer.blit(box_surface)
@@ -4,9 +4,26 @@ import random
 
 W = 255
 H = 255
-gradtable = [(0, 0) for i in range(0, W*H)]
+
+# Table of random gradients. It takes a while to create, so it's only created the first time it
+# is needed (when noise2d is first called, or gradtable is accessed)
+_gradtable = None
+# The same table as a (W*H,2) NumPy array, for noise2d_grid
+_gradarray = None
+
+def __getattr__(name):
+    if name == "gradtable":
+        return _get_gradtable()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _get_gradtable():
+    if _gradtable is None:
+        _precalc_gradtable()
+    return _gradtable
 
 def _precalc_gradtable():
+    global _gradtable
+    gradtable = [(0, 0) for i in range(0, W*H)]
     rnd = random.Random()
     for i in range(0, H):
         for j in range(0, W):
@@ -20,6 +37,7 @@ def _precalc_gradtable():
                 x = 0
                 y = 0
             gradtable[i*H+j] = (x, y)
+    _gradtable = gradtable
 
 #calculate dot product for v1 and v2
 def _dot(v1, v2):
@@ -29,7 +47,7 @@ def _dot(v1, v2):
 def _gradient(x, y):
 
     # normalize!
-    return gradtable[y*H+x]
+    return _get_gradtable()[y*H+x]
 
 def _s_curve(x):
     return 3*x*x - 2*x*x*x
@@ -69,4 +87,27 @@ def noise2d(x, y):
 
     return z
 
-_precalc_gradtable()
+def noise2d_grid(x, y):
+    """Returns perlin noise for many (x,y) positions at once, for example for all the vertices of
+    a terrain. The result is exactly the same as calling noise2d for each position, but the
+    whole grid is evaluated with NumPy (or with a compiled kernel, see pyxyz.kernels)
+
+    Arguments:
+        x {np.array} - X coordinates
+        y {np.array} - Y coordinates, with the same shape as x (or that broadcasts with it)
+
+    Returns:
+        {np.array} - Noise at each position, in the range [-1,1]
+    """
+    global _gradarray
+    import numpy as np
+    from pyxyz import kernels
+
+    if (_gradarray is None) or (len(_gradarray) != len(_get_gradtable())):
+        _gradarray = np.array(_get_gradtable(), dtype=np.float64).reshape((-1, 2))
+
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64),
+                               np.asarray(y, dtype=np.float64))
+    noise = kernels.perlin_grid(x.reshape(-1), y.reshape(-1), _gradarray, H)
+
+    return noise.reshape(x.shape)
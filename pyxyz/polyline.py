@@ -0,0 +1,217 @@
+"""Polyline class definition"""
+import numpy as np
+from pyxyz.vector3 import Vector3
+from pyxyz.mesh import Mesh
+from pyxyz.draw_commands import DrawCommands
+
+class Polyline:
+    """Polyline class.
+    Stores open line strips (paths, graphs, trajectories, axes...), and can be used instead of
+    a Mesh as the mesh of an object. Unlike the polygons of a mesh, strips are not closed and
+    never filled: they're drawn as lines, with the line width of the material. Strips that go
+    behind the camera are split there, so the rest of their segments are still drawn (see
+    DrawCommands.split_strips).
+    The points of all the strips are stored one after the other in a NumPy array with room to
+    grow, that doubles its capacity when it's full, so appending points takes amortized
+    constant time, and a plot can grow every frame without rebuilding its geometry.
+    """
+    closed = False
+    """{bool} Polylines are open, see Mesh.closed"""
+
+    def __init__(self, points=None, name="UnknownPolyline"):
+        """
+        Arguments:
+
+            points {np.array} -- (N,3) array or list of Vector3 with the points of the first
+            strip, or None to start empty. Defaults to None
+
+            name {str} -- Name of the polyline, defaults to 'UnknownPolyline'
+        """
+        self.name = name
+        """ {str} Name of the polyline"""
+        self.version = 0
+        """ {int} Incremented every time the points change (see Mesh.version)"""
+        self._vertices = np.zeros((16, 3))
+        self._indices = np.arange(16, dtype=np.int32)
+        self._count = 0
+        self._starts = np.zeros(4, dtype=np.int32)
+        self._strip_count = 0
+        self._packed = None
+        self._bounds = None
+
+        if points is not None:
+            self.extend(points)
+
+    @property
+    def points(self):
+        """ {np.array} (N,3) array with the points of all the strips, one strip after the
+        other. This is a view of the storage of the polyline: if it's modified in place,
+        invalidate has to be called"""
+        return self._vertices[:self._count]
+
+    def get_point_count(self):
+        """
+        Returns:
+            {int} - Number of points, in all the strips
+        """
+        return self._count
+
+    def get_strip_count(self):
+        """
+        Returns:
+            {int} - Number of strips
+        """
+        return self._strip_count
+
+    def append(self, point):
+        """
+        Adds a point at the end of the last strip (starting the first strip, if there's none).
+
+        Arguments:
+
+            point {Vector3} -- Point to add, as a Vector3 or a (3) array
+        """
+        if isinstance(point, Vector3):
+            point = (point.x, point.y, point.z)
+        if self._strip_count == 0:
+            self.new_strip()
+        self._reserve(self._count + 1)
+        self._vertices[self._count] = point
+        self._count += 1
+        self.invalidate()
+
+    def extend(self, points):
+        """
+        Adds several points at the end of the last strip (starting the first strip, if there's
+        none).
+
+        Arguments:
+
+            points {np.array} -- (N,3) array or list of Vector3 with the points to add
+        """
+        if (len(points) > 0) and isinstance(points[0], Vector3):
+            points = [(p.x, p.y, p.z) for p in points]
+        points = np.asarray(points, dtype=np.float64).reshape((-1, 3))
+        if self._strip_count == 0:
+            self.new_strip()
+        self._reserve(self._count + len(points))
+        self._vertices[self._count:self._count + len(points)] = points
+        self._count += len(points)
+        self.invalidate()
+
+    def new_strip(self, points=None):
+        """
+        Starts a new strip, so the next points added are not connected to the previous ones.
+        If the last strip has no points yet, no new strip is started.
+
+        Arguments:
+
+            points {np.array} -- (N,3) array or list of Vector3 with the first points of the
+            new strip, or None. Defaults to None
+        """
+        if (self._strip_count == 0) or (self._starts[self._strip_count - 1] != self._count):
+            if self._strip_count == len(self._starts):
+                self._starts = np.concatenate((self._starts, np.zeros_like(self._starts)))
+            self._starts[self._strip_count] = self._count
+            self._strip_count += 1
+            self.invalidate()
+
+        if points is not None:
+            self.extend(points)
+
+    def clear(self):
+        """
+        Removes all the points and strips, keeping the storage allocated.
+        """
+        self._count = 0
+        self._strip_count = 0
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Discards the cached packed arrays and bounds of this polyline. Adding points is detected
+        automatically, but if the points are changed in place, this function has to be called.
+        """
+        self.version += 1
+        self._packed = None
+        self._bounds = None
+
+    def get_packed(self):
+        """
+        Retrieves the points of this polyline in the packed format of meshes (see
+        Mesh.get_packed), with each strip as a polygon. The arrays are views of the storage of
+        the polyline, so this doesn't copy the points.
+
+        Returns:
+            {3-tuple} - (vertices, indices, offsets), where vertices is a (N,3) float array,
+            indices is an array with the vertex indices of all strips, one after the other, and
+            offsets is a (S+1) array such that strip i uses indices[offsets[i]:offsets[i+1]]
+        """
+        if self._packed is None:
+            offsets = np.append(self._starts[:self._strip_count], self._count).astype(np.int32)
+            self._packed = (self._vertices[:self._count], self._indices[:self._count], offsets)
+
+        return self._packed
+
+    def get_bounds(self):
+        """
+        Retrieves the axis-aligned bounding box of this polyline, in local space.
+
+        Returns:
+            {2-tuple} - (min, max), both as (3) NumPy arrays. If the polyline is empty, both
+            are zero
+        """
+        if self._bounds is None:
+            if self._count == 0:
+                self._bounds = (np.zeros(3), np.zeros(3))
+            else:
+                self._bounds = (self.points.min(axis=0), self.points.max(axis=0))
+
+        return self._bounds
+
+    def render(self, screen, clip_matrix, material):
+        """
+        Renders the polyline, with the backend of meshes (see Mesh.backend).
+
+        Arguments:
+
+            screen {pygame.surface} -- Display surface on which to render the polyline
+
+            clip_matrix {np.array} -- Clip matrix to use to convert the 3d local space coordinates
+            of the points to screen coordinates.
+
+            material {Material} -- Material to be used to render the polyline
+        """
+        Mesh.backend.draw(self.get_commands(screen.get_rect(), clip_matrix, material), screen)
+
+    def get_commands(self, rect, clip_matrix, material):
+        """
+        Projects the polyline and creates the draw commands to render it, with each strip as
+        an open polygon (see DrawCommands.from_mesh).
+
+        Arguments:
+
+            rect {4-tuple} -- (x, y, width, height) of the viewport
+
+            clip_matrix {np.array} -- Clip matrix to use to convert the 3d local space coordinates
+            of the points to screen coordinates.
+
+            material {Material} -- Material to be used to render the polyline
+
+        Returns:
+            {DrawCommands} - Commands to draw the polyline
+        """
+        return DrawCommands.from_mesh(self, rect, clip_matrix, material)
+
+    def _reserve(self, count):
+        # Grow the storage to fit count points, doubling its capacity so that appending is
+        # amortized constant time
+        capacity = len(self._vertices)
+        if count <= capacity:
+            return
+        while capacity < count:
+            capacity *= 2
+        vertices = np.zeros((capacity, 3))
+        vertices[:self._count] = self._vertices[:self._count]
+        self._vertices = vertices
+        self._indices = np.arange(capacity, dtype=np.int32)
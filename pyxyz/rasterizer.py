@@ -0,0 +1,474 @@
+"""Software rasterizer class definition"""
+import numpy as np
+from pyxyz import kernels
+
+class Rasterizer:
+    """Software rasterizer class.
+    Draws lines and filled triangles with per-pixel depth testing into NumPy color and depth
+    buffers, which are then copied to a Pygame surface. This is slower than drawing with
+    pygame.draw, but gives exact occlusion (hidden line removal).
+    All the drawing functions take batches of primitives and work on all of them at once.
+    Depths are view depths (distance along the view direction), and are interpolated in a
+    perspective-correct way if the rasterizer is set up for a perspective camera.
+    """
+    pixel_batch = 1 << 22
+    """Maximum number of pixels (approximately) generated at once when filling triangles. Large
+    batches are split to bound the memory used"""
+
+    def __init__(self, width, height):
+        """
+        Arguments:
+
+            width {int} -- Width of the buffers, in pixels
+
+            height {int} -- Height of the buffers, in pixels
+        """
+        self.width = 0
+        """{int} Width of the buffers, in pixels"""
+        self.height = 0
+        """{int} Height of the buffers, in pixels"""
+        self.color = None
+        """{np.array} (width,height,3) uint8 color buffer, in the same layout as
+        pygame.surfarray"""
+        self.depth = None
+        """{np.array} (width,height) depth buffer, with the view depth of each pixel (infinity
+        where nothing was drawn)"""
+        self.perspective = True
+        """{bool} True if depths should be interpolated for a perspective projection, False for
+        an ortographic one"""
+        self.depth_bias = 1e-3
+        """{number} Relative tolerance of the depth test for lines, so that the edges of a
+        polygon are not hidden by the polygon itself"""
+        self.resize(width, height)
+
+    def resize(self, width, height):
+        """
+        Changes the size of the buffers. The contents of the buffers are lost, if the size
+        actually changes.
+
+        Arguments:
+
+            width {int} -- Width of the buffers, in pixels
+
+            height {int} -- Height of the buffers, in pixels
+        """
+        if (width, height) != (self.width, self.height):
+            self.width = width
+            self.height = height
+            self.color = np.zeros((width, height, 3), dtype=np.uint8)
+            self.depth = np.full((width, height), np.inf)
+
+    def clear(self, color=(0, 0, 0)):
+        """
+        Clears the color buffer to the given color and resets the depth buffer.
+
+        Arguments:
+
+            color {3-tuple} -- Color to clear to, with components in the [0..255] range
+        """
+        self.color[:, :] = color
+        self.depth.fill(np.inf)
+
+    def read(self, surface, depth=None):
+        """
+        Copies the contents of a surface into the color buffer (so that rendering happens on top
+        of them) and resets the depth buffer. The surface must have the same size as the
+        buffers.
+
+        Arguments:
+
+            surface {pygame.Surface} -- Surface to read
+
+            depth {np.array} -- (width,height) array with the depth of what is already drawn on
+            the surface, copied into the depth buffer so that it hides what is drawn behind it,
+            or None to reset the depth buffer. Defaults to None
+        """
+        import pygame.surfarray
+        self.color[:, :, :] = pygame.surfarray.array3d(surface)
+        if depth is None:
+            self.depth.fill(np.inf)
+        else:
+            self.depth[:, :] = depth
+
+    def blit(self, surface):
+        """
+        Copies the color buffer to a surface, which must have the same size as the buffers.
+
+        Arguments:
+
+            surface {pygame.Surface} -- Surface to write to
+        """
+        import pygame.surfarray
+        pygame.surfarray.blit_array(surface, self.color)
+
+    def draw_triangles(self, points, depth, colors=None):
+        """
+        Fills a batch of triangles, with depth testing.
+
+        Arguments:
+
+            points {np.array} -- (T,3,2) array with the screen position of the vertices
+
+            depth {np.array} -- (T,3) array with the view depth of the vertices
+
+            colors {np.array} -- (T,3) array with the color of each triangle, with components
+            in the [0..255] range, or (T,3,3) array with the color of each vertex of each
+            triangle, to draw a gradient (interpolated linearly in screen space), or None to
+            only write the depth buffer (for example, for hidden line removal)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape((-1, 3, 2))
+        depth = np.asarray(depth, dtype=np.float64).reshape((-1, 3))
+        gradient = False
+        if colors is not None:
+            colors = np.asarray(colors)
+            gradient = colors.ndim == 3
+            colors = colors.reshape((-1, 3, 3) if gradient else (-1, 3))
+
+        # Depth (or its inverse, for perspective) is affine in screen space, so get the
+        # gradient of its plane for each triangle
+        key = self._depth_to_key(depth)
+        x0, y0 = points[:, 0, 0], points[:, 0, 1]
+        dx1, dy1 = points[:, 1, 0] - x0, points[:, 1, 1] - y0
+        dx2, dy2 = points[:, 2, 0] - x0, points[:, 2, 1] - y0
+        area = dx1 * dy2 - dx2 * dy1
+        valid = area != 0
+        def plane_gradient(values):
+            # Gradient of the plane through the values at the 3 vertices, in screen space
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return (((values[:, 1] - values[:, 0]) * dy2 -
+                         (values[:, 2] - values[:, 0]) * dy1) / area,
+                        ((values[:, 2] - values[:, 0]) * dx1 -
+                         (values[:, 1] - values[:, 0]) * dx2) / area)
+
+        grad_x, grad_y = plane_gradient(key)
+        if gradient:
+            # Colors are interpolated the same way, one plane per channel
+            channels = [plane_gradient(colors[:, :, c].astype(np.float64)) for c in range(3)]
+            color_grad_x = np.stack([channel[0] for channel in channels], axis=1)
+            color_grad_y = np.stack([channel[1] for channel in channels], axis=1)
+
+        for tri, px, py in self._triangle_pixels(points, valid):
+            offset_x = px + 0.5 - x0[tri]
+            offset_y = py + 0.5 - y0[tri]
+            pixel_key = key[tri, 0] + grad_x[tri] * offset_x + grad_y[tri] * offset_y
+
+            if gradient:
+                pixel_colors = colors[tri, 0] + color_grad_x[tri] * offset_x[:, np.newaxis] + \
+                               color_grad_y[tri] * offset_y[:, np.newaxis]
+                pixel_colors = np.clip(pixel_colors + 0.5, 0, 255).astype(np.uint8)
+            else:
+                pixel_colors = None if colors is None else colors[tri]
+
+            self._write(px, py, self._key_to_depth(pixel_key), pixel_colors, 0)
+
+    def draw_points(self, points, depth, colors):
+        """
+        Draws a batch of 1 pixel points, with depth testing. Points outside of the buffers are
+        skipped.
+
+        Arguments:
+
+            points {np.array} -- (N,2) array with the screen position of the points
+
+            depth {np.array} -- (N) array with the view depth of the points
+
+            colors {np.array} -- (N,3) array with the color of each point, with components in
+            the [0..255] range
+        """
+        points = np.floor(np.asarray(points, dtype=np.float64).reshape((-1, 2)))
+        inside = (points[:, 0] >= 0) & (points[:, 0] < self.width) & \
+                 (points[:, 1] >= 0) & (points[:, 1] < self.height)
+        points = points[inside].astype(np.int64)
+
+        self._write(points[:, 0], points[:, 1], np.asarray(depth, dtype=np.float64)[inside],
+                    np.asarray(colors).reshape((-1, 3))[inside], 0)
+
+    def draw_lines(self, start, end, start_depth, end_depth, colors):
+        """
+        Draws a batch of 1 pixel wide line segments, with depth testing.
+
+        Arguments:
+
+            start {np.array} -- (E,2) array with the screen position of the start of the lines
+
+            end {np.array} -- (E,2) array with the screen position of the end of the lines
+
+            start_depth {np.array} -- (E) array with the view depth of the start of the lines
+
+            end_depth {np.array} -- (E) array with the view depth of the end of the lines
+
+            colors {np.array} -- (E,3) array with the color of each line, with components in
+            the [0..255] range, or (E,2,3) array with the colors at the start and end of each
+            line, to draw a gradient
+        """
+        start = np.asarray(start, dtype=np.float64).reshape((-1, 2))
+        end = np.asarray(end, dtype=np.float64).reshape((-1, 2))
+        key0 = self._depth_to_key(np.asarray(start_depth, dtype=np.float64))
+        key1 = self._depth_to_key(np.asarray(end_depth, dtype=np.float64))
+        colors = np.asarray(colors)
+        if colors.ndim < 2:
+            colors = colors.reshape((-1, 3))
+
+        # Clip the lines to the buffer, so that the number of pixels of each line is bounded
+        delta = end - start
+        t_min, t_max = self._clip_lines(start, delta, 0)
+
+        keep = t_min <= t_max
+        t_min, t_max = t_min[keep], t_max[keep]
+        start, delta, colors = start[keep], delta[keep], colors[keep]
+        key0, key1 = key0[keep], key1[keep]
+        p0 = start + delta * t_min[:, np.newaxis]
+        p1 = start + delta * t_max[:, np.newaxis]
+        k0 = key0 + (key1 - key0) * t_min
+        k1 = key0 + (key1 - key0) * t_max
+
+        # One sample per pixel along the major axis (DDA)
+        line, t, px, py, sample_key = kernels.line_samples(p0, p1, k0, k1, self.width,
+                                                           self.height)
+
+        self._write(px, py, self._key_to_depth(sample_key),
+                    self._line_colors(colors, line, t_min[line] + (t_max - t_min)[line] * t),
+                    self.depth_bias)
+
+    def _triangle_pixels(self, points, valid):
+        # Generates the pixels whose centers are inside the triangles, in batches, as
+        # (triangle, x, y) arrays
+
+        # Rows whose pixel centers are inside the triangle vertical range
+        row_start = np.maximum(np.ceil(points[:, :, 1].min(axis=1) - 0.5), 0)
+        row_end = np.minimum(np.floor(points[:, :, 1].max(axis=1) - 0.5), self.height - 1)
+        row_count = np.where(valid, np.maximum(row_end - row_start + 1, 0), 0).astype(np.int64)
+
+        # Split in batches, so big triangles don't use too much memory at once
+        width = np.clip(points[:, :, 0].max(axis=1) - points[:, :, 0].min(axis=1) + 1, 1,
+                        self.width)
+        cost = np.cumsum(row_count * width)
+        start = 0
+        while start < len(points):
+            end = int(np.searchsorted(cost, cost[start] - row_count[start] * width[start] +
+                                      self.pixel_batch, side="right"))
+            end = max(end, start + 1)
+            tris = np.arange(start, end)
+            tris = tris[row_count[tris] > 0]
+            start = end
+            if len(tris) == 0:
+                continue
+
+            # One entry per row of each triangle
+            tri = np.repeat(tris, row_count[tris])
+            first_row = np.repeat(np.cumsum(row_count[tris]) - row_count[tris], row_count[tris])
+            py = row_start[tri] + (np.arange(len(tri)) - first_row)
+            yc = py + 0.5
+
+            # Span of each row, from the intersection with the 3 edges
+            span_min = np.full(len(tri), np.inf)
+            span_max = np.full(len(tri), -np.inf)
+            for a, b in ((0, 1), (1, 2), (2, 0)):
+                ax, ay = points[tri, a, 0], points[tri, a, 1]
+                bx, by = points[tri, b, 0], points[tri, b, 1]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    t = (yc - ay) / (by - ay)
+                crosses = (t >= 0) & (t <= 1)
+                x = ax + t * (bx - ax)
+                span_min = np.where(crosses, np.minimum(span_min, x), span_min)
+                span_max = np.where(crosses, np.maximum(span_max, x), span_max)
+
+            x_start = np.maximum(np.ceil(span_min - 0.5), 0)
+            x_end = np.minimum(np.ceil(span_max - 0.5), self.width)
+            counts = np.maximum(x_end - x_start, 0).astype(np.int64)
+            counts[~np.isfinite(span_min)] = 0
+
+            # One entry per pixel of each span
+            span = np.repeat(np.arange(len(tri)), counts)
+            first_pixel = np.repeat(np.cumsum(counts) - counts, counts)
+            px = x_start[span] + (np.arange(len(span)) - first_pixel)
+            tri = tri[span]
+            py = py[span]
+
+            yield tri, px.astype(np.int64), py.astype(np.int64)
+
+    def draw_wide_lines(self, start, end, start_depth, end_depth, colors, width=1,
+                        antialias=False):
+        """
+        Draws a batch of line segments of any width, optionally antialiased, with depth testing.
+        Each line covers the pixels closer than width/2 to the segment, so lines have round
+        ends, and consecutive lines (like the edges of a polygon) join without gaps.
+        Antialiased lines are blended with what is already drawn, according to how much of each
+        pixel they cover, but only write the depth buffer where they cover most of the pixel.
+
+        Arguments:
+
+            start {np.array} -- (E,2) array with the screen position of the start of the lines
+
+            end {np.array} -- (E,2) array with the screen position of the end of the lines
+
+            start_depth {np.array} -- (E) array with the view depth of the start of the lines
+
+            end_depth {np.array} -- (E) array with the view depth of the end of the lines
+
+            colors {np.array} -- (E,3) array with the color of each line, with components in
+            the [0..255] range, or (E,2,3) array with the colors at the start and end of each
+            line, to draw a gradient
+
+            width {number} -- Width of the lines, in pixels, or (E) array with the width of
+            each line. Defaults to 1
+
+            antialias {bool} -- True to antialias the lines. Defaults to False
+        """
+        start = np.asarray(start, dtype=np.float64).reshape((-1, 2))
+        end = np.asarray(end, dtype=np.float64).reshape((-1, 2))
+        key0 = self._depth_to_key(np.asarray(start_depth, dtype=np.float64))
+        key1 = self._depth_to_key(np.asarray(end_depth, dtype=np.float64))
+        colors = np.asarray(colors)
+        if colors.ndim < 2:
+            colors = colors.reshape((-1, 3))
+        radius = np.broadcast_to(np.asarray(width, dtype=np.float64), (len(start),)) * 0.5
+
+        # Clip the lines to the buffer, extended by the distance at which pixels are still
+        # (partially) covered by the line
+        margin = radius + 0.5 if antialias else np.maximum(radius, 0.5)
+        delta = end - start
+        t_min, t_max = self._clip_lines(start, delta, margin)
+        keep = (t_min <= t_max) & (radius > 0)
+        t_min, t_max = t_min[keep], t_max[keep]
+        start, delta, colors = start[keep], delta[keep], colors[keep]
+        key0, key1, radius, margin = key0[keep], key1[keep], radius[keep], margin[keep]
+        p0 = start + delta * t_min[:, np.newaxis]
+        p1 = start + delta * t_max[:, np.newaxis]
+        k0 = key0 + (key1 - key0) * t_min
+        k1 = key0 + (key1 - key0) * t_max
+
+        # Expand each line into a quad (two triangles) that contains all its pixels
+        delta = p1 - p0
+        squared_length = (delta * delta).sum(axis=1)
+        length = np.sqrt(squared_length)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            direction = np.where(length[:, np.newaxis] > 0, delta / length[:, np.newaxis],
+                                 (1.0, 0.0))
+        along = direction * margin[:, np.newaxis]
+        across = direction[:, ::-1] * (-1, 1) * margin[:, np.newaxis]
+        corners = np.stack((p0 - along - across, p1 + along - across,
+                            p1 + along + across, p0 - along + across), axis=1)
+        quads = corners[:, [0, 1, 2, 0, 2, 3]].reshape((-1, 3, 2))
+
+        for tri, px, py in self._triangle_pixels(quads, np.ones(len(quads), dtype=bool)):
+            line = tri // 2
+
+            # Distance from the pixel center to the closest point of the segment
+            dx, dy = delta[line, 0], delta[line, 1]
+            offset_x = px + (0.5 - p0[line, 0])
+            offset_y = py + (0.5 - p0[line, 1])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = np.clip((offset_x * dx + offset_y * dy) / squared_length[line], 0, 1)
+            t[~np.isfinite(t)] = 0
+            offset_x -= dx * t
+            offset_y -= dy * t
+            distance = np.sqrt(offset_x * offset_x + offset_y * offset_y)
+
+            if antialias:
+                coverage = np.clip(radius[line] + 0.5 - distance, 0, 1)
+                inside = coverage > 0
+            else:
+                inside = distance <= margin[line]
+            line, t = line[inside], t[inside]
+            sample_depth = self._key_to_depth(k0[line] + (k1 - k0)[line] * t)
+            sample_colors = self._line_colors(colors, line,
+                                              t_min[line] + (t_max - t_min)[line] * t)
+
+            if antialias:
+                self._blend(px[inside], py[inside], sample_depth, sample_colors,
+                            coverage[inside], self.depth_bias)
+            else:
+                self._write(px[inside], py[inside], sample_depth, sample_colors,
+                            self.depth_bias)
+
+    @staticmethod
+    def _line_colors(colors, line, t):
+        # Color of samples at parameter t of the given lines, either the color of the line or
+        # interpolated between its start and end colors
+        if colors.ndim == 3:
+            start = colors[line, 0].astype(np.float64)
+            end = colors[line, 1].astype(np.float64)
+            return np.clip(start + (end - start) * t[:, np.newaxis] + 0.5, 0,
+                           255).astype(np.uint8)
+        return colors[line]
+
+    def _clip_lines(self, start, delta, margin):
+        # Clips the lines to the buffer extended by the given margin (Liang-Barsky), returning
+        # the range of the line parameter inside it (empty if t_min > t_max)
+        t_min = np.zeros(len(start))
+        t_max = np.ones(len(start))
+        for axis, size in ((0, self.width), (1, self.height)):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t0 = (0 - margin - start[:, axis]) / delta[:, axis]
+                t1 = (size + margin - start[:, axis]) / delta[:, axis]
+            parallel = delta[:, axis] == 0
+            inside = (start[:, axis] >= 0 - margin) & (start[:, axis] <= size + margin)
+            t_min = np.where(parallel, np.where(inside, t_min, 1),
+                             np.maximum(t_min, np.minimum(t0, t1)))
+            t_max = np.where(parallel, np.where(inside, t_max, 0),
+                             np.minimum(t_max, np.maximum(t0, t1)))
+
+        return t_min, t_max
+
+    def _depth_to_key(self, depth):
+        # Value that can be linearly interpolated in screen space
+        if self.perspective:
+            with np.errstate(divide="ignore"):
+                return 1.0 / depth
+        return depth
+
+    def _key_to_depth(self, key):
+        if self.perspective:
+            with np.errstate(divide="ignore"):
+                return 1.0 / key
+        return key
+
+    def _write(self, px, py, depth, colors, bias):
+        if len(px) == 0:
+            return
+
+        # Several samples can land on the same pixel: keep only the closest one of each
+        pixel = px * self.height + py
+        order = self._closest(pixel, depth)
+        pixel = pixel[order]
+        depth = depth[order]
+
+        # Depth test
+        flat_depth = self.depth.reshape(-1)
+        passed = depth - bias * (np.abs(depth) + 1) < flat_depth[pixel]
+        pixel = pixel[passed]
+        flat_depth[pixel] = np.minimum(flat_depth[pixel], depth[passed])
+
+        if colors is not None:
+            self.color.reshape((-1, 3))[pixel] = colors[order[passed]]
+
+    def _closest(self, pixel, depth):
+        # Indices of the closest sample of each pixel, without sorting
+        return kernels.closest_samples(pixel, depth, self.width * self.height)
+
+    def _blend(self, px, py, depth, colors, coverage, bias):
+        if len(px) == 0:
+            return
+
+        # Depth test first, as samples of hidden lines can land on the same pixels
+        pixel = px * self.height + py
+        flat_depth = self.depth.reshape(-1)
+        passed = depth - bias * (np.abs(depth) + 1) < flat_depth[pixel]
+        pixel, depth, coverage, colors = pixel[passed], depth[passed], coverage[passed], \
+            colors[passed]
+
+        # Several samples can land on the same pixel: keep only the closest one of each
+        order = self._closest(pixel, depth)
+        pixel = pixel[order]
+        depth = depth[order]
+        coverage = coverage[order]
+
+        # Only mostly covered pixels hide what is drawn after them
+        solid = coverage >= 0.5
+        flat_depth[pixel[solid]] = np.minimum(flat_depth[pixel[solid]], depth[solid])
+
+        flat_color = self.color.reshape((-1, 3))
+        alpha = coverage[:, np.newaxis]
+        flat_color[pixel] = np.round(flat_color[pixel] * (1 - alpha) +
+                                     colors[order] * alpha).astype(np.uint8)
@@ -0,0 +1,240 @@
+"""Render pipeline class definition"""
+import threading
+from pyxyz.vector3 import Vector3
+from pyxyz.camera import Camera
+from pyxyz.offscreen import OffscreenBuffer
+
+class RenderPipeline:
+    """Render pipeline class.
+    Renders a scene on a background thread, so that the application can update the scene for
+    the next frame while the current one is being projected and drawn:
+
+    >>> with RenderPipeline(scene, (640, 480)) as pipeline:
+    >>>     while running:
+    >>>         update(scene)
+    >>>         pipeline.submit()
+    >>>         pipeline.present(screen)
+    >>>         pygame.display.flip()
+
+    submit captures a snapshot of the scene on the calling thread: its world-space geometry
+    (see Frame) and a copy of the camera, which don't change when the scene does. The render
+    thread then draws the latest snapshot into a back buffer, and swaps it with the front
+    buffer when it's done. present copies the front buffer (the last complete image) to the
+    screen, and never waits for the render thread.
+    There are two snapshots and two buffers, so the application never waits for rendering
+    either: if it submits faster than frames are rendered, the snapshot that wasn't rendered
+    yet is replaced by the newer one (and counted in dropped).
+    The projection and the RasterizerBackend are mostly NumPy operations, that release the GIL
+    while they work on large arrays, so they can run in parallel with the application. Pygame
+    drawing functions hold the GIL, so the PygameBackend benefits less. Only submit and present
+    should be called while the pipeline is running, and the scene (including its settings and
+    backend) shouldn't be rendered in any other way at the same time. The fog is part of the
+    snapshot (see Frame.fog), but the other render settings are read by the render thread.
+    Objects with their own render function (see Frame.custom_objects) are not drawn, as
+    they can only be rendered as they are now, and the application is changing them.
+    """
+    def __init__(self, scene, size, background=(0, 0, 0), camera=None):
+        """
+        Arguments:
+
+            scene {Scene} -- Scene to render
+
+            size {2-tuple} -- (width, height) of the rendered images, in pixels
+
+            background {3-tuple} -- Color used to clear the image before drawing each frame,
+            with components in the [0..255] range. Defaults to black
+
+            camera {Camera} -- Camera to render with, or None to use the camera of the scene.
+            Defaults to None
+        """
+        self.scene = scene
+        """{Scene} Scene being rendered"""
+        self.camera = camera
+        """{Camera} Camera used to render, or None to use the camera of the scene"""
+        self.background = background
+        """{3-tuple} Color used to clear the image before drawing each frame"""
+        self.submitted = 0
+        """{int} Number of snapshots submitted"""
+        self.rendered = 0
+        """{int} Number of snapshots rendered"""
+        self.dropped = 0
+        """{int} Number of snapshots replaced by a newer one before they were rendered"""
+        self.presented = -1
+        """{int} Number (in submission order, starting at 0) of the snapshot shown by the last
+        call to present, or -1 if none was shown yet"""
+
+        # Each snapshot has its own camera, that is kept between frames so the draw command
+        # caches of the scene keep working
+        self._snapshots = [[None, Camera(True, *size), -1] for _ in range(2)]
+        self._pending = None
+        self._rendering = None
+        self._buffers = [OffscreenBuffer(size[0], size[1], background) for _ in range(2)]
+        self._front_number = -1
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread = None
+        self._stop = False
+        self._error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Starts the render thread. If it is already running, nothing happens.
+        """
+        if (self._thread is not None) and self._thread.is_alive():
+            return
+
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="PyXYZ render", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the render thread, after it finishes the frame it is rendering. Snapshots that
+        weren't rendered yet are discarded.
+        """
+        with self._lock:
+            self._stop = True
+            self._wake.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._check_error()
+
+    def submit(self):
+        """
+        Captures a snapshot of the scene and queues it to be rendered. After this returns, the
+        scene can be changed freely.
+
+        Returns:
+            {int} - Number of the snapshot (in submission order, starting at 0)
+        """
+        self._check_error()
+        frame = self.scene.capture_frame()
+        camera = self.camera if self.camera is not None else self.scene.camera
+
+        with self._lock:
+            # Use the snapshot that isn't being rendered, replacing it if it wasn't yet
+            index = 1 if self._rendering == 0 else 0
+            if self._pending is not None:
+                index = self._pending
+                self.dropped += 1
+            snapshot = self._snapshots[index]
+            snapshot[0] = frame
+            RenderPipeline._copy_camera(camera, snapshot[1])
+            snapshot[2] = self.submitted
+            self.submitted += 1
+            self._pending = index
+            self._wake.notify_all()
+
+        return snapshot[2]
+
+    def present(self, surface, position=(0, 0)):
+        """
+        Copies the last complete image to a surface. This doesn't wait for the render thread,
+        so the image can be from an older snapshot than the last one submitted (see presented).
+
+        Arguments:
+
+            surface {pygame.Surface} -- Surface where the image should be drawn
+
+            position {2-tuple} -- Position of the image on the surface, defaults to (0, 0)
+
+        Returns:
+            {bool} - True if an image was drawn, False if no snapshot was rendered yet
+        """
+        self._check_error()
+        with self._lock:
+            if self._front_number < 0:
+                return False
+            surface.blit(self._buffers[0].surface, position)
+            self.presented = self._front_number
+
+        return True
+
+    def get_image(self):
+        """
+        Retrieves a copy of the last complete image.
+
+        Returns:
+            {np.array} - (height,width,3) uint8 array with the pixels of the image, or None if
+            no snapshot was rendered yet
+        """
+        self._check_error()
+        with self._lock:
+            if self._front_number < 0:
+                return None
+            return self._buffers[0].get_image().copy()
+
+    def wait(self, timeout=None):
+        """
+        Waits until all the submitted snapshots have been rendered (or dropped).
+
+        Arguments:
+
+            timeout {number} -- Maximum time to wait, in seconds, or None to wait as long as
+            needed. Defaults to None
+
+        Returns:
+            {bool} - True if everything was rendered, False if the timeout expired
+        """
+        with self._lock:
+            done = self._wake.wait_for(lambda: ((self._pending is None) and
+                                                (self._rendering is None)) or
+                                       (self._error is not None), timeout)
+        self._check_error()
+        return done
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._wake.wait_for(lambda: self._stop or (self._pending is not None))
+                if self._stop:
+                    return
+                index = self._pending
+                self._pending = None
+                self._rendering = index
+
+            frame, camera, number = self._snapshots[index]
+            back = self._buffers[1]
+            try:
+                back.clear(self.background)
+                self.scene.render_frame(frame, camera, back.surface, custom_objects=False)
+            except Exception as error: # pylint: disable=broad-except
+                with self._lock:
+                    self._error = error
+                    self._rendering = None
+                    self._wake.notify_all()
+                return
+
+            with self._lock:
+                self._buffers.reverse()
+                self._front_number = number
+                self.rendered += 1
+                self._rendering = None
+                self._wake.notify_all()
+
+    def _check_error(self):
+        # Errors in the render thread are raised in the application thread
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+
+    @staticmethod
+    def _copy_camera(source, target):
+        target.ortho = source.ortho
+        target.res_x = source.res_x
+        target.res_y = source.res_y
+        target.near_plane = source.near_plane
+        target.far_plane = source.far_plane
+        target.fov = source.fov
+        target.position = Vector3(source.position.x, source.position.y, source.position.z)
+        target.rotation = source.rotation
+        target.scale = Vector3(source.scale.x, source.scale.y, source.scale.z)
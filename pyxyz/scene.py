@@ -1,5 +1,13 @@
 """Scene class definition"""
+import numpy as np
+import pygame
 from pyxyz.camera import Camera
+from pyxyz.frame import Frame
+from pyxyz.draw_commands import DrawCommands
+from pyxyz.backends import PygameBackend, RasterizerBackend
+from pyxyz.object_list import ObjectList, ObjectListWatcher
+from pyxyz.screen_grid import ScreenGrid
+from pyxyz import kernels
 
 class Scene:
     """Scene class.
@@ -14,18 +22,60 @@ class Scene:
         """ {str} Name of the scene"""
         self.camera = Camera(True, 640, 480)
         """ {Camera} Camera linked to this scene"""
-        self.objects = []
-        """ {List[Object3d]} List of 3d objects on the scene"""
+        self._objects = ObjectList()
+        self.depth_sort = False
+        """ {bool} If True, the polygons of all objects are sorted by depth and drawn back to
+        front (painter's algorithm), instead of in hierarchy order. Defaults to False"""
+        self.fill = False
+        """ {bool} If True, polygons are drawn filled with the material Color instead of as
+        wireframes. This is normally used together with depth_sort. Defaults to False"""
+        self.group_materials = False
+        """ {bool} If True, the polygons are drawn grouped by material (all the polygons with
+        the same color and line width one after the other), so that backends can draw each group
+        as a batch. This changes the order in which objects are drawn, so it's ignored if
+        depth_sort is set. Defaults to False"""
+        self.fog = None
+        """ {Fog} Distance fog applied to the polygons, blending their color toward the fog
+        color by view depth, or None for no fog. It is copied when a frame is captured (see
+        Frame.fog), so changing it only affects the frames captured afterwards. Defaults to
+        None"""
+        self.grid_size = None
+        """ {number} Size, in pixels, of the cells of a grid used to cull the polygons seen
+        with an ortographic camera (see ScreenGrid), so that only the polygons near the viewport
+        are tested. This is meant for large map-style scenes, where only a small part is visible
+        at a time: the grid is built when the frame is projected, and reused while the camera
+        pans (see build_commands). None to test all the polygons. Defaults to None"""
+        self.backend = PygameBackend()
+        """ {object} Backend used to draw the scene (see pyxyz.backends). Use a
+        RasterizerBackend for exact occlusion with depth testing, at the cost of speed.
+        Defaults to a PygameBackend"""
+        self._last_frame = None
+        self._commands_cache = {}
+        self._ortho_cache = {}
+        self._dirty_state = None
+        self._dirty_surface = None
+        self._flattened = None
+        self._watcher = ObjectListWatcher()
+        self._watched = {}
+
+    @property
+    def objects(self):
+        """ {ObjectList} 3d objects at the root of the scene. Assigning a list converts it to an
+        ObjectList"""
+        return self._objects
+
+    @objects.setter
+    def objects(self, objects):
+        self._objects = ObjectList(objects)
 
     def add_object(self, obj):
-        """Adds a 3d object to the scene.
+        """Adds a 3d object to the scene. If it's already on the scene, nothing happens.
 
         Arguments:
 
             obj {Object3d} -- 3d object to add to the scene
         """
-        if obj not in self.objects:
-            self.objects.append(obj)
+        self.objects.append(obj)
 
     def remove_object(self, obj):
         """Removes a 3d object from the scene. This function does not scan the child objects,
@@ -36,8 +86,86 @@ class Scene:
 
             obj {Object3d} -- 3d object to remove from the scene
         """
-        if obj in self.objects:
-            self.objects.remove(obj)
+        self.objects.discard(obj)
+
+    def get_flattened(self):
+        """Retrieves all the objects of the scene, including the children at any depth, as a
+        flat list. Parents always come before their children (depth-first order, the order in
+        which objects are rendered).
+        This is cached, and only rebuilt when objects are added to or removed from the scene
+        or any object in it, or objects are renamed (see ObjectList.watch). Changes to other
+        scenes don't cause a rebuild, and neither do changes to objects that were removed from
+        this scene, as their lists stop being watched when it's rebuilt.
+
+        Returns:
+            {2-tuple} - (objects, parents), where objects is a list of Object3d and parents is a
+            (N) int32 array with the index of the parent of each object, or -1 for objects at
+            the root of the scene
+        """
+        if (self._flattened is None) or self._watcher.changed or \
+           (self._flattened[0] is not self._objects):
+            # Watch all the lists of the hierarchy, to know when it has to be flattened again
+            watcher = self._watcher
+            watcher.changed = False
+            watched = {id(self._objects): self._objects}
+            objects = []
+            parents = []
+            stack = [(obj, -1) for obj in reversed(self._objects)]
+            while stack:
+                obj, parent = stack.pop()
+                parents.append(parent)
+                objects.append(obj)
+                index = len(objects) - 1
+                children = obj.children
+                watched[id(children)] = children
+                stack.extend((child, index) for child in reversed(children))
+
+            # Stop watching the lists that left the hierarchy (removed objects, replaced lists),
+            # so that changes to them don't flag this scene anymore
+            for key, object_list in self._watched.items():
+                if key not in watched:
+                    object_list.unwatch(watcher)
+            for object_list in watched.values():
+                object_list.watch(watcher)
+            self._watched = watched
+
+            names = {}
+            for obj in objects:
+                names.setdefault(obj.name, []).append(obj)
+
+            self._flattened = (self._objects, objects, np.array(parents, dtype=np.int32),
+                               names)
+
+        return self._flattened[1], self._flattened[2]
+
+    def get_object(self, name):
+        """Finds an object by name, anywhere in the scene. Names are indexed (see
+        get_flattened), so this doesn't have to search the hierarchy.
+
+        Arguments:
+
+            name {str} -- Name of the object
+
+        Returns:
+            {Object3d} - First object with that name, in depth-first order, or None if there
+            isn't any
+        """
+        self.get_flattened()
+        found = self._flattened[3].get(name)
+        return found[0] if found else None
+
+    def get_objects(self, name):
+        """Finds all the objects with the given name, anywhere in the scene.
+
+        Arguments:
+
+            name {str} -- Name of the objects
+
+        Returns:
+            {list[Object3d]} - Objects with that name, in depth-first order
+        """
+        self.get_flattened()
+        return list(self._flattened[3].get(name, ()))
 
     def render(self, screen):
         """Renders this scene on the given target
@@ -46,13 +174,336 @@ class Scene:
 
             screen {pygame.Surface} -- Pygame surface where the scene should be drawn
         """
-        # Create clip matrix to be passed to the root-level objects, so they can be drawn
-        camera_matrix = self.camera.get_camera_matrix()
-        projection_matrix = self.camera.get_projection_matrix()
+        self.render_views([(self.camera, screen, None)])
+
+    def render_views(self, views):
+        """Renders this scene from several cameras (for example, for split-screen or a
+        minimap). The hierarchy is traversed and the geometry is transformed to world space only
+        once, and then each view only has to apply its camera and viewport.
+        The projection of a camera works in pixels, so its resolution should match the size
+        of its viewport.
+
+        Arguments:
+
+            views {list[3-tuple]} -- List of (camera, surface, rect) to render. Rect is the
+            viewport on the surface, as a pygame.Rect or (x, y, width, height), or None to use
+            the whole surface. Drawing is clipped to the viewport.
+        """
+        frame = self.capture_frame()
+
+        for camera, surface, rect in views:
+            self.render_frame(frame, camera, surface, rect)
+
+    def capture_frame(self):
+        """Captures the world-space geometry of the scene (see Frame). The objects that didn't
+        change since the last captured frame reuse their geometry from it.
+
+        Returns:
+            {Frame} - Captured frame
+        """
+        self._last_frame = Frame(self, self._last_frame)
+        return self._last_frame
+
+    def render_frame(self, frame, camera, surface, rect=None, custom_objects=True):
+        """Renders an already captured frame with the given camera, using the render settings
+        and backend of this scene.
+        The captured geometry is drawn first, all at once. Then the objects with their own
+        render function are rendered, in hierarchy order, so they are drawn over the rest of
+        the scene, even if they come before it in the hierarchy. Particle systems are drawn
+        last.
+
+        Arguments:
+
+            frame {Frame} -- World-space geometry to render
+
+            camera {Camera} -- Camera to use
+
+            surface {pygame.Surface} -- Pygame surface where the frame should be drawn
+
+            rect {pygame.Rect} -- Viewport on the surface, or None to use the whole surface
+
+            custom_objects {bool} -- If False, the objects with their own render function (see
+            Frame.custom_objects) are not drawn. Their render function uses the objects as they
+            are now, not as they were captured, so they can't be drawn from another thread
+            while the scene changes. Defaults to True
+        """
+        rect = surface.get_rect() if rect is None else pygame.Rect(rect)
+
+        self.backend.draw(self.build_commands(frame, camera, rect), surface)
+
+        # Objects with their own render function are rendered one by one, after the rest of the
+        # geometry, on the visible part of the viewport. Their clip matrix is offset to keep
+        # the center of the viewport where it is, if only part of it is visible
+        if custom_objects and frame.custom_objects:
+            target = rect.clip(surface.get_rect())
+            if (target.width > 0) and (target.height > 0):
+                target_surface = surface.subsurface(target)
+                offset = np.identity(4)
+                offset[3, 0] = rect.x - target.x + (rect.width - target.width) * 0.5
+                offset[3, 1] = -(rect.y - target.y + (rect.height - target.height) * 0.5)
+                clip_matrix = camera.get_view_projection_matrix() @ offset
+                for obj, parent_matrix in frame.custom_objects:
+                    obj.render(target_surface, parent_matrix @ clip_matrix)
+
+        # Particle systems are drawn over the rest of the scene, depth tested against it if the
+        # backend left a depth buffer of the viewport
+        scene_depth = None
+        if frame.particles and isinstance(self.backend, RasterizerBackend) and \
+           (self.backend.rasterizer is not None):
+            target = rect.clip(surface.get_rect())
+            if (self.backend.rasterizer.width, self.backend.rasterizer.height) == target.size:
+                scene_depth = self.backend.rasterizer.depth
+        for particle_system, world_matrix, particles in frame.particles:
+            particle_system.draw(surface, camera, rect, world_matrix, particles, scene_depth)
+
+    def render_dirty(self, surface, background=(0, 0, 0), rect=None):
+        """Renders this scene with its camera, redrawing only the parts of the surface that
+        changed since the last call. Unlike render, the surface should not be cleared
+        between frames: this function clears the regions it redraws with the background color.
+        If nothing changed, nothing is drawn. Particle systems, and objects with their own
+        render function (see Frame.custom_objects), are not drawn.
+        The returned rectangles can be given to pygame.display.update, so that only those get
+        sent to the display:
+
+        >>> pygame.display.update(scene.render_dirty(screen))
+
+        Arguments:
+
+            surface {pygame.Surface} -- Pygame surface where the scene should be drawn
+
+            background {3-tuple} -- Color used to clear the regions that are redrawn, defaults
+            to black
+
+            rect {pygame.Rect} -- Viewport on the surface, or None to use the whole surface
+
+        Returns:
+            {list[pygame.Rect]} - Regions of the surface that were redrawn
+        """
+        rect = surface.get_rect() if rect is None else pygame.Rect(rect)
+        frame = self.capture_frame()
+        commands = self.build_commands(frame, self.camera, rect)
+
+        # Screen-space bounds of each object, padded to account for the line width
+        polygon_bounds = commands.get_polygon_bounds()
+        item_bounds = np.empty((len(frame.items), 4))
+        item_bounds[:, 0:2] = np.inf
+        item_bounds[:, 2:4] = -np.inf
+        np.minimum.at(item_bounds[:, 0:2], commands.polygon_item, polygon_bounds[:, 0:2])
+        np.maximum.at(item_bounds[:, 2:4], commands.polygon_item, polygon_bounds[:, 2:4])
+        pad = np.array([style[1] for style in frame.item_styles], dtype=np.float64) * 0.5 + 2
+        item_bounds += np.stack((-pad, -pad, pad, pad), axis=1).reshape((-1, 4))
+
+        # Compare with the state of each object in the previous call
+        state = {}
+        for item_index, (obj, _, _, _) in enumerate(frame.items):
+            state[id(obj)] = (obj, frame.item_vertices[item_index],
+                              frame.item_keys[item_index], item_bounds[item_index])
+
+        key = (self.camera, self.camera.version, tuple(rect), surface, surface.get_size(),
+               self.depth_sort, self.fill, self.group_materials, frame.fog_key, self.backend)
+        if (self._dirty_state is None) or (self._dirty_state[0] != key):
+            dirty = [rect]
+        else:
+            boxes = []
+            previous = self._dirty_state[1]
+            for obj_id, (obj, vertices, style, bounds) in state.items():
+                old = previous.get(obj_id)
+                if (old is None) or (old[0] is not obj) or (old[1] is not vertices) or \
+                   (old[2] != style):
+                    boxes.append(bounds)
+                    if old is not None:
+                        boxes.append(old[3])
+            for obj_id, old in previous.items():
+                if obj_id not in state:
+                    boxes.append(old[3])
+
+            dirty = []
+            for box in boxes:
+                if np.all(np.isfinite(box)) and (box[2] >= box[0]) and (box[3] >= box[1]):
+                    x0, y0 = int(np.floor(box[0])), int(np.floor(box[1]))
+                    dirty_rect = pygame.Rect(x0, y0, int(np.ceil(box[2])) - x0 + 1,
+                                             int(np.ceil(box[3])) - y0 + 1).clip(rect)
+                    if (dirty_rect.width == 0) or (dirty_rect.height == 0):
+                        continue
+                    # Merge with the regions it overlaps, so nothing is drawn twice
+                    overlaps = dirty_rect.collidelistall(dirty)
+                    while overlaps:
+                        dirty_rect = dirty_rect.unionall([dirty[i] for i in overlaps])
+                        dirty = [r for i, r in enumerate(dirty) if i not in overlaps]
+                        overlaps = dirty_rect.collidelistall(dirty)
+                    dirty.append(dirty_rect)
+
+        self._dirty_state = (key, state)
+
+        # Redraw each region, with only the polygons that touch it. Pygame rasterizes lines
+        # slightly differently when they are clipped, so the polygons are drawn unclipped on a
+        # scratch surface, and only the region is copied to the target
+        if (self._dirty_surface is None) or \
+           (self._dirty_surface.get_size() != surface.get_size()):
+            self._dirty_surface = surface.copy()
+        scratch = self._dirty_surface
+
+        polygon_pad = commands.widths * 0.5 + 2
+        for dirty_rect in dirty:
+            scratch.fill(background, dirty_rect)
+            touches = (polygon_bounds[:, 0] - polygon_pad <= dirty_rect.right) & \
+                      (polygon_bounds[:, 2] + polygon_pad >= dirty_rect.left) & \
+                      (polygon_bounds[:, 1] - polygon_pad <= dirty_rect.bottom) & \
+                      (polygon_bounds[:, 3] + polygon_pad >= dirty_rect.top)
+            region = DrawCommands.from_polygons(commands.points, commands.depth,
+                                                commands.offsets, commands.colors,
+                                                commands.widths, commands.rect,
+                                                commands.perspective, touches.nonzero()[0],
+                                                commands.polygon_item, commands.vertex_colors,
+                                                commands.closed)
+            self.backend.draw(region, scratch)
+            surface.blit(scratch, dirty_rect, dirty_rect)
+
+        return dirty
+
+    def get_fog_key(self):
+        """Retrieves a key that changes when the fog of this scene changes (see Fog.get_key).
+
+        Returns:
+            {tuple} - Key, or None if the scene has no fog
+        """
+        return self.fog.get_key() if self.fog is not None else None
+
+    def build_commands(self, frame, camera, rect):
+        """Projects an already captured frame with the given camera, creating the draw commands
+        for it, using the render settings of this scene. This is the first stage of
+        render_frame; the commands can then be drawn with any backend, and be kept to be drawn
+        again later.
+        If the frame has the same geometry (see Frame.generation) as the last one projected with
+        this camera and viewport, and the camera didn't change, the previous commands are
+        returned.
+        With an ortographic camera, screen positions are an affine function of world positions,
+        so the last projection is also kept (sorted and colored, but not culled), and while the
+        camera only pans (moves without rotating or changing its projection), it's shifted
+        instead of projecting the frame again, and only culling is done again (see grid_size).
+
+        Arguments:
+
+            frame {Frame} -- World-space geometry to render
+
+            camera {Camera} -- Camera to use
+
+            rect {4-tuple} -- (x, y, width, height) of the viewport
+
+        Returns:
+            {DrawCommands} - Commands to draw the frame
+        """
+        camera.get_view_projection_matrix()
+        key = (camera.version, tuple(rect), frame.generation, self.depth_sort, self.fill,
+               self.group_materials, frame.fog_key)
+        cached = self._commands_cache.get(id(camera))
+        if (cached is not None) and (cached[0] is camera) and (cached[1] == key) and \
+           (cached[2] is frame.vertices):
+            return cached[3]
+
+        # Polygons completely outside of the viewport are culled, with a margin for the lines
+        margin = max([0 if self.fill else style[1] for style in frame.group_styles],
+                     default=0) * 0.5 + 2
+        if camera.ortho:
+            commands = self._build_ortho_commands(frame, camera, rect, margin)
+        else:
+            # Line strips partially behind the camera are split, and culled by segments
+            points, depth, visible = frame.project(camera, rect, margin)
+            closed = frame.item_closed[frame.polygon_item]
+            visible |= DrawCommands.get_partial_strips(depth, frame.offsets, closed)
+            order, polygon_colors, index_colors, widths = \
+                self._sort_polygons(frame, depth, visible.nonzero()[0])
+            commands = DrawCommands.from_polygons(points, depth, frame.offsets, polygon_colors,
+                                                  widths, tuple(rect), True, order,
+                                                  frame.polygon_item, index_colors, closed)
+            commands = commands.split_strips(margin)
+        self._commands_cache[id(camera)] = (camera, key, frame.vertices, commands)
+
+        return commands
+
+    def _sort_polygons(self, frame, depth, order):
+        # Sorts the given polygons of a projected frame in the order they should be drawn, and
+        # gets the color (with the fog of the frame) and line width of all the polygons
+        fog = frame.fog
+        polygon_depth = frame.get_polygon_depth(depth) \
+            if self.depth_sort or (fog is not None) else None
+        polygon_bin = fog.get_factor(polygon_depth) if fog is not None else None
+        if self.depth_sort:
+            # Sort all the visible polygons at once, furthest first
+            order = order[np.argsort(-polygon_depth[order], kind="stable")]
+        elif self.group_materials:
+            # Keep the polygons of each material group together, in hierarchy order, and
+            # within each group, the ones with the same amount of fog
+            polygon_group = frame.item_group[frame.polygon_item[order]]
+            if polygon_bin is not None:
+                order = order[np.lexsort((polygon_bin[order], polygon_group))]
+            else:
+                order = order[np.argsort(polygon_group, kind="stable")]
+
+        # Styles are stored per material group, and expanded to each polygon
+        colors = np.array([style[0] for style in frame.group_styles],
+                          dtype=np.uint8).reshape((-1, 3))
+        widths = np.array([0 if self.fill else style[1] for style in frame.group_styles],
+                          dtype=np.int32)
+        polygon_group = frame.item_group[frame.polygon_item]
+        polygon_colors = colors[polygon_group] if frame.polygon_colors is None \
+            else frame.polygon_colors
+        index_colors = frame.index_colors
+
+        if fog is not None:
+            # Blend all the polygons (and vertices) toward the fog color at once
+            polygon_colors = fog.apply(polygon_colors, polygon_depth)
+            if index_colors is not None:
+                index_colors = fog.apply(index_colors, depth)
+
+        return order, polygon_colors, index_colors, widths[polygon_group]
+
+    def _build_ortho_commands(self, frame, camera, rect, margin):
+        # Reuse the last projection of the frame if the camera only panned since then. With
+        # fog, the camera also can't have moved in depth
+        matrix = camera.get_ortho_matrix()
+        key = (matrix[0:3].tobytes(), tuple(rect), frame.generation, self.depth_sort,
+               self.fill, self.group_materials, frame.fog_key, self.grid_size)
+        cached = self._ortho_cache.get(id(camera))
+        shift = matrix[3] - cached[3] if cached is not None else None
+        if (cached is None) or (cached[0] is not camera) or (cached[1] != key) or \
+           (cached[2] is not frame.vertices) or ((frame.fog is not None) and (shift[2] != 0)):
+            points, depth = kernels.project_affine(frame.vertices, matrix, frame.indices, rect)
+            order, polygon_colors, index_colors, widths = \
+                self._sort_polygons(frame, depth, np.arange(len(frame.offsets) - 1))
+            commands = DrawCommands.from_polygons(points, depth, frame.offsets, polygon_colors,
+                                                  widths, tuple(rect), False, None,
+                                                  frame.polygon_item, index_colors,
+                                                  frame.item_closed[frame.polygon_item])
+            bounds = commands.get_polygon_bounds()
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            grid = ScreenGrid(bounds, self.grid_size) if self.grid_size is not None else None
+            cached = (camera, key, frame.vertices, matrix[3].copy(), commands, order, rank,
+                      bounds, grid)
+            self._ortho_cache[id(camera)] = cached
+            shift = np.zeros(3)
+        _, _, _, _, projected, order, rank, bounds, grid = cached
+
+        # Cull in the coordinates of the cached projection, moving the viewport instead of the
+        # polygons. Polygons completely outside of it are the ones whose bounds are
+        shift_x, shift_y = shift[0], -shift[1]
+        view = (rect[0] - shift_x - margin, rect[1] - shift_y - margin,
+                rect[0] + rect[2] - shift_x + margin, rect[1] + rect[3] - shift_y + margin)
+        if grid is not None:
+            candidates = grid.query(view)
+            order = order[np.sort(rank[candidates])]
+        polygon_bounds = bounds[order]
+        order = order[(polygon_bounds[:, 2] >= view[0]) & (polygon_bounds[:, 0] <= view[2]) &
+                      (polygon_bounds[:, 3] >= view[1]) & (polygon_bounds[:, 1] <= view[3])]
 
-        clip_matrix = camera_matrix @ projection_matrix
+        commands = DrawCommands.from_polygons(projected.points, projected.depth,
+                                              projected.offsets, projected.colors,
+                                              projected.widths, tuple(rect), False, order,
+                                              projected.polygon_item, projected.vertex_colors,
+                                              projected.closed)
+        if shift.any():
+            commands.points = commands.points + (shift_x, shift_y)
+            commands.depth = commands.depth + shift[2]
 
-        # Render all root-level objects
-        for obj in self.objects:
-            obj.render(screen, clip_matrix)
-            
\ No newline at end of file
+        return commands
@@ -0,0 +1,274 @@
+"""Saving and loading of whole scenes as snapshots.
+A snapshot stores the object hierarchy, transforms, material table (with the per-polygon and
+per-vertex colors), camera and render settings of a scene as a few NumPy arrays (in an .npz
+file), and the meshes as binary mesh files (see Mesh.save) in a mesh store directory, named
+after a hash of their contents. Loading a snapshot creates the objects in bulk from those
+arrays, and memory-maps the meshes, instead of running the code that built the scene."""
+import hashlib
+import os
+import numpy as np
+import quaternion
+from pyxyz.vector3 import Vector3
+from pyxyz.color import Color
+from pyxyz.color_array import ColorArray
+from pyxyz.fog import Fog
+from pyxyz.material import Material
+from pyxyz.mesh import Mesh
+from pyxyz.object3d import Object3d
+from pyxyz.scene import Scene
+
+SNAPSHOT_VERSION = 2
+"""Version of the scene snapshot format. Snapshots of version 1 (without the fog, grid size,
+material grouping and per-polygon and per-vertex colors) can still be loaded"""
+
+def _table(values):
+    # Builds a table of the distinct values (by identity), and the index of each value in it
+    # (-1 for None)
+    table = []
+    lookup = {}
+    index = np.full(len(values), -1, dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        if id(value) not in lookup:
+            lookup[id(value)] = len(table)
+            table.append(value)
+        index[i] = lookup[id(value)]
+
+    return table, index
+
+def _transform_arrays(objects):
+    positions = np.array([(o.position.x, o.position.y, o.position.z) for o in objects],
+                         dtype=np.float64).reshape((-1, 3))
+    rotations = np.array([(o.rotation.w, o.rotation.x, o.rotation.y, o.rotation.z)
+                          for o in objects], dtype=np.float64).reshape((-1, 4))
+    scales = np.array([(o.scale.x, o.scale.y, o.scale.z) for o in objects],
+                      dtype=np.float64).reshape((-1, 3))
+
+    return positions, rotations, scales
+
+def _set_transforms(objects, positions, rotations, scales):
+    for obj, position, rotation, scale in zip(objects, positions.tolist(),
+                                              quaternion.as_quat_array(rotations),
+                                              scales.tolist()):
+        obj.position = Vector3(*position)
+        obj.rotation = rotation
+        obj.scale = Vector3(*scale)
+
+def _color_arrays(color_arrays):
+    # Packs a list of ColorArray (or None) in a single array, with the number of colors of each
+    # one (-1 for None)
+    counts = np.array([len(c) if c is not None else -1 for c in color_arrays], dtype=np.int64)
+    data = [c.data for c in color_arrays if c is not None]
+    data = np.concatenate(data).astype(np.float64) if data else np.zeros((0, 4))
+
+    return data, counts
+
+def _split_color_arrays(data, counts):
+    # Inverse of _color_arrays
+    ends = np.cumsum(np.maximum(counts, 0)).tolist()
+    return [ColorArray(data[end - count:end]) if count >= 0 else None
+            for count, end in zip(counts.tolist(), ends)]
+
+def store_mesh(mesh, mesh_store):
+    """
+    Saves a mesh in a mesh store, named after a hash of its name and contents, so that the same
+    mesh is only stored once, even if it is used by several scenes. If it is already there, it
+    is not saved again.
+
+    Arguments:
+
+        mesh {Mesh} -- Mesh to store
+
+        mesh_store {str} -- Directory of the mesh store
+
+    Returns:
+        {str} - Name of the file where the mesh is stored
+    """
+    vertices, indices, offsets = mesh.get_packed()
+    digest = hashlib.sha1(mesh.name.encode("utf-8"))
+    for array, dtype in ((vertices, "<f8"), (indices, "<i4"), (offsets, "<i4")):
+        digest.update(np.ascontiguousarray(array, dtype=dtype).tobytes())
+    filename = os.path.join(mesh_store, digest.hexdigest() + ".pxm")
+
+    if not os.path.isfile(filename):
+        # Write to a temporary file first, so a partial file is never used
+        os.makedirs(mesh_store, exist_ok=True)
+        temp_filename = f"{filename}.{os.getpid()}.tmp"
+        mesh.save(temp_filename)
+        os.replace(temp_filename, filename)
+
+    return filename
+
+def _snapshot_filename(filename):
+    # Snapshots always have the .npz extension, added here instead of letting NumPy add it on
+    # save, so load_scene finds the file with the same name given to save_scene
+    filename = os.fspath(filename)
+    return filename if filename.endswith(".npz") else filename + ".npz"
+
+def save_scene(scene, filename, mesh_store=None):
+    """
+    Saves a snapshot of a scene, that can be loaded with load_scene.
+    Objects are saved as Object3d (subclasses lose their extra data), and meshes are saved in
+    the mesh store (polylines are not saved), with the snapshot only referencing them. Meshes
+    used by several objects are only saved once. The render settings (depth_sort, fill,
+    group_materials, fog and grid_size) are saved, but the backend of the scene is not.
+
+    Arguments:
+
+        scene {Scene} -- Scene to save
+
+        filename {str} -- Name of the snapshot file. The .npz extension is added if it doesn't
+        have one
+
+        mesh_store {str} -- Directory where to store the meshes. If not given, uses a "meshes"
+        directory next to the snapshot file
+    """
+    filename = _snapshot_filename(filename)
+    directory = os.path.dirname(os.path.abspath(filename))
+    if mesh_store is None:
+        mesh_store = os.path.join(directory, "meshes")
+
+    objects, parents = scene.get_flattened()
+    positions, rotations, scales = _transform_arrays(objects)
+    meshes, mesh_index = _table([obj.mesh if isinstance(obj.mesh, Mesh) else None
+                                 for obj in objects])
+    materials, material_index = _table([obj.material for obj in objects])
+    polygon_colors, polygon_color_counts = _color_arrays([m.polygon_colors for m in materials])
+    vertex_colors, vertex_color_counts = _color_arrays([m.vertex_colors for m in materials])
+
+    # Meshes are referenced by path relative to the snapshot, so both can be moved together
+    mesh_files = [os.path.relpath(store_mesh(mesh, mesh_store), directory) for mesh in meshes]
+
+    camera = scene.camera
+    camera_transform = _transform_arrays([camera])
+
+    # No fog is saved as an empty array, and no grid as NaN
+    fog = scene.fog
+    fog_settings = np.zeros(0) if fog is None else \
+                   np.array([fog.color.r, fog.color.g, fog.color.b, fog.color.a, fog.start,
+                             fog.end, fog.bins], dtype=np.float64)
+    grid_size = np.nan if scene.grid_size is None else scene.grid_size
+
+    np.savez(filename,
+             version=np.array(SNAPSHOT_VERSION),
+             scene_name=np.array(str(scene.name)),
+             scene_flags=np.array([scene.depth_sort, scene.fill, scene.group_materials]),
+             fog=fog_settings,
+             grid_size=np.array(grid_size, dtype=np.float64),
+             names=np.array([str(obj.name) for obj in objects], dtype=str),
+             parents=parents,
+             positions=positions,
+             rotations=rotations,
+             scales=scales,
+             mesh_index=mesh_index,
+             material_index=material_index,
+             mesh_files=np.array(mesh_files, dtype=str),
+             material_names=np.array([str(m.name) for m in materials], dtype=str),
+             material_colors=np.array([(m.Color.r, m.Color.g, m.Color.b, m.Color.a)
+                                       for m in materials], dtype=np.float64).reshape((-1, 4)),
+             material_line_widths=np.array([m.line_width for m in materials],
+                                           dtype=np.float64),
+             material_polygon_colors=polygon_colors,
+             material_polygon_color_counts=polygon_color_counts,
+             material_vertex_colors=vertex_colors,
+             material_vertex_color_counts=vertex_color_counts,
+             camera_settings=np.array([camera.ortho, camera.res_x, camera.res_y,
+                                       camera.near_plane, camera.far_plane, camera.fov],
+                                      dtype=np.float64),
+             camera_transform=np.concatenate([t.reshape(-1) for t in camera_transform]))
+
+def load_scene(filename, mmap=True):
+    """
+    Loads a scene snapshot saved with save_scene.
+    Objects that used the same mesh or material when the scene was saved share it again.
+    Different meshes with the same name and contents were stored only once, so the first one is
+    loaded, and the others are created as instances of it (see Mesh.instance), that share its
+    arrays but are still different meshes, like when they were saved.
+
+    Arguments:
+
+        filename {str} -- Name of the snapshot file. The .npz extension is added if it doesn't
+        have one, like in save_scene
+
+        mmap {bool} -- If True, memory-map the meshes from the mesh store instead of reading
+        them (see Mesh.load). Defaults to True
+
+    Returns:
+        {Scene} - Loaded scene
+    """
+    filename = _snapshot_filename(filename)
+    directory = os.path.dirname(os.path.abspath(filename))
+    with np.load(filename, allow_pickle=False) as data:
+        if not 1 <= int(data["version"]) <= SNAPSHOT_VERSION:
+            raise ValueError(f"{filename} is not a PyXYZ scene snapshot (version " +
+                             f"{SNAPSHOT_VERSION})!")
+        data = {key: data[key] for key in data.files}
+
+    scene = Scene(str(data["scene_name"]))
+    flags = [bool(flag) for flag in data["scene_flags"]]
+    scene.depth_sort, scene.fill = flags[0:2]
+    if len(flags) > 2:
+        scene.group_materials = flags[2]
+    if len(data.get("fog", ())) > 0:
+        r, g, b, a, start, end, bins = data["fog"].tolist()
+        scene.fog = Fog(Color(r, g, b, a), start, end, int(bins))
+    if not np.isnan(data.get("grid_size", np.nan)):
+        scene.grid_size = data["grid_size"].item()
+
+    # Camera
+    ortho, res_x, res_y, near_plane, far_plane, fov = data["camera_settings"].tolist()
+    camera = scene.camera
+    camera.ortho = bool(ortho)
+    camera.res_x = int(res_x)
+    camera.res_y = int(res_y)
+    camera.near_plane = near_plane
+    camera.far_plane = far_plane
+    camera.fov = fov
+    transform = data["camera_transform"]
+    _set_transforms([camera], transform[0:3].reshape((1, 3)), transform[3:7].reshape((1, 4)),
+                    transform[7:10].reshape((1, 3)))
+
+    # Meshes and materials, each created once and shared by all the objects that use them.
+    # Different meshes stored in the same file become instances of the first one
+    loaded = {}
+    meshes = []
+    for mesh_file in data["mesh_files"].tolist():
+        if mesh_file in loaded:
+            meshes.append(loaded[mesh_file].instance())
+        else:
+            loaded[mesh_file] = Mesh.load(os.path.join(directory, mesh_file), mmap)
+            meshes.append(loaded[mesh_file])
+
+    material_count = len(data["material_names"])
+    no_colors = np.full(material_count, -1)
+    polygon_colors = _split_color_arrays(data.get("material_polygon_colors"),
+                                         data.get("material_polygon_color_counts", no_colors))
+    vertex_colors = _split_color_arrays(data.get("material_vertex_colors"),
+                                        data.get("material_vertex_color_counts", no_colors))
+    materials = []
+    for name, color, line_width, material_polygon_colors, material_vertex_colors in \
+        zip(data["material_names"].tolist(), data["material_colors"].tolist(),
+            data["material_line_widths"].tolist(), polygon_colors, vertex_colors):
+        material = Material(Color(*color), name)
+        material.line_width = int(line_width) if line_width.is_integer() else line_width
+        material.polygon_colors = material_polygon_colors
+        material.vertex_colors = material_vertex_colors
+        materials.append(material)
+
+    # Objects, in bulk
+    objects = [Object3d(name) for name in data["names"].tolist()]
+    _set_transforms(objects, data["positions"], data["rotations"], data["scales"])
+    for obj, mesh, material, parent in zip(objects, data["mesh_index"].tolist(),
+                                           data["material_index"].tolist(),
+                                           data["parents"].tolist()):
+        if mesh >= 0:
+            obj.mesh = meshes[mesh]
+        if material >= 0:
+            obj.material = materials[material]
+        if parent >= 0:
+            objects[parent].children.append(obj)
+        else:
+            scene.objects.append(obj)
+
+    return scene
@@ -0,0 +1,89 @@
+"""Screen grid class definition"""
+import numpy as np
+
+class ScreenGrid:
+    """Screen grid class.
+    Uniform grid over the screen-space bounding boxes of a set of polygons, to find the ones
+    that overlap a rectangle (like a viewport) without testing all of them. Each polygon is
+    stored in all the cells its bounding box touches, except the ones that touch too many
+    cells, which are always returned.
+    This is used by Scene to cull large map-style scenes seen with an ortographic camera, where
+    the polygons keep their relative screen positions while the camera pans (see
+    Scene.grid_size).
+    """
+    max_cells = 64
+    """Polygons whose bounding box touches more cells than this are not stored in the cells,
+    but always returned by query"""
+
+    def __init__(self, bounds, cell_size):
+        """
+        Arguments:
+
+            bounds {np.array} -- (P,4) array with the (min x, min y, max x, max y) of each
+            polygon. Polygons with empty bounds (min greater than max) are never returned
+
+            cell_size {number} -- Size of the cells, in pixels
+        """
+        self.cell_size = cell_size
+        """{number} Size of the cells, in pixels"""
+
+        bounds = np.asarray(bounds, dtype=np.float64).reshape((-1, 4))
+        valid = np.isfinite(bounds).all(axis=1) & (bounds[:, 0] <= bounds[:, 2]) & \
+                (bounds[:, 1] <= bounds[:, 3])
+        polygons = valid.nonzero()[0]
+        cells = np.floor(bounds[polygons] / cell_size).astype(np.int64)
+        columns = cells[:, 2] - cells[:, 0] + 1
+        rows = cells[:, 3] - cells[:, 1] + 1
+        large = columns * rows > ScreenGrid.max_cells
+
+        self._always = polygons[large]
+        polygons, cells, columns, rows = polygons[~large], cells[~large], columns[~large], \
+            rows[~large]
+        if len(polygons) == 0:
+            self._origin = np.zeros(2, dtype=np.int64)
+            self._size = np.ones(2, dtype=np.int64)
+            self._keys = np.zeros(0, dtype=np.int64)
+            self._polygons = np.zeros(0, dtype=np.int64)
+            return
+
+        # One entry per polygon and cell it touches, sorted by cell, column after column
+        self._origin = cells[:, 0:2].min(axis=0)
+        self._size = cells[:, 2:4].max(axis=0) - self._origin + 1
+        counts = columns * rows
+        entry_polygon = np.repeat(np.arange(len(polygons)), counts)
+        local = np.arange(len(entry_polygon)) - np.repeat(np.cumsum(counts) - counts, counts)
+        column = cells[entry_polygon, 0] + local // rows[entry_polygon] - self._origin[0]
+        row = cells[entry_polygon, 1] + local % rows[entry_polygon] - self._origin[1]
+        keys = column * self._size[1] + row
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._polygons = polygons[entry_polygon[order]]
+
+    def query(self, rect):
+        """
+        Finds the polygons whose cells overlap a rectangle. Their bounding boxes don't
+        necessarily overlap it, so they still have to be tested exactly.
+
+        Arguments:
+
+            rect {4-tuple} -- (min x, min y, max x, max y) of the rectangle
+
+        Returns:
+            {np.array} - Sorted array with the index of each polygon, without repetitions
+        """
+        first = np.floor(np.array(rect[0:2], dtype=np.float64) / self.cell_size)
+        last = np.floor(np.array(rect[2:4], dtype=np.float64) / self.cell_size)
+        first = np.maximum(first - self._origin, 0).astype(np.int64)
+        last = np.minimum(last - self._origin, self._size - 1).astype(np.int64)
+        if (first > last).any():
+            return np.unique(self._always)
+
+        # The cells of each column inside the rectangle are a range of keys
+        columns = np.arange(first[0], last[0] + 1)
+        starts = np.searchsorted(self._keys, columns * self._size[1] + first[1])
+        ends = np.searchsorted(self._keys, columns * self._size[1] + last[1], side="right")
+        counts = ends - starts
+        entries = np.repeat(starts - (np.cumsum(counts) - counts), counts) + \
+                  np.arange(counts.sum())
+
+        return np.unique(np.concatenate((self._polygons[entries], self._always)))
@@ -0,0 +1,149 @@
+"""Batch transform math.
+Functions that work on many transforms at once, stored in NumPy arrays: (N,3) positions and
+scales, (N) quaternion arrays for rotations and (N,4,4) matrices, instead of one Vector3,
+quaternion or matrix at a time. Matrices follow the same conventions as
+Object3d.get_prs_matrix: points are row vectors (p @ matrix), the translation is in the last
+row, and a PRS matrix is scale @ rotation @ translation."""
+import numpy as np
+import quaternion
+
+def _as_quaternions(rotations):
+    # Accepts quaternion arrays, and (N,4) float arrays with the (w, x, y, z) components
+    rotations = np.asarray(rotations)
+    if rotations.dtype != np.quaternion:
+        rotations = quaternion.as_quat_array(np.asarray(rotations, dtype=np.float64))
+
+    return rotations.reshape(-1)
+
+def get_prs_matrices(positions, rotations, scales):
+    """
+    Creates the PRS matrices of many transforms at once, the same as calling
+    Object3d.get_prs_matrix for each one.
+
+    Arguments:
+
+        positions {np.array} -- (N,3) array with the positions
+
+        rotations {np.array} -- (N) quaternion array with the rotations, or (N,4) array with
+        the (w, x, y, z) components of each quaternion
+
+        scales {np.array} -- (N,3) array with the scales
+
+    Returns:
+        {np.array} - (N,4,4) array with the PRS matrices
+    """
+    rotations = quaternion.as_rotation_matrix(_as_quaternions(rotations)).reshape((-1, 3, 3))
+    positions = np.asarray(positions, dtype=np.float64).reshape((-1, 3))
+    scales = np.asarray(scales, dtype=np.float64).reshape((-1, 3))
+
+    # Scaling the rotation rows and appending the translation row is the same as multiplying
+    # the scale, rotation and translation matrices
+    matrices = np.zeros((len(rotations), 4, 4))
+    matrices[:, 0:3, 0:3] = rotations * scales[:, :, np.newaxis]
+    matrices[:, 3, 0:3] = positions
+    matrices[:, 3, 3] = 1
+
+    return matrices
+
+def decompose_matrices(matrices):
+    """
+    Extracts the position, rotation and scale of many PRS matrices at once, the inverse of
+    get_prs_matrices. Matrices with shear can't be represented exactly, and give the closest
+    rotation. Negative scales can't be told apart from rotations, so a mirrored matrix gives a
+    negative x scale.
+
+    Arguments:
+
+        matrices {np.array} -- (N,4,4) array with the matrices
+
+    Returns:
+        {3-tuple} - (positions, rotations, scales), where positions is a (N,3) array,
+        rotations is a (N) quaternion array and scales is a (N,3) array
+    """
+    matrices = np.asarray(matrices, dtype=np.float64).reshape((-1, 4, 4))
+    linear = matrices[:, 0:3, 0:3]
+
+    scales = np.sqrt((linear * linear).sum(axis=2))
+    scales[np.linalg.det(linear) < 0, 0] *= -1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rotations = linear / scales[:, :, np.newaxis]
+    # Axes with a scale of 0 don't have a rotation, so use the identity for those matrices
+    degenerate = ~np.isfinite(rotations).all(axis=(1, 2))
+    rotations[degenerate] = np.identity(3)
+
+    return matrices[:, 3, 0:3].copy(), quaternion.from_rotation_matrix(rotations), scales
+
+def invert_matrices(matrices):
+    """
+    Inverts many affine matrices at once (matrices whose last column is (0, 0, 0, 1), like PRS
+    matrices). This is faster and more precise than a general 4x4 inverse, as only the 3x3 part
+    has to be inverted.
+
+    Arguments:
+
+        matrices {np.array} -- (N,4,4) array with the matrices
+
+    Returns:
+        {np.array} - (N,4,4) array with the inverse matrices
+    """
+    matrices = np.asarray(matrices, dtype=np.float64).reshape((-1, 4, 4))
+    linear = np.linalg.inv(matrices[:, 0:3, 0:3])
+
+    inverse = np.zeros_like(matrices)
+    inverse[:, 0:3, 0:3] = linear
+    inverse[:, 3, 0:3] = -(matrices[:, 3:4, 0:3] @ linear)[:, 0]
+    inverse[:, 3, 3] = 1
+
+    return inverse
+
+def compose_matrices(local, parent):
+    """
+    Composes many transforms at once: the result transforms points first by local and then by
+    parent (local @ parent, as a child in a hierarchy).
+
+    Arguments:
+
+        local {np.array} -- (N,4,4) array with the first transforms
+
+        parent {np.array} -- (N,4,4) array with the second transforms, or a single (4,4) matrix
+        to apply to all of them
+
+    Returns:
+        {np.array} - (N,4,4) array with the composed matrices
+    """
+    return np.matmul(local, parent)
+
+def get_world_matrices(local, parents):
+    """
+    Computes the world matrices of a whole hierarchy at once, composing the local matrix of
+    each object with the world matrix of its parent. All the objects at the same depth in the
+    hierarchy are composed together, so this does as many batch multiplications as the
+    hierarchy has levels.
+
+    Arguments:
+
+        local {np.array} -- (N,4,4) array with the local matrix of each object
+
+        parents {np.array} -- (N) array with the index of the parent of each object, or -1 for
+        objects at the root. Parents must come before their children (see Scene.get_flattened)
+
+    Returns:
+        {np.array} - (N,4,4) array with the world matrix of each object
+    """
+    local = np.asarray(local, dtype=np.float64).reshape((-1, 4, 4))
+    parents = np.asarray(parents, dtype=np.intp)
+
+    # Depth of each object in the hierarchy, by following all the parent links at once
+    depth = np.zeros(len(parents), dtype=np.int32)
+    ancestor = parents.copy()
+    while (ancestor >= 0).any():
+        has_ancestor = ancestor >= 0
+        depth += has_ancestor
+        ancestor[has_ancestor] = parents[ancestor[has_ancestor]]
+
+    world = local.copy()
+    for level in range(1, depth.max() + 1 if len(depth) > 0 else 1):
+        objects = (depth == level).nonzero()[0]
+        world[objects] = local[objects] @ world[parents[objects]]
+
+    return world
@@ -1,6 +1,5 @@
 """3d vector class and helper functions"""
 import math
-import numpy as np
 
 class InvalidOperationException(Exception):
     """Exception thrown when there's an invalid operation with vectors"""
@@ -293,6 +292,8 @@ class Vector3:
         Returns:
             np.array - [x,y,z]
         """
+        # NumPy is only imported when needed, so that Vector3 can be used without it
+        import numpy as np
         return np.array([self.x, self.y, self.z])
 
     def to_np4(self, w=1):
@@ -304,6 +305,7 @@ class Vector3:
         Returns:
             np.array - [x,y,z,w]
         """
+        import numpy as np
         return np.array([self.x, self.y, self.z, w])
 
     @staticmethod
@@ -0,0 +1,63 @@
+"""Tests for ray intersection with the mesh BVH"""
+import unittest
+import numpy as np
+from pyxyz.vector3 import Vector3
+from pyxyz.mesh import Mesh
+from pyxyz.bvh import MeshBVH
+
+class TestMeshBVH(unittest.TestCase):
+    """Rays hit the closest triangle, the same as testing all of them"""
+    def setUp(self):
+        self.cube = Mesh.create_cube((2, 2, 2))
+        self.sphere = Mesh.create_sphere((2, 2, 2), 16, 16)
+
+    def test_cube_hits(self):
+        bvh = self.cube.get_bvh()
+        distance, polygon, point = bvh.intersect(Vector3(0.3, 0.2, -5), Vector3(0, 0, 1))
+        self.assertAlmostEqual(distance, 4)
+        self.assertAlmostEqual(point.z, -1)
+        self.assertEqual(self.cube.polygons[polygon][0].z, -1)
+
+        # Rays that pass by, point away or are too short miss
+        self.assertIsNone(bvh.intersect(Vector3(3, 0, -5), Vector3(0, 0, 1)))
+        self.assertIsNone(bvh.intersect(Vector3(0, 0, -5), Vector3(0, 0, -1)))
+        self.assertIsNone(bvh.intersect(Vector3(0, 0, -5), Vector3(0, 0, 1), 3.9))
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        origins = rng.normal(size=(500, 3)) * 3
+        directions = rng.normal(size=(500, 3)) * 0.1 - origins * 0.2
+        single_leaf = MeshBVH(self.sphere, leaf_size=1 << 20)
+        expected = single_leaf.intersect_rays(origins, directions)
+        distance, polygon, points = MeshBVH(self.sphere, leaf_size=2).intersect_rays(origins,
+                                                                                   directions)
+        self.assertTrue((polygon >= 0).any() and (polygon < 0).any())
+        np.testing.assert_allclose(distance, expected[0])
+        np.testing.assert_array_equal(polygon, expected[1])
+        np.testing.assert_allclose(points, expected[2])
+
+        # Any hit finds a hit for the same rays, not closer than the closest one
+        any_distance, any_polygon, _ = self.sphere.get_bvh().intersect_rays(origins, directions,
+                                                                             any_hit=True)
+        np.testing.assert_array_equal(any_polygon >= 0, polygon >= 0)
+        self.assertTrue(np.all(any_distance[polygon >= 0] >= distance[polygon >= 0] - 1e-9))
+
+    def test_rebuilt_when_polygons_change(self):
+        mesh = Mesh("triangle")
+        mesh.polygons.append([Vector3(-1, -1, 0), Vector3(1, -1, 0), Vector3(0, 1, 0)])
+        bvh = mesh.get_bvh()
+        self.assertIs(mesh.get_bvh(), bvh)
+        self.assertIsNotNone(bvh.intersect(Vector3(0, 0, -1), Vector3(0, 0, 1)))
+
+        mesh.polygons[0] = [Vector3(2, -1, 0), Vector3(4, -1, 0), Vector3(3, 1, 0)]
+        self.assertIsNone(mesh.get_bvh().intersect(Vector3(0, 0, -1), Vector3(0, 0, 1)))
+
+    def test_empty_mesh(self):
+        distance, polygon, points = Mesh("empty").get_bvh().intersect_rays(np.zeros((2, 3)),
+                                                                           np.ones((2, 3)))
+        np.testing.assert_array_equal(distance, np.inf)
+        np.testing.assert_array_equal(polygon, -1)
+        self.assertTrue(np.isnan(points).all())
+
+if __name__ == "__main__":
+    unittest.main()
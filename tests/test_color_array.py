@@ -0,0 +1,98 @@
+"""Tests for color arrays and per-polygon and per-vertex colors"""
+import unittest
+import numpy as np
+from pyxyz.vector3 import Vector3
+from pyxyz.color import Color, InvalidColorOperationException
+from pyxyz.color_array import ColorArray
+from pyxyz.mesh import Mesh
+from pyxyz.material import Material
+
+class TestColorArray(unittest.TestCase):
+    """Color arrays give the same results as doing each Color on its own"""
+    def setUp(self):
+        self.colors = [Color(0.1, 0.2, 0.3, 1), Color(0.5, 0.4, 0.9, 0.5), Color(1, 1, 0, 0.25)]
+        self.array = ColorArray.from_colors(self.colors)
+
+    def assert_colors(self, array, colors):
+        self.assertIsInstance(array, ColorArray)
+        np.testing.assert_allclose(array.data, [(c.r, c.g, c.b, c.a) for c in colors])
+
+    def test_operations(self):
+        other = Color(0.2, 0.1, 0.0, 0.5)
+        self.assert_colors(self.array + other, [c + other for c in self.colors])
+        self.assert_colors(self.array - other, [c - other for c in self.colors])
+        self.assert_colors(self.array * 2, [c * 2 for c in self.colors])
+        self.assert_colors(2 * self.array, [c * 2 for c in self.colors])
+        self.assert_colors(self.array * other, [c * other for c in self.colors])
+        self.assert_colors(self.array / 4, [c * 0.25 for c in self.colors])
+        self.assert_colors(self.array * np.array([1, 2, 3]),
+                           [c * s for c, s in zip(self.colors, (1, 2, 3))])
+        self.assert_colors(self.array.premult_alpha(), [c.premult_alpha() for c in self.colors])
+        self.assert_colors(self.array.normalized(), [c.normalized() for c in self.colors])
+        np.testing.assert_allclose(self.array.dot(other), [c.dot(other) for c in self.colors])
+        np.testing.assert_allclose(self.array.magnitude(), [c.magnitude() for c in self.colors])
+        np.testing.assert_array_equal(self.array.equals(self.colors[1]), [False, True, False])
+        with self.assertRaises(InvalidColorOperationException):
+            _ = self.array / other
+        with self.assertRaises(InvalidColorOperationException):
+            _ = self.array + "red"
+
+    def test_in_place_changes_version(self):
+        version = self.array.version
+        self.array[1] = Color(0, 0, 0, 1)
+        self.assertGreater(self.array.version, version)
+        self.assertEqual(self.array[1].tuple4(), (0, 0, 0, 255))
+
+        version = self.array.version
+        (self.array * 2).saturate()
+        self.assertEqual(self.array.version, version)
+        self.array.saturate()
+        self.assertGreater(self.array.version, version)
+
+    def test_conversions(self):
+        np.testing.assert_array_equal(ColorArray([(1, 0.5, 2)]).to_rgb8(), [[255, 127, 255]])
+        np.testing.assert_array_equal(ColorArray([(1, 0.5, 0)]).to_rgba8(), [[255, 127, 0, 255]])
+        self.assertEqual(len(ColorArray(count=5)), 5)
+        self.assert_colors(ColorArray.filled(self.colors[0], 2), self.colors[0:1] * 2)
+        self.assert_colors(ColorArray.lerp(Color(0, 0, 0, 0), Color(1, 1, 1, 1), [0, 0.5]),
+                           [Color(0, 0, 0, 0), Color(0.5, 0.5, 0.5, 0.5)])
+        self.assertTrue(ColorArray.from_colors(self.array.to_colors()).equals(self.array).all())
+
+class TestMaterialColors(unittest.TestCase):
+    """Materials color each polygon and vertex of a mesh"""
+    def setUp(self):
+        self.mesh = Mesh("quads")
+        self.mesh.polygons.append([Vector3(0, 0, 0), Vector3(1, 0, 0), Vector3(1, 1, 0),
+                                   Vector3(0, 1, 0)])
+        self.mesh.polygons.append([Vector3(0, 0, 1), Vector3(1, 0, 1), Vector3(0, 1, 1)])
+        self.mesh.polygons.append([])
+        self.material = Material(Color(0, 0, 1), "blue")
+
+    def test_material_color(self):
+        polygon_colors, index_colors = self.material.get_mesh_colors(self.mesh)
+        np.testing.assert_array_equal(polygon_colors, [[0, 0, 255]] * 3)
+        np.testing.assert_array_equal(index_colors, [[0, 0, 255]] * 7)
+        self.assertIsNone(self.material.get_colors_key())
+
+    def test_polygon_colors(self):
+        self.material.polygon_colors = ColorArray([(1, 0, 0), (0, 1, 0), (0, 0, 0)])
+        key = self.material.get_colors_key()
+        polygon_colors, _ = self.material.get_mesh_colors(self.mesh)
+        np.testing.assert_array_equal(polygon_colors[0:2], [[255, 0, 0], [0, 255, 0]])
+
+        self.material.polygon_colors[0] = Color(1, 1, 1)
+        self.assertNotEqual(self.material.get_colors_key(), key)
+
+    def test_vertex_colors(self):
+        self.material.vertex_colors = ColorArray([(1, 0, 0), (1, 0, 0), (0, 0, 0), (0, 0, 0),
+                                                  (0, 1, 0), (0, 1, 0), (0, 1, 0)])
+        polygon_colors, index_colors = self.material.get_mesh_colors(self.mesh)
+        np.testing.assert_array_equal(polygon_colors, [[127, 0, 0], [0, 255, 0], [0, 0, 0]])
+        self.assertEqual(len(index_colors), 7)
+
+        self.material.vertex_colors = ColorArray(count=3)
+        with self.assertRaises(ValueError):
+            self.material.get_mesh_colors(self.mesh)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Tests for distance fog"""
+import unittest
+import numpy as np
+from pyxyz.vector3 import Vector3
+from pyxyz.color import Color
+from pyxyz.fog import Fog
+from pyxyz.mesh import Mesh
+from pyxyz.material import Material
+from pyxyz.object3d import Object3d
+from pyxyz.camera import Camera
+from pyxyz.scene import Scene
+
+RECT = (0, 0, 64, 48)
+
+class TestFog(unittest.TestCase):
+    """Fog blends colors toward the fog color by depth"""
+    def test_factor(self):
+        fog = Fog(Color(0, 0, 0), 10, 20, 0)
+        np.testing.assert_allclose(fog.get_factor([0, 10, 12.5, 15, 20, 30]),
+                                   [0, 0, 0.25, 0.5, 1, 1])
+        fog.bins = 2
+        np.testing.assert_allclose(fog.get_factor([0, 12, 14, 16, 19, 30]),
+                                   [0, 0, 0.5, 0.5, 1, 1])
+
+    def test_apply(self):
+        fog = Fog(Color(0, 0, 1), 0, 10, 0)
+        colors = np.array([[255, 0, 0]] * 3, dtype=np.uint8)
+        fogged = fog.apply(colors, np.array([0, 5, 10]))
+        np.testing.assert_array_equal(fogged, [[255, 0, 0], [128, 0, 128], [0, 0, 255]])
+        self.assertEqual(fogged.dtype, np.uint8)
+
+    def test_copy_and_key(self):
+        fog = Fog(Color(0, 0, 1), 0, 10)
+        copy = fog.copy()
+        self.assertIsNot(copy.color, fog.color)
+        self.assertEqual(copy.get_key()[1:], fog.get_key()[1:])
+
+        key = fog.get_key()
+        fog.color.r = 1
+        self.assertNotEqual(fog.get_key(), key)
+        self.assertEqual(copy.color.r, 0)
+
+class TestSceneFog(unittest.TestCase):
+    """Scenes with fog color their polygons by view depth"""
+    def setUp(self):
+        self.scene = Scene("fog")
+        self.scene.camera = Camera(False, 64, 48)
+        self.scene.camera.position = Vector3(0, 0, -10)
+        for name, z in (("near", -5), ("far", 40)):
+            obj = Object3d(name)
+            obj.mesh = Mesh.create_cube((1, 1, 1))
+            obj.material = Material(Color(1, 0, 0), name)
+            obj.position = Vector3(0, 0, z)
+            self.scene.add_object(obj)
+        self.scene.fog = Fog(Color(0, 0, 1), 10, 30, 4)
+
+    def get_colors(self):
+        commands = self.scene.build_commands(self.scene.capture_frame(), self.scene.camera,
+                                             RECT)
+        return {tuple(color) for color in commands.colors[commands.polygon_item == 0]}, \
+               {tuple(color) for color in commands.colors[commands.polygon_item == 1]}
+
+    def test_colors_by_depth(self):
+        near, far = self.get_colors()
+        self.assertEqual(near, {(255, 0, 0)})
+        self.assertEqual(far, {(0, 0, 255)})
+
+    def test_fog_changes(self):
+        self.get_colors()
+        self.scene.fog.end = 100
+        near, far = self.get_colors()
+        self.assertEqual(near, {(255, 0, 0)})
+        self.assertNotIn((0, 0, 255), far)
+
+        self.scene.fog = None
+        self.assertEqual(self.get_colors(), ({(255, 0, 0)}, {(255, 0, 0)}))
+
+    def test_group_materials_keeps_bins_together(self):
+        # A second near object after the far one, all with the same material
+        self.scene.group_materials = True
+        material = self.scene.objects[0].material
+        self.scene.objects[1].material = material
+        near = Object3d("near2")
+        near.mesh = Mesh.create_cube((1, 1, 1))
+        near.material = material
+        near.position = Vector3(1, 0, -5)
+        self.scene.add_object(near)
+        commands = self.scene.build_commands(self.scene.capture_frame(), self.scene.camera,
+                                             RECT)
+        colors = [tuple(color) for color in commands.colors]
+        changes = sum(a != b for a, b in zip(colors, colors[1:]))
+        self.assertEqual(len(set(colors)), 2)
+        self.assertEqual(changes, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Tests for the per-polygon kernels"""
+import unittest
+import numpy as np
+from pyxyz import kernels
+from pyxyz.vector3 import Vector3
+from pyxyz.color import Color
+from pyxyz.mesh import Mesh
+from pyxyz.material import Material
+from pyxyz.object3d import Object3d
+from pyxyz.scene import Scene
+from pyxyz.frame import Frame
+from pyxyz.draw_commands import DrawCommands
+
+RECT = (0, 0, 100, 100)
+
+class TestEmptyPolygons(unittest.TestCase):
+    """Per-polygon reductions with empty polygons, also at the end of the list"""
+    def setUp(self):
+        self.offsets = np.array([0, 3, 6, 6])
+        self.points = np.full((6, 2), 50.0)
+
+    def test_reduce_polygons(self):
+        values = np.arange(6, dtype=np.float64)
+        sums = kernels.reduce_polygons(np.add, values, self.offsets, 0)
+        np.testing.assert_array_equal(sums, [3, 12, 0])
+
+        sums = kernels.reduce_polygons(np.add, values, [0, 0, 3, 3, 6, 6], -1)
+        np.testing.assert_array_equal(sums, [-1, 3, -1, 12, -1])
+
+        sums = kernels.reduce_polygons(np.add, np.zeros(0), [0, 0], -1)
+        np.testing.assert_array_equal(sums, [-1])
+
+    def test_frustum_behind_camera(self):
+        w = np.array([1, 1, 1, 1, 1, -1.0])
+        visible = kernels.frustum_test(self.points, w, self.offsets, RECT)
+        np.testing.assert_array_equal(visible, [True, False, False])
+
+    def test_frustum_outside_viewport(self):
+        points = self.points.copy()
+        points[3:6, 0] = 500
+        visible = kernels.frustum_test(points, np.ones(6), self.offsets, RECT, 10)
+        np.testing.assert_array_equal(visible, [True, False, False])
+
+    def test_polygon_bounds(self):
+        points = np.arange(12, dtype=np.float64).reshape((6, 2))
+        commands = DrawCommands.from_polygons(points, np.ones(6), self.offsets,
+                                              np.zeros((3, 3), dtype=np.uint8), np.ones(3),
+                                              RECT, False)
+        bounds = commands.get_polygon_bounds()
+        np.testing.assert_array_equal(bounds[0:2], [[0, 1, 4, 5], [6, 7, 10, 11]])
+        np.testing.assert_array_equal(bounds[2], [np.inf, np.inf, -np.inf, -np.inf])
+
+    def test_polygon_depth(self):
+        mesh = Mesh("trailing_empty")
+        mesh.polygons.append([Vector3(0, 0, 0), Vector3(1, 0, 0), Vector3(0, 1, 0)])
+        mesh.polygons.append([Vector3(0, 0, 1), Vector3(1, 0, 1), Vector3(0, 1, 1)])
+        mesh.polygons.append([])
+        obj = Object3d("object")
+        obj.mesh = mesh
+        obj.material = Material(Color(255, 255, 255), "white")
+        scene = Scene("scene")
+        scene.add_object(obj)
+
+        frame = Frame(scene)
+        np.testing.assert_array_equal(frame.offsets, self.offsets)
+        depth = frame.get_polygon_depth(np.array([1, 2, 3, 10, 10, 10.0]))
+        np.testing.assert_array_equal(depth, [2, 10, 0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""Tests for meshes and their packed arrays"""
+import unittest
+import numpy as np
+from pyxyz.vector3 import Vector3
+from pyxyz.mesh import Mesh
+from pyxyz.material import Material
+from pyxyz.color import Color
+from pyxyz.object3d import Object3d
+from pyxyz.scene import Scene
+
+def _triangle_mesh():
+    mesh = Mesh("triangles")
+    mesh.polygons.append([Vector3(0, 0, 0), Vector3(1, 0, 0), Vector3(0, 1, 0)])
+    mesh.polygons.append([Vector3(0, 0, 1), Vector3(1, 0, 1), Vector3(0, 1, 1)])
+    return mesh
+
+class TestMeshPolygons(unittest.TestCase):
+    """Changes to the polygons list show up in the packed arrays"""
+    def test_unchanged_keeps_arrays(self):
+        mesh = _triangle_mesh()
+        packed = mesh.get_packed()
+        version = mesh.version
+        self.assertIs(mesh.get_packed(), packed)
+        self.assertEqual(mesh.version, version)
+
+    def test_vertex_changed_in_place(self):
+        mesh = _triangle_mesh()
+        mesh.get_packed()
+        version = mesh.version
+        mesh.polygons[1][2].x = 5
+        vertices, _, _ = mesh.get_packed()
+        self.assertEqual(vertices[5, 0], 5)
+        self.assertGreater(mesh.version, version)
+
+    def test_polygon_replaced_with_same_length(self):
+        mesh = _triangle_mesh()
+        mesh.get_packed()
+        mesh.polygons[0] = [Vector3(2, 2, 2), Vector3(3, 2, 2), Vector3(2, 3, 2)]
+        vertices, _, offsets = mesh.get_packed()
+        np.testing.assert_array_equal(vertices[0:3], [[2, 2, 2], [3, 2, 2], [2, 3, 2]])
+        np.testing.assert_array_equal(offsets, [0, 3, 6])
+
+    def test_frame_sees_changes_in_place(self):
+        mesh = _triangle_mesh()
+        scene = Scene("scene")
+        obj = Object3d("object")
+        obj.mesh = mesh
+        obj.material = Material(Color(1, 1, 1, 1))
+        scene.add_object(obj)
+        scene.capture_frame()
+        mesh.polygons[0][0].y = -4
+        frame = scene.capture_frame()
+        self.assertEqual(frame.vertices[0, 1], -4)
+
+    def test_packed_mesh(self):
+        mesh = Mesh.from_packed([[0, 0, 0], [1, 0, 0], [0, 1, 0]], [0, 1, 2], [0, 3])
+        packed = mesh.get_packed()
+        self.assertIs(mesh.get_packed(), packed)
+        self.assertEqual(mesh.polygons[0][1].x, 1)
+        mesh.polygons[0][1].x = 3
+        self.assertEqual(mesh.get_packed()[0][1, 0], 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Tests for loading and saving meshes"""
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+from pyxyz.mesh import Mesh
+from pyxyz.mesh_io import load_ply, save_ply, load_obj, save_obj, _ChunkReader
+
+class TestMeshIO(unittest.TestCase):
+    """Round trips of meshes through OBJ and PLY files"""
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.mesh = Mesh.create_sphere((1, 2, 3), 12, 8)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assert_same_mesh(self, mesh, exact=True):
+        vertices, indices, offsets = self.mesh.get_packed()
+        loaded_vertices, loaded_indices, loaded_offsets = mesh.get_packed()
+        if exact:
+            np.testing.assert_array_equal(loaded_vertices, vertices)
+        else:
+            np.testing.assert_allclose(loaded_vertices, vertices)
+        np.testing.assert_array_equal(loaded_indices, indices)
+        np.testing.assert_array_equal(loaded_offsets, offsets)
+
+    def test_obj_round_trip(self):
+        filename = os.path.join(self.directory.name, "mesh.obj")
+        save_obj(self.mesh, filename)
+        self.assert_same_mesh(load_obj(filename))
+
+    def test_ply_round_trip(self):
+        for binary in (True, False):
+            filename = os.path.join(self.directory.name, "mesh.ply")
+            save_ply(self.mesh, filename, binary)
+            # Small chunks, so faces are split across reads
+            self.assert_same_mesh(load_ply(filename, chunk_size=64))
+
+    def test_ply_elements_after_faces(self):
+        # Elements after the faces are skipped, even if bytes of them were already read
+        for binary in (True, False):
+            filename = os.path.join(self.directory.name, "mesh.ply")
+            save_ply(self.mesh, filename, binary)
+            with open(filename, "rb") as file:
+                data = file.read()
+            header, body = data.split(b"end_header\n")
+            header += b"element edge 2\nproperty int vertex1\nproperty int vertex2\n"
+            if binary:
+                body += np.array([0, 1, 1, 2], dtype="<i4").tobytes()
+            else:
+                body += b"0 1\n1 2\n"
+            with open(filename, "wb") as file:
+                file.write(header + b"end_header\n" + body)
+            for chunk_size in (64, 1 << 20):
+                self.assert_same_mesh(load_ply(filename, chunk_size=chunk_size))
+
+    def test_obj_without_final_newline(self):
+        filename = os.path.join(self.directory.name, "mesh.obj")
+        save_obj(self.mesh, filename)
+        with open(filename, "rb") as file:
+            data = file.read()
+        with open(filename, "wb") as file:
+            file.write(data.rstrip(b"\n"))
+        for chunk_size in (7, 64, 1 << 20):
+            self.assert_same_mesh(load_obj(filename, chunk_size=chunk_size))
+
+class TestChunkReader(unittest.TestCase):
+    """Lines and bytes read in chunks come out in order, and complete"""
+    def test_read_lines(self):
+        lines = [b"line %d\n" % i for i in range(100)]
+        data = b"".join(lines) + b"last"
+        for chunk_size in (3, 16, 1000):
+            reader = _ChunkReader(io.BytesIO(data), chunk_size)
+            self.assertEqual(reader.read_lines(1), lines[0])
+            self.assertEqual(reader.read_lines(1), lines[1])
+            self.assertEqual(reader.read_lines(1), lines[2])
+            blocks = []
+            while True:
+                block = reader.read_lines(7)
+                if not block:
+                    break
+                self.assertLessEqual(block.count(b"\n"), 7)
+                self.assertTrue(block.endswith(b"\n"))
+                blocks.append(block)
+            self.assertEqual(b"".join(blocks), b"".join(lines[3:]) + b"last\n")
+
+    def test_read_bytes_and_unread(self):
+        data = bytes(range(200))
+        reader = _ChunkReader(io.BytesIO(data), 16)
+        self.assertEqual(reader.read_bytes(50), data[0:50])
+        block = reader.read_bytes(30)
+        reader.unread(block[10:])
+        self.assertEqual(reader.read_bytes(1000), data[60:])
+        self.assertEqual(reader.read_bytes(10), b"")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Tests for mesh welding, cleanup and decimation"""
+import unittest
+import numpy as np
+from pyxyz.vector3 import Vector3
+from pyxyz.mesh import Mesh
+from pyxyz.mesh_tools import weld_vertices, remove_degenerate_polygons, decimate
+
+class TestMeshTools(unittest.TestCase):
+    """Mesh tools keep the shape of the mesh, with fewer vertices or polygons"""
+    def setUp(self):
+        self.sphere = Mesh.create_sphere((2, 2, 2), 16, 16)
+
+    def test_weld_keeps_corners(self):
+        vertices, indices, offsets = self.sphere.get_packed()
+        welded = weld_vertices(self.sphere)
+        welded_vertices, welded_indices, welded_offsets = welded.get_packed()
+
+        self.assertLess(len(welded_vertices), len(vertices))
+        np.testing.assert_array_equal(welded_offsets, offsets)
+        np.testing.assert_allclose(welded_vertices[welded_indices], vertices[indices],
+                                   atol=1e-6)
+        distances = np.linalg.norm(welded_vertices[:, np.newaxis] - welded_vertices, axis=2)
+        np.fill_diagonal(distances, np.inf)
+        self.assertGreater(distances.min(), 1e-6)
+
+    def test_weld_tolerance(self):
+        mesh = Mesh("triangles")
+        mesh.polygons.append([Vector3(0, 0, 0), Vector3(1, 0, 0), Vector3(0, 1, 0)])
+        mesh.polygons.append([Vector3(1e-3, 0, 0), Vector3(1, 1, 0), Vector3(0, 1, 0)])
+        self.assertEqual(len(weld_vertices(mesh).get_packed()[0]), 5)
+        self.assertEqual(len(weld_vertices(mesh, 1e-2).get_packed()[0]), 4)
+
+    def test_remove_degenerate_polygons(self):
+        mesh = Mesh("degenerate")
+        mesh.polygons.append([Vector3(0, 0, 0), Vector3(1, 0, 0), Vector3(1, 0, 0),
+                              Vector3(0, 1, 0)])
+        mesh.polygons.append([Vector3(0, 0, 5), Vector3(1, 0, 5), Vector3(2, 0, 5)])
+        mesh.polygons.append([Vector3(0, 0, 7), Vector3(0, 0, 7)])
+        mesh.polygons.append([])
+        vertices, indices, offsets = remove_degenerate_polygons(weld_vertices(mesh)).get_packed()
+
+        np.testing.assert_array_equal(offsets, [0, 3])
+        np.testing.assert_array_equal(vertices[indices], [[0, 0, 0], [1, 0, 0], [0, 1, 0]])
+
+        # Slivers are removed by area
+        mesh.polygons[1][1] = Vector3(1, 1e-4, 5)
+        self.assertEqual(len(remove_degenerate_polygons(mesh).get_packed()[2]), 3)
+        self.assertEqual(len(remove_degenerate_polygons(mesh, 1e-3).get_packed()[2]), 2)
+
+    def test_decimate(self):
+        welded = len(weld_vertices(self.sphere).get_packed()[0])
+        vertices, indices, offsets = decimate(self.sphere, 0.5).get_packed()
+
+        self.assertLessEqual(len(vertices), welded // 2)
+        self.assertGreater(len(offsets) - 1, 0)
+        self.assertGreaterEqual(np.diff(offsets).min(), 3)
+        self.assertEqual(len(np.unique(indices)), len(vertices))
+        radius = np.linalg.norm(vertices, axis=1)
+        self.assertTrue(np.all((radius > 0.9) & (radius < 1.1)))
+
+        # No collapse on a curved surface is free
+        self.assertEqual(len(decimate(self.sphere, 0.5, max_error=0).get_packed()[0]), welded)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Tests for object lists and the scenes that watch them"""
+import unittest
+from pyxyz.object_list import ObjectList, ObjectListWatcher
+from pyxyz.object3d import Object3d
+from pyxyz.scene import Scene
+
+class TestObjectList(unittest.TestCase):
+    """Object lists behave like lists without duplicates"""
+    def setUp(self):
+        self.objects = [Object3d(name) for name in "abcde"]
+        self.object_list = ObjectList(self.objects[0:3])
+
+    def names(self, objects=None):
+        return "".join(obj.name for obj in (self.object_list if objects is None else objects))
+
+    def test_indexing(self):
+        self.assertIs(self.object_list[1], self.objects[1])
+        self.assertIs(self.object_list[-1], self.objects[2])
+        self.assertEqual(self.names(self.object_list[1:]), "bc")
+        self.object_list.append(self.objects[3])
+        self.object_list.remove(self.objects[0])
+        self.assertIs(self.object_list[0], self.objects[1])
+        self.assertIs(self.object_list[2], self.objects[3])
+        self.assertEqual(self.object_list.index(self.objects[3]), 2)
+
+    def test_duplicates(self):
+        self.object_list.append(self.objects[0])
+        self.object_list.extend(self.objects[1:4])
+        self.object_list.insert(0, self.objects[2])
+        self.assertEqual(self.names(), "abcd")
+        with self.assertRaises(ValueError):
+            self.object_list[0] = self.objects[1]
+        self.assertEqual(self.names(), "abcd")
+
+    def test_insert_pop(self):
+        self.object_list.insert(1, self.objects[3])
+        self.assertEqual(self.names(), "adbc")
+        self.assertIs(self.object_list.pop(), self.objects[2])
+        self.assertIs(self.object_list.pop(0), self.objects[0])
+        self.assertEqual(self.names(), "db")
+        self.assertNotIn(self.objects[0], self.object_list)
+        self.object_list.clear()
+        with self.assertRaises(IndexError):
+            self.object_list.pop()
+
+    def test_assign_and_delete(self):
+        version = self.object_list.version
+        self.object_list[1] = self.objects[4]
+        self.assertEqual(self.names(), "aec")
+        self.assertGreater(self.object_list.version, version)
+        self.assertNotIn(self.objects[1], self.object_list)
+        self.object_list[0:2] = [self.objects[3]]
+        self.assertEqual(self.names(), "dc")
+        del self.object_list[0]
+        self.assertEqual(self.names(), "c")
+        self.object_list[:] = self.objects
+        del self.object_list[1:4]
+        self.assertEqual(self.names(), "ae")
+
+    def test_add(self):
+        combined = self.object_list + self.objects[2:]
+        self.assertIsInstance(combined, ObjectList)
+        self.assertEqual(self.names(combined), "abcde")
+        self.assertEqual(self.names(self.objects[3:] + self.object_list), "deabc")
+        self.object_list += self.objects[3:4]
+        self.assertEqual(self.names(), "abcd")
+
+class TestWatchers(unittest.TestCase):
+    """Scenes are only flagged by changes to their own hierarchy"""
+    def setUp(self):
+        self.scene = Scene("scene")
+        self.parent = Object3d("parent")
+        self.child = Object3d("child")
+        self.parent.children.append(self.child)
+        self.scene.add_object(self.parent)
+        self.scene.get_flattened()
+
+    def test_watch_and_unwatch(self):
+        object_list = ObjectList()
+        watcher = ObjectListWatcher()
+        watcher.changed = False
+        object_list.watch(watcher)
+        object_list.append(Object3d("a"))
+        self.assertTrue(watcher.changed)
+
+        watcher.changed = False
+        object_list.unwatch(watcher)
+        object_list.append(Object3d("b"))
+        self.assertFalse(watcher.changed)
+        object_list.unwatch(watcher)
+
+    def test_changes_rebuild_flattened(self):
+        grandchild = Object3d("grandchild")
+        self.child.children.append(grandchild)
+        objects, parents = self.scene.get_flattened()
+        self.assertEqual(objects, [self.parent, self.child, grandchild])
+        self.assertEqual(list(parents), [-1, 0, 1])
+
+        grandchild.name = "renamed"
+        self.assertIs(self.scene.get_object("renamed"), grandchild)
+
+    def test_removed_object_stops_flagging(self):
+        self.scene.remove_object(self.parent)
+        self.assertEqual(self.scene.get_flattened()[0], [])
+
+        self.child.children.append(Object3d("grandchild"))
+        self.assertFalse(self.scene._watcher.changed)
+        self.assertIsNone(self.child.children._watchers)
+
+    def test_reparented_object_stops_flagging(self):
+        other = Scene("other")
+        self.parent.children.remove(self.child)
+        other.add_object(self.child)
+        self.scene.get_flattened()
+        other.get_flattened()
+
+        self.child.name = "renamed"
+        self.assertFalse(self.scene._watcher.changed)
+        self.assertTrue(other._watcher.changed)
+        self.assertIs(other.get_object("renamed"), self.child)
+
+    def test_replaced_lists_stop_flagging(self):
+        old_children = self.parent.children
+        self.parent.children = [Object3d("new")]
+        old_objects = self.scene.objects
+        self.scene.objects = [self.parent]
+        self.assertEqual([obj.name for obj in self.scene.get_flattened()[0]],
+                         ["parent", "new"])
+
+        old_children.append(Object3d("a"))
+        old_objects.append(Object3d("b"))
+        self.assertFalse(self.scene._watcher.changed)
+
+if __name__ == "__main__":
+    unittest.main()
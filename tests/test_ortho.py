@@ -0,0 +1,106 @@
+"""Tests for the ortographic fast path and the screen grid used to cull it"""
+import unittest
+import numpy as np
+from pyxyz.vector3 import Vector3
+from pyxyz.color import Color
+from pyxyz.mesh import Mesh
+from pyxyz.material import Material
+from pyxyz.object3d import Object3d
+from pyxyz.camera import Camera
+from pyxyz.scene import Scene
+from pyxyz.screen_grid import ScreenGrid
+
+RECT = (0, 0, 320, 240)
+
+class TestScreenGrid(unittest.TestCase):
+    """Queries return every polygon that overlaps the rectangle"""
+    def test_query(self):
+        rng = np.random.default_rng(0)
+        corners = rng.uniform(-500, 500, (1000, 2))
+        bounds = np.concatenate((corners, corners + rng.uniform(0, 40, (1000, 2))), axis=1)
+        bounds[0] = (-1000, -1000, 1000, 1000)
+        bounds[1] = (np.inf, np.inf, -np.inf, -np.inf)
+        bounds[2] = (10, 10, 5, 5)
+        grid = ScreenGrid(bounds, 32)
+
+        for _ in range(20):
+            x, y = rng.uniform(-600, 600, 2)
+            rect = (x, y, x + rng.uniform(0, 300), y + rng.uniform(0, 300))
+            found = grid.query(rect)
+            overlap = (bounds[:, 2] >= rect[0]) & (bounds[:, 0] <= rect[2]) & \
+                      (bounds[:, 3] >= rect[1]) & (bounds[:, 1] <= rect[3])
+            self.assertTrue(set(overlap.nonzero()[0]) <= set(found))
+            np.testing.assert_array_equal(found, np.unique(found))
+            self.assertIn(0, found)
+            self.assertNotIn(1, found)
+            self.assertNotIn(2, found)
+
+    def test_empty(self):
+        self.assertEqual(len(ScreenGrid(np.zeros((0, 4)), 16).query((0, 0, 100, 100))), 0)
+
+class TestOrthoFastPath(unittest.TestCase):
+    """Panning an ortographic camera gives the same commands as projecting again"""
+    @staticmethod
+    def make_scene(grid_size=None):
+        scene = Scene("map")
+        scene.camera = Camera(True, 32, 24)
+        scene.camera.position = Vector3(0, 0, -20)
+        scene.grid_size = grid_size
+        rng = np.random.default_rng(1)
+        for i in range(40):
+            obj = Object3d(f"object{i}")
+            obj.mesh = Mesh.create_cube((1, 1, 1)) if i % 2 else \
+                Mesh.create_sphere((1, 1, 1), 4, 6)
+            obj.material = Material(Color(*rng.uniform(0.2, 1, 3)), f"material{i}")
+            obj.position = Vector3(*rng.uniform(-30, 30, 3))
+            scene.add_object(obj)
+        return scene
+
+    def assert_same_commands(self, commands, expected):
+        np.testing.assert_array_equal(commands.offsets, expected.offsets)
+        np.testing.assert_allclose(commands.points, expected.points, atol=1e-9)
+        np.testing.assert_allclose(commands.depth, expected.depth, atol=1e-9)
+        np.testing.assert_array_equal(commands.colors, expected.colors)
+        np.testing.assert_array_equal(commands.polygon_item, expected.polygon_item)
+
+    def test_panning(self):
+        for grid_size, settings in ((None, {}), (32, {}), (32, {"depth_sort": True}),
+                                    (None, {"group_materials": True})):
+            scene = TestOrthoFastPath.make_scene(grid_size)
+            for name, value in settings.items():
+                setattr(scene, name, value)
+            for step in range(6):
+                scene.camera.position += Vector3(1.3, -0.7, 0.5 if step % 3 == 0 else 0)
+                commands = scene.build_commands(scene.capture_frame(), scene.camera, RECT)
+
+                fresh = TestOrthoFastPath.make_scene()
+                for name, value in settings.items():
+                    setattr(fresh, name, value)
+                fresh.camera.position = scene.camera.position
+                expected = fresh.build_commands(fresh.capture_frame(), fresh.camera, RECT)
+                self.assert_same_commands(commands, expected)
+
+    def test_view_depth(self):
+        # The fast path gives the same screen positions as Frame.project, and the view depth
+        scene = Scene("cube")
+        scene.camera = Camera(True, 32, 24)
+        scene.camera.position = Vector3(0, 0, -20)
+        cube = Object3d("cube")
+        cube.mesh = Mesh.create_cube((1, 1, 1))
+        cube.material = Material(Color(1, 1, 1), "white")
+        cube.position = Vector3(2, 1, 0)
+        scene.add_object(cube)
+
+        frame = scene.capture_frame()
+        points, depth, visible = frame.project(scene.camera, RECT)
+        commands = scene.build_commands(frame, scene.camera, RECT)
+        self.assertFalse(commands.perspective)
+        self.assertTrue(visible.all())
+        np.testing.assert_array_equal(commands.offsets, frame.offsets)
+        np.testing.assert_allclose(commands.points, points)
+        np.testing.assert_allclose(commands.depth, depth)
+        self.assertAlmostEqual(commands.depth.min(), 19.5)
+        self.assertAlmostEqual(commands.depth.max(), 20.5)
+
+if __name__ == "__main__":
+    unittest.main()
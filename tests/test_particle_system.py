@@ -0,0 +1,67 @@
+"""Tests for drawing particle systems"""
+import unittest
+import numpy as np
+import pygame
+from pyxyz.vector3 import Vector3
+from pyxyz.color import Color
+from pyxyz.mesh import Mesh
+from pyxyz.material import Material
+from pyxyz.object3d import Object3d
+from pyxyz.camera import Camera
+from pyxyz.scene import Scene
+from pyxyz.particle_system import ParticleSystem
+from pyxyz.backends import RasterizerBackend
+
+class TestParticleDraw(unittest.TestCase):
+    """Particles are drawn over the scene, around where they are"""
+    def setUp(self):
+        self.scene = Scene("particles")
+        self.scene.camera = Camera(False, 64, 48)
+        self.scene.camera.position = Vector3(0, 0, -10)
+        self.particles = ParticleSystem("particles", 10)
+        self.particles.point_size = 3
+        self.scene.add_object(self.particles)
+        self.surface = pygame.Surface((64, 48))
+
+        # One red particle at the center, behind where the cube goes, and a green one in front
+        # of it, to the right
+        self.particles.emit(1, (0, 0, 2), 0, 10, Color(1, 0, 0))
+        self.particles.emit(1, (0.5, 0, -2), 0, 10, Color(0, 1, 0))
+
+    def pixel(self, x, y):
+        return tuple(self.surface.get_at((x, y)))[0:3]
+
+    def find(self, color):
+        pixels = pygame.surfarray.array3d(self.surface)
+        return np.all(pixels == color, axis=2).any()
+
+    def test_drawn_over_scene(self):
+        self.surface.fill((0, 0, 255))
+        self.surface.set_at((0, 0), (1, 2, 3))
+        self.scene.render(self.surface)
+        self.assertTrue(self.find((255, 0, 0)))
+        self.assertTrue(self.find((0, 255, 0)))
+        self.assertEqual(self.pixel(0, 0), (1, 2, 3))
+        self.assertEqual(self.pixel(63, 47), (0, 0, 255))
+
+    def test_depth_tested_with_rasterizer(self):
+        cube = Object3d("cube")
+        cube.mesh = Mesh.create_cube((2, 2, 2))
+        cube.material = Material(Color(1, 1, 1), "white")
+        self.scene.add_object(cube)
+        self.scene.fill = True
+        self.scene.backend = RasterizerBackend()
+
+        self.surface.fill((0, 0, 0))
+        self.scene.render(self.surface)
+        self.assertFalse(self.find((255, 0, 0)))
+        self.assertTrue(self.find((0, 255, 0)))
+
+        # Without the cube, the particle behind it shows up again
+        self.scene.remove_object(cube)
+        self.surface.fill((0, 0, 0))
+        self.scene.render(self.surface)
+        self.assertTrue(self.find((255, 0, 0)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""Tests for rendering on a background thread"""
+import unittest
+import numpy as np
+from pyxyz.vector3 import Vector3
+from pyxyz.color import Color
+from pyxyz.fog import Fog
+from pyxyz.mesh import Mesh
+from pyxyz.material import Material
+from pyxyz.object3d import Object3d
+from pyxyz.camera import Camera
+from pyxyz.scene import Scene
+from pyxyz.offscreen import OffscreenBuffer
+from pyxyz.render_pipeline import RenderPipeline
+
+class CustomObject(Object3d):
+    """Object with its own render function, that counts how many times it's called"""
+    def __init__(self, name):
+        super().__init__(name)
+        self.render_count = 0
+
+    def render(self, screen, clip_matrix):
+        self.render_count += 1
+
+class TestRenderPipeline(unittest.TestCase):
+    """The render thread only draws what was captured"""
+    def setUp(self):
+        self.scene = Scene("pipeline")
+        self.scene.camera = Camera(False, 64, 48)
+        self.scene.camera.position = Vector3(0, 0, -6)
+        sphere = Object3d("sphere")
+        sphere.mesh = Mesh.create_sphere((2, 2, 2), 8, 8)
+        sphere.material = Material(Color(1, 1, 1), "white")
+        self.scene.add_object(sphere)
+
+    def test_fog_is_captured(self):
+        self.scene.fog = Fog(Color(0, 0, 1), 0, 10, 0)
+        frame = self.scene.capture_frame()
+        self.scene.fog.color = Color(1, 0, 0)
+        self.scene.fog.start = 100
+
+        fogged = OffscreenBuffer(64, 48)
+        self.scene.render_frame(frame, self.scene.camera, fogged.surface)
+        self.scene.fog = Fog(Color(0, 0, 1), 0, 10, 0)
+        expected = OffscreenBuffer(64, 48)
+        self.scene.render(expected.surface)
+        np.testing.assert_array_equal(fogged.get_image(), expected.get_image())
+
+        # The copy is kept while the fog doesn't change, so cached commands are still valid
+        self.assertIs(self.scene.capture_frame().fog, self.scene.capture_frame().fog)
+
+    def test_custom_objects_not_rendered(self):
+        custom = CustomObject("custom")
+        self.scene.add_object(custom)
+        with RenderPipeline(self.scene, (64, 48)) as pipeline:
+            pipeline.submit()
+            self.assertTrue(pipeline.wait(10))
+        self.assertEqual(pipeline.rendered, 1)
+        self.assertEqual(custom.render_count, 0)
+
+        self.scene.render(OffscreenBuffer(64, 48).surface)
+        self.assertEqual(custom.render_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
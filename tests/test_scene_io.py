@@ -0,0 +1,100 @@
+"""Tests for scene snapshots"""
+import os
+import tempfile
+import unittest
+import numpy as np
+from pyxyz.vector3 import Vector3
+from pyxyz.color import Color
+from pyxyz.color_array import ColorArray
+from pyxyz.fog import Fog
+from pyxyz.mesh import Mesh
+from pyxyz.material import Material
+from pyxyz.object3d import Object3d
+from pyxyz.scene import Scene
+from pyxyz.scene_io import save_scene, load_scene
+
+def _triangle_mesh(name="triangle"):
+    mesh = Mesh(name)
+    mesh.polygons.append([Vector3(0, 0, 0), Vector3(1, 0, 0), Vector3(0, 1, 0)])
+    return mesh
+
+class TestSceneSnapshot(unittest.TestCase):
+    """Scenes saved and loaded again keep their contents and settings"""
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "scene")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        scene = Scene("snapshot")
+        scene.group_materials = True
+        scene.fog = Fog(Color(0.1, 0.2, 0.3), 5, 50, 4)
+        scene.grid_size = 32
+        scene.camera.position = Vector3(1, 2, 3)
+
+        mesh = _triangle_mesh()
+        material = Material(Color(1, 0, 0), "colored")
+        material.polygon_colors = ColorArray([(0, 1, 0)])
+        material.vertex_colors = ColorArray([(1, 0, 0), (0, 1, 0), (0, 0, 1)])
+        plain = Material(Color(0, 0, 1), "plain")
+        plain.line_width = 1.5
+
+        parent = Object3d("parent")
+        parent.mesh = mesh
+        parent.material = material
+        parent.position = Vector3(4, 5, 6)
+        child = Object3d("child")
+        child.mesh = mesh
+        child.material = plain
+        copy = Object3d("copy")
+        copy.mesh = _triangle_mesh()
+        copy.material = plain
+        parent.children.append(child)
+        scene.add_object(parent)
+        scene.add_object(copy)
+
+        save_scene(scene, self.filename)
+        loaded = load_scene(self.filename)
+
+        self.assertEqual(loaded.name, "snapshot")
+        self.assertTrue(loaded.group_materials)
+        self.assertEqual(loaded.grid_size, 32)
+        self.assertEqual(loaded.fog.get_key()[1:], scene.fog.get_key()[1:])
+        self.assertEqual(loaded.camera.position.z, 3)
+
+        objects, parents = loaded.get_flattened()
+        self.assertEqual([obj.name for obj in objects], ["parent", "child", "copy"])
+        self.assertEqual(list(parents), [-1, 0, -1])
+        new_parent, new_child, new_copy = objects
+        self.assertEqual(new_parent.position.y, 5)
+
+        # Shared meshes are shared again, and equal meshes share their arrays
+        self.assertIs(new_child.mesh, new_parent.mesh)
+        self.assertIsNot(new_copy.mesh, new_parent.mesh)
+        self.assertIs(new_copy.mesh.get_packed()[0], new_parent.mesh.get_packed()[0])
+        self.assertIs(new_copy.material, new_child.material)
+
+        new_material = new_parent.material
+        np.testing.assert_array_equal(new_material.polygon_colors.data,
+                                      material.polygon_colors.data)
+        np.testing.assert_array_equal(new_material.vertex_colors.data,
+                                      material.vertex_colors.data)
+        self.assertIsNone(new_child.material.polygon_colors)
+        self.assertIsNone(new_child.material.vertex_colors)
+        self.assertEqual(new_child.material.line_width, 1.5)
+
+    def test_default_settings(self):
+        scene = Scene("defaults")
+        scene.add_object(Object3d("empty"))
+        save_scene(scene, self.filename + ".npz")
+        loaded = load_scene(self.filename)
+
+        self.assertFalse(loaded.group_materials)
+        self.assertIsNone(loaded.fog)
+        self.assertIsNone(loaded.grid_size)
+        self.assertEqual([obj.name for obj in loaded.objects], ["empty"])
+
+if __name__ == "__main__":
+    unittest.main()